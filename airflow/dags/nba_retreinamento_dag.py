@@ -24,7 +24,7 @@ args_padrao = {
 @dag(
     dag_id="nba_retreinamento",
     default_args=args_padrao,
-    description="Retreina todos os modelos do zero a cada 3 dias e gera relatorio PDF",
+    description="Retreina a cada 3 dias os modelos cujos dados mudaram e gera relatorio PDF",
     schedule_interval="0 7 */3 * *",
     start_date=datetime(2026, 1, 1),
     catchup=False,
@@ -39,9 +39,13 @@ def nba_retreinamento():
 
         logger.warning(f"Iniciando retreinamento completo: temporada={TEMPORADA_ATUAL}")
 
+        def registrar_progresso(concluidas, total):
+            if concluidas == total or concluidas % 100 == 0:
+                logger.warning(f"Progresso do retreinamento: {concluidas}/{total} unidades")
+
         resultado = None
         for db in get_db():
-            resultado = retreinar_todos_modelos(db=db, season=TEMPORADA_ATUAL)
+            resultado = retreinar_todos_modelos(db=db, season=TEMPORADA_ATUAL, ao_progredir=registrar_progresso)
 
         if resultado is None:
             logger.warning(f"Retreinamento retornou None: temporada={TEMPORADA_ATUAL}")
@@ -51,16 +55,31 @@ def nba_retreinamento():
         total_erros = resultado["total_erros"]
         total_jogadores = resultado["total_jogadores_treino"]
         total_registros = resultado["total_registros_db"]
+        resumo_unidades = {"pulados": resultado["total_pulados"], "retreinados": resultado["total_retreinados"], "novos": resultado["total_novos"]}
 
-        logger.warning(f"Retreinamento concluido: salvos={total_salvos}, erros={total_erros}, temporada={TEMPORADA_ATUAL}")
+        logger.warning(f"Retreinamento concluido: salvos={total_salvos}, erros={total_erros}, workers={resultado['workers']}, duracao={resultado['duracao_segundos']}s, temporada={TEMPORADA_ATUAL}")
+        for erro_unidade in resultado["erros_unidades"]:
+            logger.warning(f"Unidade com erro: player_id={erro_unidade['player_id']}, stat={erro_unidade['stat']}: {erro_unidade['erro']}")
 
         try:
             for db in get_db():
-                caminho_pdf = gerar_e_salvar_relatorio(db=db, season=TEMPORADA_ATUAL, total_registros_db=total_registros, total_jogadores_treino=total_jogadores, total_modelos_salvos=total_salvos, total_erros=total_erros)
+                caminho_pdf = gerar_e_salvar_relatorio(db=db, season=TEMPORADA_ATUAL, total_registros_db=total_registros, total_jogadores_treino=total_jogadores, total_modelos_salvos=total_salvos, total_erros=total_erros, resumo_unidades=resumo_unidades)
                 logger.warning(f"Relatorio gerado: {caminho_pdf}")
         except Exception as erro:
             logger.warning(f"Falha ao gerar relatorio: {erro}")
 
+        resumo = {}
+        resumo["total_salvos"] = total_salvos
+        resumo["total_erros"] = total_erros
+        resumo["total_unidades"] = resultado["total_unidades"]
+        resumo["total_pulados"] = resultado["total_pulados"]
+        resumo["total_retreinados"] = resultado["total_retreinados"]
+        resumo["total_novos"] = resultado["total_novos"]
+        resumo["total_incrementais"] = resultado["total_incrementais"]
+        resumo["workers"] = resultado["workers"]
+        resumo["duracao_segundos"] = resultado["duracao_segundos"]
+        return resumo
+
     executar_treino()
 
 dag_instance = nba_retreinamento()
\ No newline at end of file
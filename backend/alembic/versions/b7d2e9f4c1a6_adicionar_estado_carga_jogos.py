@@ -0,0 +1,36 @@
+"""adicionar_estado_carga_jogos
+
+Revision ID: b7d2e9f4c1a6
+Revises: f1c3d8e5a7b2
+Create Date: 2026-10-17 14:05:27.318902
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b7d2e9f4c1a6'
+down_revision: Union[str, None] = 'f1c3d8e5a7b2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('etl_game_load_state',
+    sa.Column('game_id', sa.Integer(), nullable=False),
+    sa.Column('load_name', sa.String(), nullable=False),
+    sa.Column('fetched_at', sa.TIMESTAMP(timezone=True), nullable=False),
+    sa.Column('source_status', sa.Integer(), nullable=True),
+    sa.Column('payload_hash', sa.String(length=64), nullable=True),
+    sa.Column('rows_written', sa.Integer(), nullable=False),
+    sa.Column('updated_at', sa.TIMESTAMP(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.ForeignKeyConstraint(['game_id'], ['games.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('game_id', 'load_name')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('etl_game_load_state')
@@ -0,0 +1,56 @@
+"""adicionar_defesa_times_jogo
+
+Revision ID: e4b7a2c91f03
+Revises: a06cf71a0cf9
+Create Date: 2026-10-17 09:12:41.204518
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e4b7a2c91f03'
+down_revision: Union[str, None] = 'a06cf71a0cf9'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('team_game_defense',
+    sa.Column('team_id', sa.Integer(), nullable=False),
+    sa.Column('game_id', sa.Integer(), nullable=False),
+    sa.Column('season', sa.Integer(), nullable=False),
+    sa.Column('date_start', sa.TIMESTAMP(timezone=True), nullable=False),
+    sa.Column('stage', sa.Integer(), nullable=True),
+    sa.Column('points_allowed', sa.Integer(), nullable=False),
+    sa.Column('assists_allowed', sa.Integer(), nullable=False),
+    sa.Column('tot_reb_allowed', sa.Integer(), nullable=False),
+    sa.Column('steals_allowed', sa.Integer(), nullable=False),
+    sa.Column('blocks_allowed', sa.Integer(), nullable=False),
+    sa.Column('updated_at', sa.TIMESTAMP(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.ForeignKeyConstraint(['game_id'], ['games.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['season'], ['seasons.season'], ),
+    sa.ForeignKeyConstraint(['team_id'], ['teams.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('team_id', 'game_id')
+    )
+    op.create_index('ix_team_game_defense_season_team_date', 'team_game_defense', ['season', 'team_id', 'date_start'], unique=False)
+
+    op.execute("""
+        INSERT INTO team_game_defense (team_id, game_id, season, date_start, stage, points_allowed, assists_allowed, tot_reb_allowed, steals_allowed, blocks_allowed)
+        SELECT lados.team_id, g.id, g.season, g.date_start, g.stage,
+               COALESCE(SUM(p.points), 0), COALESCE(SUM(p.assists), 0), COALESCE(SUM(p.tot_reb), 0),
+               COALESCE(SUM(p.steals), 0), COALESCE(SUM(p.blocks), 0)
+        FROM games g
+        CROSS JOIN LATERAL (VALUES (g.home_team_id), (g.away_team_id)) AS lados(team_id)
+        LEFT JOIN player_game_stats p ON p.game_id = g.id AND p.team_id <> lados.team_id
+        WHERE g.status_short = 3
+        GROUP BY lados.team_id, g.id, g.season, g.date_start, g.stage
+    """)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_team_game_defense_season_team_date', table_name='team_game_defense')
+    op.drop_table('team_game_defense')
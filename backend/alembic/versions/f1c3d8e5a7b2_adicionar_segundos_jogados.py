@@ -0,0 +1,42 @@
+"""adicionar_segundos_jogados
+
+Revision ID: f1c3d8e5a7b2
+Revises: e4b7a2c91f03
+Create Date: 2026-10-17 14:03:27.518342
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f1c3d8e5a7b2'
+down_revision: Union[str, None] = 'e4b7a2c91f03'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('player_game_stats', sa.Column('seconds_played', sa.Integer(), nullable=True))
+
+    # "MM:SS" -> MM*60+SS ; numero decimal de minutos -> round(x*60) ; demais formatos ficam NULL
+    op.execute("""
+        UPDATE player_game_stats
+        SET seconds_played = CASE
+            WHEN btrim(minutes) ~ '^[0-9]+:[0-9]+$'
+                THEN split_part(btrim(minutes), ':', 1)::integer * 60 + split_part(btrim(minutes), ':', 2)::integer
+            WHEN btrim(minutes) ~ '^[0-9]+(\\.[0-9]+)?$'
+                THEN round(btrim(minutes)::numeric * 60)::integer
+            ELSE NULL
+        END
+        WHERE minutes IS NOT NULL
+    """)
+
+    op.create_index('ix_player_game_stats_season_team_seconds', 'player_game_stats', ['season', 'team_id', 'seconds_played'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_player_game_stats_season_team_seconds', table_name='player_game_stats')
+    op.drop_column('player_game_stats', 'seconds_played')
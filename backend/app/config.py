@@ -15,6 +15,17 @@ class Config:
 
     API_SPORTS_KEY = os.getenv("API_SPORTS_KEY", "")
     API_SPORTS_BASE_URL = os.getenv("API_SPORTS_BASE_URL", "https://v2.nba.api-sports.io")
+    API_SPORTS_REQUISICOES_POR_MINUTO = int(os.getenv("API_SPORTS_REQUISICOES_POR_MINUTO", "280"))
+    API_SPORTS_RAJADA = int(os.getenv("API_SPORTS_RAJADA", "10"))
+    API_SPORTS_CONCORRENCIA = int(os.getenv("API_SPORTS_CONCORRENCIA", "8"))
+    API_SPORTS_LOTE_JOGOS = int(os.getenv("API_SPORTS_LOTE_JOGOS", "50"))
+    API_CACHE_ATIVO = os.getenv("API_CACHE_ATIVO", "1") == "1"
+    API_CACHE_TTL_SEGUNDOS = int(os.getenv("API_CACHE_TTL_SEGUNDOS", "300"))
+    PASTA_CACHE_API = os.getenv("PASTA_CACHE_API", "/opt/airflow/cache_api")
+    ZONA_BRUTA_ATIVA = os.getenv("ZONA_BRUTA_ATIVA", "1") == "1"
+    PASTA_ZONA_BRUTA = os.getenv("PASTA_ZONA_BRUTA", "/opt/airflow/zona_bruta")
+    ETL_MODO_REPLAY = os.getenv("ETL_MODO_REPLAY", "0") == "1"
+    ETL_LOTE_UPSERT = int(os.getenv("ETL_LOTE_UPSERT", "1000"))
     BACKEND_HOST = os.getenv("BACKEND_HOST", "0.0.0.0")
     BACKEND_PORT = int(os.getenv("BACKEND_PORT", "8000"))
     BACKEND_ENV = os.getenv("BACKEND_ENV", "development")
@@ -39,7 +50,31 @@ class Config:
     MIN_MINUTOS_PALPITE = float(os.getenv("MIN_MINUTOS_PALPITE", "15.0"))
     
     PASTA_MODELOS = os.getenv("PASTA_MODELOS", "/opt/airflow/modelos_ml")
+    FORMATO_MODELOS = os.getenv("FORMATO_MODELOS", "pickle")
+    REGISTRO_MODELOS_MAX = int(os.getenv("REGISTRO_MODELOS_MAX", "3000"))
+    MODO_TREINO_MODELOS = os.getenv("MODO_TREINO_MODELOS", "jogador")
+    RETREINO_WORKERS = int(os.getenv("RETREINO_WORKERS", "0"))
+    MODO_ATUALIZACAO_MODELOS = os.getenv("MODO_ATUALIZACAO_MODELOS", "completo")
+    INCREMENTAL_RODADAS = int(os.getenv("INCREMENTAL_RODADAS", "10"))
+    INCREMENTAL_MAX_ARVORES = int(os.getenv("INCREMENTAL_MAX_ARVORES", "300"))
+    INCREMENTAL_JANELA_AMOSTRAS = int(os.getenv("INCREMENTAL_JANELA_AMOSTRAS", "20"))
+    INCREMENTAL_LIMIAR_DRIFT = float(os.getenv("INCREMENTAL_LIMIAR_DRIFT", "1.25"))
+    INCREMENTAL_MAX_ATUALIZACOES = int(os.getenv("INCREMENTAL_MAX_ATUALIZACOES", "7"))
+    INCREMENTAL_DIAS_REFIT = int(os.getenv("INCREMENTAL_DIAS_REFIT", "7"))
+    TREINO_TEMPORADAS_ANTERIORES = int(os.getenv("TREINO_TEMPORADAS_ANTERIORES", "0"))
+    TREINO_DECAIMENTO_TEMPORADA = float(os.getenv("TREINO_DECAIMENTO_TEMPORADA", "0.5"))
+    PASTA_SNAPSHOTS = os.getenv("PASTA_SNAPSHOTS", "/opt/airflow/snapshots")
+    SNAPSHOT_LINHAS_POR_BLOCO = int(os.getenv("SNAPSHOT_LINHAS_POR_BLOCO", "5000"))
     PASTA_RELATORIOS = os.getenv("PASTA_RELATORIOS", "/opt/airflow/relatorios_ml")
+    REPLAY_JOGOS_POR_LOTE = int(os.getenv("REPLAY_JOGOS_POR_LOTE", "50"))
+    BACKTEST_PASSO_DIAS = int(os.getenv("BACKTEST_PASSO_DIAS", "14"))
+    BACKTEST_DIAS_AQUECIMENTO = int(os.getenv("BACKTEST_DIAS_AQUECIMENTO", "21"))
+    FEATURE_STORE_TTL_SEGUNDOS = int(os.getenv("FEATURE_STORE_TTL_SEGUNDOS", "600"))
+    PREDICOES_LOTE_INSERT = int(os.getenv("PREDICOES_LOTE_INSERT", "1000"))
+    PREDICOES_LIMIAR_COPY = int(os.getenv("PREDICOES_LIMIAR_COPY", "5000"))
+    RODADA_WORKERS = int(os.getenv("RODADA_WORKERS", "0"))
+    PREDICOES_CACHE_TTL_SEGUNDOS = int(os.getenv("PREDICOES_CACHE_TTL_SEGUNDOS", "900"))
+    PREDICOES_CACHE_MAX = int(os.getenv("PREDICOES_CACHE_MAX", "20000"))
     
     SMTP_HOST = os.getenv("SMTP_HOST", "smtp.gmail.com")
     SMTP_PORT = int(os.getenv("SMTP_PORT", "587"))
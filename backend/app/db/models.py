@@ -4,6 +4,7 @@ from sqlalchemy import (
     Column,
     Date,
     ForeignKey,
+    Index,
     Integer,
     Numeric,
     String,
@@ -237,6 +238,7 @@ class PlayerGameStats(Base):
     season = Column(Integer, ForeignKey("seasons.season"))
     pos = Column(String)
     minutes = Column(String)
+    seconds_played = Column(Integer)
     points = Column(Integer)
     fgm = Column(Integer)
     fga = Column(Integer)
@@ -258,11 +260,46 @@ class PlayerGameStats(Base):
     plus_minus = Column(Integer)
     comment = Column(Text)
 
+    __table_args__ = (Index("ix_player_game_stats_season_team_seconds", "season", "team_id", "seconds_played"),)
+
     player = relationship("Player", back_populates="game_stats")
     game = relationship("Game", back_populates="player_game_stats")
     team = relationship("Team", back_populates="player_game_stats")
     season_rel = relationship("Season")
 
+class TeamGameDefense(Base):
+    __tablename__ = "team_game_defense"
+
+    team_id = Column(Integer, ForeignKey("teams.id", ondelete="CASCADE"), primary_key=True)
+    game_id = Column(Integer, ForeignKey("games.id", ondelete="CASCADE"), primary_key=True)
+    season = Column(Integer, ForeignKey("seasons.season"), nullable=False)
+    date_start = Column(TIMESTAMP(timezone=True), nullable=False)
+    stage = Column(Integer)
+    points_allowed = Column(Integer, nullable=False, default=0)
+    assists_allowed = Column(Integer, nullable=False, default=0)
+    tot_reb_allowed = Column(Integer, nullable=False, default=0)
+    steals_allowed = Column(Integer, nullable=False, default=0)
+    blocks_allowed = Column(Integer, nullable=False, default=0)
+    updated_at = Column(TIMESTAMP(timezone=True), server_default=func.now(), onupdate=func.now())
+
+    __table_args__ = (Index("ix_team_game_defense_season_team_date", "season", "team_id", "date_start"),)
+
+    team = relationship("Team")
+    game = relationship("Game")
+
+class EtlGameLoadState(Base):
+    __tablename__ = "etl_game_load_state"
+
+    game_id = Column(Integer, ForeignKey("games.id", ondelete="CASCADE"), primary_key=True)
+    load_name = Column(String, primary_key=True)
+    fetched_at = Column(TIMESTAMP(timezone=True), nullable=False)
+    source_status = Column(Integer)
+    payload_hash = Column(String(64))
+    rows_written = Column(Integer, nullable=False, default=0)
+    updated_at = Column(TIMESTAMP(timezone=True), server_default=func.now(), onupdate=func.now())
+
+    game = relationship("Game")
+
 class Prediction(Base):
     __tablename__ = "predictions"
 
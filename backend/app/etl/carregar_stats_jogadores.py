@@ -1,17 +1,22 @@
 from datetime import datetime, timedelta
-import time
 
-from app.services import nba_api_client
-from app.db.models import PlayerGameStats, Game, Player
+from app.config import config
+from app.services import nba_api_client, cache_api
+from app.db.models import Game
 from app.db.db_utils import get_db
-from app.etl.func_normalize import _normalizar_string, _normalizar_inteiro, _normalizar_decimal
+from app.etl.upsert_stats import carregar_ids_jogadores, normalizar_stats_jogadores, upsert_stats_jogadores
+from app.services.defesa_service import atualizar_defesa_jogo
+from app.services.feature_store import invalidar_feature_store
+from app.services.cache_predicoes import registrar_nova_versao_dados
+from app.etl.estado_carga import CARGA_STATS_JOGADORES, filtrar_pendentes, hash_resposta, resposta_inalterada, montar_estado, registrar_estados
 from app.core.logging_config import configurar_logger
 
 logger = configurar_logger(__name__)
 
-def carregar_stats_jogador(game_id):
+def carregar_stats_jogador(game_id, estatistica_jogador=None):
     logger.info(f"Stats jogadores — jogo={game_id}...")
-    estatistica_jogador = nba_api_client.get_player_statistics(game_id=game_id)
+    if estatistica_jogador is None:
+        estatistica_jogador = nba_api_client.get_player_statistics(game_id=game_id)
 
     if not estatistica_jogador:
         logger.warning(f"API vazia — jogo={game_id}.")
@@ -27,96 +32,19 @@ def carregar_stats_jogador(game_id):
             return
 
         season = jogo.season
-        total_inseridos = 0
-        total_atualizados = 0
-
-        for item in estatistica_jogador:
-            info_jogador = item.get("player")
-            info_franquia = item.get("team")
-
-            if isinstance(info_jogador, dict):
-                id_jogador = _normalizar_inteiro(info_jogador.get("id"))
-            else:
-                id_jogador = None
-
-            if isinstance(info_franquia, dict):
-                id_franquia = _normalizar_inteiro(info_franquia.get("id"))
-            else:
-                id_franquia = None
-
-            if not id_jogador or not id_franquia:
-                continue
-
-            jogador_existe_no_db = db.query(Player.id).filter(Player.id == id_jogador).first()
-            if not jogador_existe_no_db:
-                continue
-
-            stats_existente = db.query(PlayerGameStats).filter(PlayerGameStats.game_id == game_id, PlayerGameStats.player_id == id_jogador, PlayerGameStats.team_id == id_franquia).first()
-
-            if stats_existente:
-                logger.info(f"Atualiza stat jogador={id_jogador} jogo={game_id}.")
-                stats_existente.pos = _normalizar_string(item.get("pos"))
-                stats_existente.minutes = _normalizar_string(item.get("min"))
-                stats_existente.comment = _normalizar_string(item.get("comment"))
-                stats_existente.points = _normalizar_inteiro(item.get("points"))
-                stats_existente.fgm = _normalizar_inteiro(item.get("fgm"))
-                stats_existente.fga = _normalizar_inteiro(item.get("fga"))
-                stats_existente.fgp = _normalizar_decimal(item.get("fgp"))
-                stats_existente.ftm = _normalizar_inteiro(item.get("ftm"))
-                stats_existente.fta = _normalizar_inteiro(item.get("fta"))
-                stats_existente.ftp = _normalizar_decimal(item.get("ftp"))
-                stats_existente.tpm = _normalizar_inteiro(item.get("tpm"))
-                stats_existente.tpa = _normalizar_inteiro(item.get("tpa"))
-                stats_existente.tpp = _normalizar_decimal(item.get("tpp"))
-                stats_existente.off_reb = _normalizar_inteiro(item.get("offReb"))
-                stats_existente.def_reb = _normalizar_inteiro(item.get("defReb"))
-                stats_existente.tot_reb = _normalizar_inteiro(item.get("totReb"))
-                stats_existente.assists = _normalizar_inteiro(item.get("assists"))
-                stats_existente.p_fouls = _normalizar_inteiro(item.get("pFouls"))
-                stats_existente.steals = _normalizar_inteiro(item.get("steals"))
-                stats_existente.turnovers = _normalizar_inteiro(item.get("turnovers"))
-                stats_existente.blocks = _normalizar_inteiro(item.get("blocks"))
-                stats_existente.plus_minus = _normalizar_inteiro(item.get("plusMinus"))
-                total_atualizados += 1
-                continue
-
-            logger.info(f"Insere stat jogador={id_jogador} jogo={game_id}.")
-            nova_stats = PlayerGameStats(
-                game_id=game_id,
-                season=season,
-                player_id=id_jogador,
-                team_id=id_franquia,
-                pos=_normalizar_string(item.get("pos")),
-                minutes=_normalizar_string(item.get("min")),
-                comment=_normalizar_string(item.get("comment")),
-                points=_normalizar_inteiro(item.get("points")),
-                fgm=_normalizar_inteiro(item.get("fgm")),
-                fga=_normalizar_inteiro(item.get("fga")),
-                fgp=_normalizar_decimal(item.get("fgp")),
-                ftm=_normalizar_inteiro(item.get("ftm")),
-                fta=_normalizar_inteiro(item.get("fta")),
-                ftp=_normalizar_decimal(item.get("ftp")),
-                tpm=_normalizar_inteiro(item.get("tpm")),
-                tpa=_normalizar_inteiro(item.get("tpa")),
-                tpp=_normalizar_decimal(item.get("tpp")),
-                off_reb=_normalizar_inteiro(item.get("offReb")),
-                def_reb=_normalizar_inteiro(item.get("defReb")),
-                tot_reb=_normalizar_inteiro(item.get("totReb")),
-                assists=_normalizar_inteiro(item.get("assists")),
-                p_fouls=_normalizar_inteiro(item.get("pFouls")),
-                steals=_normalizar_inteiro(item.get("steals")),
-                turnovers=_normalizar_inteiro(item.get("turnovers")),
-                blocks=_normalizar_inteiro(item.get("blocks")),
-                plus_minus=_normalizar_inteiro(item.get("plusMinus")),
-            )
-            db.add(nova_stats)
-            total_inseridos += 1
+        linhas = normalizar_stats_jogadores(game_id, season, estatistica_jogador, carregar_ids_jogadores(db))
+        resumo = upsert_stats_jogadores(db, linhas)
+        registrar_estados(db, [montar_estado(CARGA_STATS_JOGADORES, jogo, hash_resposta(estatistica_jogador), len(linhas))])
 
         db.commit()
-        logger.info(f"Fim jogo={game_id} — ins={total_inseridos} atu={total_atualizados}.")
+        atualizar_defesa_jogo(db, game_id)
+        db.commit()
+        invalidar_feature_store(season)
+        registrar_nova_versao_dados(season)
+        logger.info(f"Fim jogo={game_id} — ins={resumo['inseridos']} atu={resumo['atualizados']}.")
 
 
-def carregar_stats_todos_jogadores(season, team_id=None, data=None):
+def carregar_stats_todos_jogadores(season, team_id=None, data=None, forcar=False):
     logger.info(f"Stats em massa — temp={season} data={data}...")
 
     for db in get_db():
@@ -136,27 +64,74 @@ def carregar_stats_todos_jogadores(season, team_id=None, data=None):
             logger.warning(f"Nenhum jogo — temp={season} data={data}.")
             return
 
+        jogos, estados = filtrar_pendentes(db, CARGA_STATS_JOGADORES, jogos, forcar=forcar)
+        if not jogos:
+            logger.info(f"Nada a carregar — temp={season} data={data}: todos os jogos ja estao encerrados e carregados.")
+            return
+
         total_jogos = len(jogos)
         logger.info(f"{total_jogos} jogos encontrados — temp={season}.")
         total_erros = 0
 
-        for idx, jogo in enumerate(jogos, start=1):
-            logger.info(f"[{idx}/{total_jogos}] Stats jogadores jogo={jogo.id}...")
+        # jogos encerrados no banco: respostas deles ficam no cache da API sem expirar
+        cache_api.marcar_jogos_finalizados([j.id for j in jogos if j.status_short == 3])
+
+        ids_jogadores = carregar_ids_jogadores(db)
+        total_inseridos = 0
+        total_atualizados = 0
+
+        # busca concorrente por lote; o ritmo fica com o limitador do cliente.
+        # cada lote de jogos vira um unico upsert
+        tamanho_lote = max(config.API_SPORTS_LOTE_JOGOS, 1)
+        for inicio in range(0, total_jogos, tamanho_lote):
+            lote = jogos[inicio:inicio + tamanho_lote]
+            respostas = nba_api_client.get_player_statistics_many([jogo.id for jogo in lote])
+            linhas = []
+            novos_estados = []
+            jogos_com_stats = []
+            for idx, jogo in enumerate(lote, start=inicio + 1):
+                logger.info(f"[{idx}/{total_jogos}] Stats jogadores jogo={jogo.id}...")
+                if not respostas.get(jogo.id):
+                    total_erros = total_erros + 1
+                    logger.warning(f"[{idx}/{total_jogos}] API vazia — jogo={jogo.id}.")
+                    continue
+                hash_payload = hash_resposta(respostas[jogo.id])
+                if not forcar and resposta_inalterada(estados.get(jogo.id), jogo, hash_payload):
+                    # mesma resposta da ultima carga: so atualiza a marca d'agua
+                    novos_estados.append(montar_estado(CARGA_STATS_JOGADORES, jogo, hash_payload, estados[jogo.id].rows_written))
+                    continue
+                linhas_jogo = normalizar_stats_jogadores(jogo.id, jogo.season, respostas[jogo.id], ids_jogadores)
+                linhas.extend(linhas_jogo)
+                novos_estados.append(montar_estado(CARGA_STATS_JOGADORES, jogo, hash_payload, len(linhas_jogo)))
+                jogos_com_stats.append(jogo.id)
+
             try:
-                carregar_stats_jogador(game_id=jogo.id)
-                time.sleep(1)
+                resumo = upsert_stats_jogadores(db, linhas)
+                registrar_estados(db, novos_estados)
+                db.commit()
+                for game_id in jogos_com_stats:
+                    atualizar_defesa_jogo(db, game_id)
+                db.commit()
             except Exception as erro:
-                total_erros = total_erros + 1
-                logger.warning(f"[{idx}/{total_jogos}] Erro jogo={jogo.id}: {erro}")
+                db.rollback()
+                total_erros = total_erros + len(jogos_com_stats)
+                logger.warning(f"Erro no lote de jogos {inicio + 1}-{inicio + len(lote)}: {erro}")
                 continue
 
-            if idx % 50 == 0:
-                logger.info(f"Progresso: {idx}/{total_jogos} jogos processados ({round(idx/total_jogos*100)}%).")
+            total_inseridos = total_inseridos + resumo["inseridos"]
+            total_atualizados = total_atualizados + resumo["atualizados"]
+            processados = inicio + len(lote)
+            logger.info(f"Progresso: {processados}/{total_jogos} jogos processados ({round(processados/total_jogos*100)}%) — ins={resumo['inseridos']} atu={resumo['atualizados']}.")
+
+        if total_inseridos + total_atualizados > 0:
+            invalidar_feature_store(season)
+            registrar_nova_versao_dados(season)
 
         if total_erros > 0:
             logger.warning(f"Fim com erros — erros={total_erros} total={total_jogos}.")
         else:
             logger.info(f"Fim — {total_jogos} jogos processados sem erros.")
+        logger.info(f"Stats em massa — ins={total_inseridos} atu={total_atualizados}.")
 
 
 if __name__ == "__main__":
@@ -1,21 +1,24 @@
 from datetime import datetime, timedelta
-import time
 
 from sqlalchemy import or_
 
-from app.services import nba_api_client
-from app.db.models import Game, GameTeamStats, Team, TeamSeasonStats
+from app.config import config
+from app.services import nba_api_client, cache_api
+from app.db.models import Game, Team, TeamSeasonStats
 from app.db.db_utils import get_db
-from app.etl.func_normalize import _normalizar_string, _normalizar_inteiro, _normalizar_decimal
+from app.etl.func_normalize import _normalizar_inteiro, _normalizar_decimal
+from app.etl.upsert_stats import carregar_ids_times, normalizar_stats_times, upsert_stats_times
+from app.etl.estado_carga import CARGA_STATS_TIMES, filtrar_pendentes, hash_resposta, resposta_inalterada, montar_estado, registrar_estados
 from app.core.logging_config import configurar_logger
 
 logger = configurar_logger(__name__)
 
 LIGA_NBA_STANDARD = "standard"
 
-def carregar_stats_times_jogo(game_id):
+def carregar_stats_times_jogo(game_id, dados_stats=None):
     logger.info(f"Stats times — jogo={game_id}...")
-    dados_stats = nba_api_client.get_game_statistics(game_id=game_id)
+    if dados_stats is None:
+        dados_stats = nba_api_client.get_game_statistics(game_id=game_id)
 
     if not dados_stats:
         logger.warning(f"API vazia — jogo={game_id}.")
@@ -28,99 +31,14 @@ def carregar_stats_times_jogo(game_id):
             logger.warning(f"Jogo {game_id} nao encontrado.")
             return
 
-        total_inseridos = 0
-        total_atualizados = 0
-
-        for item in dados_stats:
-            info_time = item.get("team")
-            if not isinstance(info_time, dict):
-                continue
-
-            id_time = _normalizar_inteiro(info_time.get("id"))
-            if not id_time:
-                continue
-
-            time_existe = db.query(Team).filter(Team.id == id_time).first()
-            if not time_existe:
-                continue
-
-            estatisticas = item.get("statistics")
-            if isinstance(estatisticas, list) and len(estatisticas) > 0:
-                estatisticas = estatisticas[0]
-            elif not isinstance(estatisticas, dict):
-                continue
-
-            stats_existente = db.query(GameTeamStats).filter(GameTeamStats.game_id == game_id, GameTeamStats.team_id == id_time).first()
-
-            if stats_existente:
-                logger.info(f"Atualiza stat time={id_time} jogo={game_id}.")
-                stats_existente.fast_break_points = _normalizar_inteiro(estatisticas.get("fastBreakPoints"))
-                stats_existente.points_in_paint = _normalizar_inteiro(estatisticas.get("pointsInPaint"))
-                stats_existente.biggest_lead = _normalizar_inteiro(estatisticas.get("biggestLead"))
-                stats_existente.second_chance_points = _normalizar_inteiro(estatisticas.get("secondChancePoints"))
-                stats_existente.points_off_turnovers = _normalizar_inteiro(estatisticas.get("pointsOffTurnovers"))
-                stats_existente.longest_run = _normalizar_inteiro(estatisticas.get("longestRun"))
-                stats_existente.points = _normalizar_inteiro(estatisticas.get("points"))
-                stats_existente.fgm = _normalizar_inteiro(estatisticas.get("fgm"))
-                stats_existente.fga = _normalizar_inteiro(estatisticas.get("fga"))
-                stats_existente.fgp = _normalizar_decimal(estatisticas.get("fgp"))
-                stats_existente.ftm = _normalizar_inteiro(estatisticas.get("ftm"))
-                stats_existente.fta = _normalizar_inteiro(estatisticas.get("fta"))
-                stats_existente.ftp = _normalizar_decimal(estatisticas.get("ftp"))
-                stats_existente.tpm = _normalizar_inteiro(estatisticas.get("tpm"))
-                stats_existente.tpa = _normalizar_inteiro(estatisticas.get("tpa"))
-                stats_existente.tpp = _normalizar_decimal(estatisticas.get("tpp"))
-                stats_existente.off_reb = _normalizar_inteiro(estatisticas.get("offReb"))
-                stats_existente.def_reb = _normalizar_inteiro(estatisticas.get("defReb"))
-                stats_existente.tot_reb = _normalizar_inteiro(estatisticas.get("totReb"))
-                stats_existente.assists = _normalizar_inteiro(estatisticas.get("assists"))
-                stats_existente.p_fouls = _normalizar_inteiro(estatisticas.get("pFouls"))
-                stats_existente.steals = _normalizar_inteiro(estatisticas.get("steals"))
-                stats_existente.turnovers = _normalizar_inteiro(estatisticas.get("turnovers"))
-                stats_existente.blocks = _normalizar_inteiro(estatisticas.get("blocks"))
-                stats_existente.plus_minus = _normalizar_inteiro(estatisticas.get("plusMinus"))
-                stats_existente.minutes = _normalizar_string(estatisticas.get("min"))
-                total_atualizados += 1
-                continue
-
-            logger.info(f"Insere stat time={id_time} jogo={game_id}.")
-            nova_stat = GameTeamStats(
-                game_id=game_id,
-                team_id=id_time,
-                fast_break_points=_normalizar_inteiro(estatisticas.get("fastBreakPoints")),
-                points_in_paint=_normalizar_inteiro(estatisticas.get("pointsInPaint")),
-                biggest_lead=_normalizar_inteiro(estatisticas.get("biggestLead")),
-                second_chance_points=_normalizar_inteiro(estatisticas.get("secondChancePoints")),
-                points_off_turnovers=_normalizar_inteiro(estatisticas.get("pointsOffTurnovers")),
-                longest_run=_normalizar_inteiro(estatisticas.get("longestRun")),
-                points=_normalizar_inteiro(estatisticas.get("points")),
-                fgm=_normalizar_inteiro(estatisticas.get("fgm")),
-                fga=_normalizar_inteiro(estatisticas.get("fga")),
-                fgp=_normalizar_decimal(estatisticas.get("fgp")),
-                ftm=_normalizar_inteiro(estatisticas.get("ftm")),
-                fta=_normalizar_inteiro(estatisticas.get("fta")),
-                ftp=_normalizar_decimal(estatisticas.get("ftp")),
-                tpm=_normalizar_inteiro(estatisticas.get("tpm")),
-                tpa=_normalizar_inteiro(estatisticas.get("tpa")),
-                tpp=_normalizar_decimal(estatisticas.get("tpp")),
-                off_reb=_normalizar_inteiro(estatisticas.get("offReb")),
-                def_reb=_normalizar_inteiro(estatisticas.get("defReb")),
-                tot_reb=_normalizar_inteiro(estatisticas.get("totReb")),
-                assists=_normalizar_inteiro(estatisticas.get("assists")),
-                p_fouls=_normalizar_inteiro(estatisticas.get("pFouls")),
-                steals=_normalizar_inteiro(estatisticas.get("steals")),
-                turnovers=_normalizar_inteiro(estatisticas.get("turnovers")),
-                blocks=_normalizar_inteiro(estatisticas.get("blocks")),
-                plus_minus=_normalizar_inteiro(estatisticas.get("plusMinus")),
-                minutes=_normalizar_string(estatisticas.get("min")),
-            )
-            db.add(nova_stat)
-            total_inseridos += 1
+        linhas = normalizar_stats_times(game_id, dados_stats, carregar_ids_times(db))
+        resumo = upsert_stats_times(db, linhas)
+        registrar_estados(db, [montar_estado(CARGA_STATS_TIMES, jogo, hash_resposta(dados_stats), len(linhas))])
 
         db.commit()
-        logger.info(f"Fim jogo={game_id} — ins={total_inseridos} atu={total_atualizados}.")
+        logger.info(f"Fim jogo={game_id} — ins={resumo['inseridos']} atu={resumo['atualizados']}.")
 
-def carregar_stats_todos_times(season, team_id=None, data=None):
+def carregar_stats_todos_times(season, team_id=None, data=None, forcar=False):
     logger.info(f"Stats times em massa — temp={season} data={data}...")
 
     for db in get_db():
@@ -139,22 +57,61 @@ def carregar_stats_todos_times(season, team_id=None, data=None):
             logger.warning(f"Nenhum jogo — temp={season} data={data}.")
             return
 
+        jogos, estados = filtrar_pendentes(db, CARGA_STATS_TIMES, jogos, forcar=forcar)
+        if not jogos:
+            logger.info(f"Nada a carregar — temp={season} data={data}: todos os jogos ja estao encerrados e carregados.")
+            return
+
         total_jogos = len(jogos)
         logger.info(f"{total_jogos} jogos encontrados — temp={season}.")
         total_erros = 0
 
-        for idx, jogo in enumerate(jogos, start=1):
-            logger.info(f"[{idx}/{total_jogos}] Stats times jogo={jogo.id}...")
+        # jogos encerrados no banco: respostas deles ficam no cache da API sem expirar
+        cache_api.marcar_jogos_finalizados([j.id for j in jogos if j.status_short == 3])
+
+        ids_times = carregar_ids_times(db)
+        total_inseridos = 0
+        total_atualizados = 0
+
+        # busca concorrente por lote; o ritmo fica com o limitador do cliente.
+        # cada lote de jogos vira um unico upsert
+        tamanho_lote = max(config.API_SPORTS_LOTE_JOGOS, 1)
+        for inicio in range(0, total_jogos, tamanho_lote):
+            lote = jogos[inicio:inicio + tamanho_lote]
+            respostas = nba_api_client.get_game_statistics_many([jogo.id for jogo in lote])
+            linhas = []
+            novos_estados = []
+            total_com_stats = 0
+            for idx, jogo in enumerate(lote, start=inicio + 1):
+                logger.info(f"[{idx}/{total_jogos}] Stats times jogo={jogo.id}...")
+                if not respostas.get(jogo.id):
+                    total_erros += 1
+                    logger.warning(f"[{idx}/{total_jogos}] API vazia — jogo={jogo.id}.")
+                    continue
+                hash_payload = hash_resposta(respostas[jogo.id])
+                if not forcar and resposta_inalterada(estados.get(jogo.id), jogo, hash_payload):
+                    # mesma resposta da ultima carga: so atualiza a marca d'agua
+                    novos_estados.append(montar_estado(CARGA_STATS_TIMES, jogo, hash_payload, estados[jogo.id].rows_written))
+                    continue
+                linhas_jogo = normalizar_stats_times(jogo.id, respostas[jogo.id], ids_times)
+                linhas.extend(linhas_jogo)
+                novos_estados.append(montar_estado(CARGA_STATS_TIMES, jogo, hash_payload, len(linhas_jogo)))
+                total_com_stats += 1
+
             try:
-                carregar_stats_times_jogo(game_id=jogo.id)
-                time.sleep(1)
+                resumo = upsert_stats_times(db, linhas)
+                registrar_estados(db, novos_estados)
+                db.commit()
             except Exception as erro:
-                total_erros += 1
-                logger.warning(f"[{idx}/{total_jogos}] Erro jogo={jogo.id}: {erro}")
+                db.rollback()
+                total_erros += total_com_stats
+                logger.warning(f"Erro no lote de jogos {inicio + 1}-{inicio + len(lote)}: {erro}")
                 continue
 
-            if idx % 50 == 0:
-                logger.info(f"Progresso: {idx}/{total_jogos} jogos processados ({round(idx/total_jogos*100)}%).")
+            total_inseridos += resumo["inseridos"]
+            total_atualizados += resumo["atualizados"]
+            processados = inicio + len(lote)
+            logger.info(f"Progresso: {processados}/{total_jogos} jogos processados ({round(processados/total_jogos*100)}%) — ins={resumo['inseridos']} atu={resumo['atualizados']}.")
 
         if total_erros > 0:
             logger.warning(f"Fim com erros — erros={total_erros} total={total_jogos}.")
@@ -0,0 +1,76 @@
+import json
+import hashlib
+from sqlalchemy import func
+from datetime import datetime, timezone
+
+from app.db.models import EtlGameLoadState
+from app.etl.upsert_stats import _upsert
+from app.core.logging_config import configurar_logger
+
+logger = configurar_logger(__name__)
+
+# marca d'agua por jogo e por carga: jogo que ja foi carregado encerrado
+# (status 3) e continua encerrado no banco nao volta a ser buscado na API
+CARGA_STATS_JOGADORES = "stats_jogadores"
+CARGA_STATS_TIMES = "stats_times"
+STATUS_FINALIZADO = 3
+
+
+def hash_resposta(resposta):
+    texto = json.dumps(resposta, sort_keys=True, default=str)
+    return hashlib.sha256(texto.encode("utf-8")).hexdigest()
+
+
+def carregar_estados(db, carga, game_ids):
+    estados = {}
+    if not game_ids:
+        return estados
+    registros = db.query(EtlGameLoadState).filter(EtlGameLoadState.load_name == carga, EtlGameLoadState.game_id.in_(game_ids))
+    for registro in registros:
+        estados[registro.game_id] = registro
+    return estados
+
+
+def precisa_carregar(jogo, estado):
+    # novo, ainda em andamento na ultima carga ou com status alterado desde entao
+    if estado is None:
+        return True
+    if estado.source_status != STATUS_FINALIZADO or estado.rows_written == 0:
+        return True
+    return jogo.status_short != estado.source_status
+
+
+def filtrar_pendentes(db, carga, jogos, forcar=False):
+    estados = carregar_estados(db, carga, [jogo.id for jogo in jogos])
+    if forcar:
+        return jogos, estados
+    pendentes = []
+    for jogo in jogos:
+        if precisa_carregar(jogo, estados.get(jogo.id)):
+            pendentes.append(jogo)
+    if len(pendentes) < len(jogos):
+        logger.info(f"Marca d'agua {carga}: {len(jogos) - len(pendentes)} jogos ja carregados e encerrados pulados.")
+    return pendentes, estados
+
+
+def resposta_inalterada(estado, jogo, hash_payload):
+    # com mudanca de status regrava mesmo com payload igual (ex.: defesa so roda com o jogo encerrado)
+    if estado is None or estado.source_status != jogo.status_short:
+        return False
+    return estado.payload_hash == hash_payload
+
+
+def montar_estado(carga, jogo, hash_payload, linhas_gravadas):
+    estado = {}
+    estado["game_id"] = jogo.id
+    estado["load_name"] = carga
+    estado["fetched_at"] = datetime.now(timezone.utc)
+    estado["source_status"] = jogo.status_short
+    estado["payload_hash"] = hash_payload
+    estado["rows_written"] = linhas_gravadas
+    return estado
+
+
+def registrar_estados(db, estados):
+    # vai na mesma transacao do upsert das stats: so marca o que foi gravado
+    return _upsert(db, EtlGameLoadState, ["game_id", "load_name"], estados, {"updated_at": func.now()})
@@ -11,6 +11,9 @@ from app.etl.carregar_jogadores_franquias import carregar_jogadores_franquias
 from app.etl.carregar_partidas import carregar_partidas
 from app.etl.carregar_stats_jogadores import carregar_stats_jogador, carregar_stats_todos_jogadores
 from app.etl.carregar_stats_times import carregar_stats_times_jogo, carregar_stats_todos_times
+from app.db.db_utils import get_db
+from app.services.defesa_service import reconstruir_defesa_temporada
+from app.services.zona_bruta import ativar_modo_replay
 
 configurar_logging()
 logger = logging.getLogger(__name__)
@@ -36,7 +39,7 @@ def main():
         choices=[
             "temporadas", "ligas", "times", "jogadores", "jogadores_times",
             "partidas", "stats_jogador", "stats_jogador_massa",
-            "stats_times", "stats_times_massa", "all"
+            "stats_times", "stats_times_massa", "defesa_times", "all"
         ],
         required=True,
         help="Escolha o tipo de dado a ser carregado"
@@ -44,9 +47,17 @@ def main():
     parser.add_argument("--team_id", dest="team_id", type=int, required=False, help="ID do time")
     parser.add_argument("--date", type=str, required=False, help="Data para carregar jogos (formato: YYYY-MM-DD).")
     parser.add_argument("--game_id", dest="game_id", type=int, required=False, help="ID do jogo.")
+    parser.add_argument("--replay", action="store_true", help="Reprocessa as respostas gravadas na zona bruta, sem chamar a API.")
+    parser.add_argument("--force", action="store_true", help="Ignora a marca d'agua das cargas em massa e recarrega todos os jogos.")
 
     args = parser.parse_args()
 
+    if args.replay:
+        ativar_modo_replay()
+        logger.info("Modo replay: respostas lidas da zona bruta, sem acesso a API.")
+        # replay existe para reprocessar: a marca d'agua nao pode pular jogos
+        args.force = True
+
     if args.load == "temporadas":
         carregar_temporadas()
 
@@ -84,7 +95,7 @@ def main():
         if not args.season:
             logger.error("Para carregar stats_jogador_massa, informe --season.")
             sys.exit(1)
-        carregar_stats_todos_jogadores(season=args.season, team_id=args.team_id)
+        carregar_stats_todos_jogadores(season=args.season, team_id=args.team_id, forcar=args.force)
 
     elif args.load == "stats_times":
         if not args.game_id:
@@ -96,7 +107,14 @@ def main():
         if not args.season:
             logger.error("Para carregar stats_times_massa, informe --season.")
             sys.exit(1)
-        carregar_stats_todos_times(season=args.season, team_id=args.team_id)
+        carregar_stats_todos_times(season=args.season, team_id=args.team_id, forcar=args.force)
+
+    elif args.load == "defesa_times":
+        if not args.season:
+            logger.error("Para carregar defesa_times, informe --season.")
+            sys.exit(1)
+        for db in get_db():
+            reconstruir_defesa_temporada(db=db, season=args.season)
 
     elif args.load == "all":
         if not args.season:
@@ -107,8 +125,10 @@ def main():
         carregar_times()
         carregar_jogadores_franquias(season=args.season)
         carregar_partidas(season=args.season, date=args.date, team_id=args.team_id)
-        carregar_stats_todos_jogadores(season=args.season)
-        carregar_stats_todos_times(season=args.season)
+        carregar_stats_todos_jogadores(season=args.season, forcar=args.force)
+        carregar_stats_todos_times(season=args.season, forcar=args.force)
+        for db in get_db():
+            reconstruir_defesa_temporada(db=db, season=args.season)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
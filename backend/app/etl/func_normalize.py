@@ -59,4 +59,33 @@ def _normalizar_boolean(valor):
             return False
     if isinstance(valor, int):
         return bool(valor)
-    return None
\ No newline at end of file
+    return None
+
+def _normalizar_segundos(valor):
+    # "MM:SS" ou minutos decimais ("25.5", 32) -> segundos inteiros
+    if valor is None or isinstance(valor, bool):
+        return None
+    if isinstance(valor, (int, float)):
+        return int(round(valor * 60))
+    valor = str(valor).strip()
+    if valor in STRINGS_NULAS_INVALIDAS:
+        return None
+    try:
+        if ":" in valor:
+            partes = valor.split(":")
+            return int(partes[0]) * 60 + int(partes[1])
+        return int(round(float(valor) * 60))
+    except (TypeError, ValueError, IndexError):
+        return None
+
+def _segundos_para_minutos(segundos):
+    if not segundos:
+        return 0.0
+    return segundos / 60.0
+
+def _segundos_do_registro(stat):
+    # prefere a coluna numerica; linhas antigas ainda sem backfill caem no texto
+    segundos = getattr(stat, "seconds_played", None)
+    if isinstance(segundos, int) and not isinstance(segundos, bool):
+        return segundos
+    return _normalizar_segundos(getattr(stat, "minutes", None))
@@ -0,0 +1,182 @@
+from sqlalchemy.dialects import postgresql, sqlite
+
+from app.config import config
+from app.db.models import Player, Team, PlayerGameStats, GameTeamStats
+from app.etl.func_normalize import _normalizar_string, _normalizar_inteiro, _normalizar_decimal, _normalizar_segundos
+from app.core.logging_config import configurar_logger
+
+logger = configurar_logger(__name__)
+
+# coluna do banco -> (campo da API, normalizador)
+CAMPOS_STATS_JOGADOR = {
+    "pos": ("pos", _normalizar_string),
+    "minutes": ("min", _normalizar_string),
+    "seconds_played": ("min", _normalizar_segundos),
+    "comment": ("comment", _normalizar_string),
+    "points": ("points", _normalizar_inteiro),
+    "fgm": ("fgm", _normalizar_inteiro),
+    "fga": ("fga", _normalizar_inteiro),
+    "fgp": ("fgp", _normalizar_decimal),
+    "ftm": ("ftm", _normalizar_inteiro),
+    "fta": ("fta", _normalizar_inteiro),
+    "ftp": ("ftp", _normalizar_decimal),
+    "tpm": ("tpm", _normalizar_inteiro),
+    "tpa": ("tpa", _normalizar_inteiro),
+    "tpp": ("tpp", _normalizar_decimal),
+    "off_reb": ("offReb", _normalizar_inteiro),
+    "def_reb": ("defReb", _normalizar_inteiro),
+    "tot_reb": ("totReb", _normalizar_inteiro),
+    "assists": ("assists", _normalizar_inteiro),
+    "p_fouls": ("pFouls", _normalizar_inteiro),
+    "steals": ("steals", _normalizar_inteiro),
+    "turnovers": ("turnovers", _normalizar_inteiro),
+    "blocks": ("blocks", _normalizar_inteiro),
+    "plus_minus": ("plusMinus", _normalizar_inteiro),
+}
+
+CAMPOS_STATS_TIME = {
+    "fast_break_points": ("fastBreakPoints", _normalizar_inteiro),
+    "points_in_paint": ("pointsInPaint", _normalizar_inteiro),
+    "biggest_lead": ("biggestLead", _normalizar_inteiro),
+    "second_chance_points": ("secondChancePoints", _normalizar_inteiro),
+    "points_off_turnovers": ("pointsOffTurnovers", _normalizar_inteiro),
+    "longest_run": ("longestRun", _normalizar_inteiro),
+    "points": ("points", _normalizar_inteiro),
+    "fgm": ("fgm", _normalizar_inteiro),
+    "fga": ("fga", _normalizar_inteiro),
+    "fgp": ("fgp", _normalizar_decimal),
+    "ftm": ("ftm", _normalizar_inteiro),
+    "fta": ("fta", _normalizar_inteiro),
+    "ftp": ("ftp", _normalizar_decimal),
+    "tpm": ("tpm", _normalizar_inteiro),
+    "tpa": ("tpa", _normalizar_inteiro),
+    "tpp": ("tpp", _normalizar_decimal),
+    "off_reb": ("offReb", _normalizar_inteiro),
+    "def_reb": ("defReb", _normalizar_inteiro),
+    "tot_reb": ("totReb", _normalizar_inteiro),
+    "assists": ("assists", _normalizar_inteiro),
+    "p_fouls": ("pFouls", _normalizar_inteiro),
+    "steals": ("steals", _normalizar_inteiro),
+    "turnovers": ("turnovers", _normalizar_inteiro),
+    "blocks": ("blocks", _normalizar_inteiro),
+    "plus_minus": ("plusMinus", _normalizar_inteiro),
+    "minutes": ("min", _normalizar_string),
+}
+
+
+def carregar_ids_jogadores(db):
+    ids = set()
+    for (player_id,) in db.query(Player.id):
+        ids.add(player_id)
+    return ids
+
+
+def carregar_ids_times(db):
+    ids = set()
+    for (team_id,) in db.query(Team.id):
+        ids.add(team_id)
+    return ids
+
+
+def _id_aninhado(info):
+    if isinstance(info, dict):
+        return _normalizar_inteiro(info.get("id"))
+    return None
+
+
+def _aplicar_campos(linha, origem, campos):
+    for coluna in campos:
+        campo_api, normalizador = campos[coluna]
+        linha[coluna] = normalizador(origem.get(campo_api))
+    return linha
+
+
+def normalizar_stats_jogadores(game_id, season, itens, ids_jogadores):
+    linhas = []
+    for item in itens:
+        id_jogador = _id_aninhado(item.get("player"))
+        id_franquia = _id_aninhado(item.get("team"))
+        if not id_jogador or not id_franquia:
+            continue
+        if id_jogador not in ids_jogadores:
+            continue
+        linha = {"game_id": game_id, "season": season, "player_id": id_jogador, "team_id": id_franquia}
+        linhas.append(_aplicar_campos(linha, item, CAMPOS_STATS_JOGADOR))
+    return linhas
+
+
+def normalizar_stats_times(game_id, itens, ids_times):
+    linhas = []
+    for item in itens:
+        id_time = _id_aninhado(item.get("team"))
+        if not id_time or id_time not in ids_times:
+            continue
+        estatisticas = item.get("statistics")
+        if isinstance(estatisticas, list) and len(estatisticas) > 0:
+            estatisticas = estatisticas[0]
+        elif not isinstance(estatisticas, dict):
+            continue
+        linha = {"game_id": game_id, "team_id": id_time}
+        linhas.append(_aplicar_campos(linha, estatisticas, CAMPOS_STATS_TIME))
+    return linhas
+
+
+def _sem_chaves_repetidas(linhas, colunas_chave):
+    # duas linhas com a mesma chave no mesmo INSERT quebram o ON CONFLICT DO UPDATE; vale a ultima
+    por_chave = {}
+    for linha in linhas:
+        por_chave[tuple(linha[coluna] for coluna in colunas_chave)] = linha
+    return list(por_chave.values())
+
+
+def _chaves_existentes(db, modelo, colunas_chave, linhas):
+    game_ids = set()
+    for linha in linhas:
+        game_ids.add(linha["game_id"])
+    atributos = [getattr(modelo, coluna) for coluna in colunas_chave]
+    existentes = set()
+    for registro in db.query(*atributos).filter(modelo.game_id.in_(game_ids)):
+        existentes.add(tuple(registro))
+    return existentes
+
+
+def _upsert(db, modelo, colunas_chave, linhas, valores_extras=None):
+    resumo = {"inseridos": 0, "atualizados": 0}
+    linhas = _sem_chaves_repetidas(linhas, colunas_chave)
+    if not linhas:
+        return resumo
+    if db.get_bind().dialect.name == "sqlite":
+        construtor = sqlite.insert
+    else:
+        construtor = postgresql.insert
+
+    tamanho_lote = max(config.ETL_LOTE_UPSERT, 1)
+    for inicio in range(0, len(linhas), tamanho_lote):
+        lote = linhas[inicio:inicio + tamanho_lote]
+        # uma consulta por lote separa inseridos de atualizados para os logs
+        existentes = _chaves_existentes(db, modelo, colunas_chave, lote)
+        for linha in lote:
+            if tuple(linha[coluna] for coluna in colunas_chave) in existentes:
+                resumo["atualizados"] = resumo["atualizados"] + 1
+            else:
+                resumo["inseridos"] = resumo["inseridos"] + 1
+
+        comando = construtor(modelo.__table__).values(lote)
+        novos_valores = {}
+        for coluna in lote[0]:
+            if coluna not in colunas_chave:
+                novos_valores[coluna] = comando.excluded[coluna]
+        # o ON CONFLICT DO UPDATE nao dispara o onupdate do ORM: colunas como updated_at vem por aqui
+        if valores_extras:
+            novos_valores.update(valores_extras)
+        comando = comando.on_conflict_do_update(index_elements=colunas_chave, set_=novos_valores)
+        db.execute(comando)
+    return resumo
+
+
+def upsert_stats_jogadores(db, linhas):
+    return _upsert(db, PlayerGameStats, ["player_id", "game_id"], linhas)
+
+
+def upsert_stats_times(db, linhas):
+    return _upsert(db, GameTeamStats, ["game_id", "team_id"], linhas)
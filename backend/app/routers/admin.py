@@ -1,7 +1,7 @@
 import os
 import logging
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
 from fastapi.responses import FileResponse
 from sqlalchemy.orm import Session
 
@@ -92,27 +92,69 @@ def baixar_relatorio(nome_arquivo: str, usuario=Depends(obter_usuario_admin)):
 
 
 @router.post("/retreinar")
-def retreinar_manualmente(db: Session = Depends(get_db), usuario=Depends(obter_usuario_admin)):
+def retreinar_manualmente(aquecer: bool = Query(default=True), completo: bool = Query(default=False), db: Session = Depends(get_db), usuario=Depends(obter_usuario_admin)):
     from app.config import config
-    from app.services.modelo_service import retreinar_todos_modelos
+    from app.services.modelo_service import aquecer_registro_modelos, retreinar_todos_modelos
     from app.services.relatorio_service import gerar_e_salvar_relatorio
 
     season = config.NBA_SEASON
 
-    resultado = retreinar_todos_modelos(db=db, season=season)
+    resultado = retreinar_todos_modelos(db=db, season=season, forcar_completo=completo)
+    resumo_unidades = {"pulados": resultado["total_pulados"], "retreinados": resultado["total_retreinados"], "novos": resultado["total_novos"]}
 
     caminho_pdf = None
     try:
-        caminho_pdf = gerar_e_salvar_relatorio(db=db, season=season, total_registros_db=resultado["total_registros_db"], total_jogadores_treino=resultado["total_jogadores_treino"], total_modelos_salvos=resultado["total_salvos"], total_erros=resultado["total_erros"])
+        caminho_pdf = gerar_e_salvar_relatorio(db=db, season=season, total_registros_db=resultado["total_registros_db"], total_jogadores_treino=resultado["total_jogadores_treino"], total_modelos_salvos=resultado["total_salvos"], total_erros=resultado["total_erros"], resumo_unidades=resumo_unidades)
     except Exception as erro:
         logger.warning(f"Falha ao gerar relatorio apos retreino manual: {erro}")
 
     nome_pdf = os.path.basename(caminho_pdf) if caminho_pdf else None
 
+    modelos_aquecidos = 0
+    if aquecer:
+        modelos_aquecidos = aquecer_registro_modelos()
+
     return {
         "mensagem": "Retreinamento concluido",
         "modelos_salvos": resultado["total_salvos"],
         "erros": resultado["total_erros"],
         "jogadores_treinados": resultado["total_jogadores_treino"],
         "relatorio_gerado": nome_pdf,
-    }
\ No newline at end of file
+        "modelos_aquecidos": modelos_aquecidos,
+        "unidades_treino": resultado["total_unidades"],
+        "unidades_puladas": resultado["total_pulados"],
+        "unidades_retreinadas": resultado["total_retreinados"],
+        "unidades_novas": resultado["total_novos"],
+        "unidades_incrementais": resultado["total_incrementais"],
+        "erros_unidades": resultado["erros_unidades"],
+        "workers": resultado["workers"],
+        "duracao_segundos": resultado["duracao_segundos"],
+    }
+
+
+@router.get("/modelos/registro")
+def consultar_registro_modelos(usuario=Depends(obter_usuario_admin)):
+    from app.services.modelo_service import estatisticas_registro_modelos
+    return estatisticas_registro_modelos()
+
+
+@router.get("/predicoes/cache")
+def consultar_cache_predicoes(usuario=Depends(obter_usuario_admin)):
+    from app.services.cache_predicoes import estatisticas_cache_predicoes
+    return estatisticas_cache_predicoes()
+
+
+@router.delete("/predicoes/cache")
+def limpar_cache_predicoes(temporada: int = Query(default=None), usuario=Depends(obter_usuario_admin)):
+    from app.services.cache_predicoes import invalidar_cache_predicoes, estatisticas_cache_predicoes
+
+    total = invalidar_cache_predicoes(temporada)
+    return {"entradas_removidas": total, "cache": estatisticas_cache_predicoes()}
+
+
+@router.post("/modelos/aquecer")
+def aquecer_modelos(usuario=Depends(obter_usuario_admin)):
+    from app.services.modelo_service import aquecer_registro_modelos, estatisticas_registro_modelos
+
+    total = aquecer_registro_modelos()
+    return {"modelos_carregados": total, "registro": estatisticas_registro_modelos()}
\ No newline at end of file
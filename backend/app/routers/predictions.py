@@ -13,6 +13,7 @@ from app.routers.auth import obter_usuario_atual
 from app.services.manager_service import salvar_predicoes_dia_atual, salvar_predicoes_temporada
 from app.services.prediction_service import prever_performance_jogador, prever_multiplas_stats_jogador
 from app.services.formatar_palpites import formatar_palpite
+from app.services import cache_predicoes
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
@@ -37,12 +38,17 @@ def _validar_jogo(db, game_id):
 
 @router.get("/prever/jogador/{jogador_id}/vs/{time_adversario_id}")
 def get_predicao(jogador_id: int, time_adversario_id: int, temporada: int = Query(...), estatistica: str = Query(default="points"), eh_casa: int = Query(default=1, ge=0, le=1), db: Session = Depends(get_db), usuario_atual=Depends(obter_usuario_atual)):
+    chave = cache_predicoes.montar_chave(jogador_id, time_adversario_id, temporada, eh_casa, estatistica)
+    resposta = cache_predicoes.obter(chave)
+    if resposta is not None:
+        return resposta
+
     jogador = _validar_jogador(db, jogador_id)
     time_adversario = _validar_time(db, time_adversario_id)
 
     previsao = prever_performance_jogador(db, jogador_id, time_adversario_id, temporada, estatistica, eh_casa)
 
-    return {
+    resposta = {
         "jogador_id": jogador_id,
         "jogador": f"{jogador.firstname} {jogador.lastname}",
         "adversario_id": time_adversario_id,
@@ -52,15 +58,22 @@ def get_predicao(jogador_id: int, time_adversario_id: int, temporada: int = Quer
         "eh_casa": eh_casa,
         "previsao": previsao,
     }
+    cache_predicoes.guardar(chave, resposta)
+    return resposta
 
 @router.get("/prever/jogador/{jogador_id}/vs/{time_adversario_id}/multiplas")
 def get_predicao_multiplas(jogador_id: int, time_adversario_id: int, temporada: int = Query(...), eh_casa: int = Query(default=1, ge=0, le=1), db: Session = Depends(get_db), usuario_atual=Depends(obter_usuario_atual)):
+    chave = cache_predicoes.montar_chave(jogador_id, time_adversario_id, temporada, eh_casa, "multiplas")
+    resposta = cache_predicoes.obter(chave)
+    if resposta is not None:
+        return resposta
+
     jogador = _validar_jogador(db, jogador_id)
     time_adversario = _validar_time(db, time_adversario_id)
 
     previsoes = prever_multiplas_stats_jogador(db, jogador_id, time_adversario_id, temporada, eh_casa)
 
-    return {
+    resposta = {
         "jogador_id": jogador_id,
         "jogador": f"{jogador.firstname} {jogador.lastname}",
         "adversario_id": time_adversario_id,
@@ -69,6 +82,8 @@ def get_predicao_multiplas(jogador_id: int, time_adversario_id: int, temporada:
         "eh_casa": eh_casa,
         "previsoes": previsoes,
     }
+    cache_predicoes.guardar(chave, resposta)
+    return resposta
 
 @router.get("/contagem-hoje")
 def contar_palpites_hoje(temporada_alvo: int = Depends(obter_temporada), db: Session = Depends(get_db)):
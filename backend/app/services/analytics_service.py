@@ -4,6 +4,8 @@ from app.db.models import Player, Team, Game, PlayerGameStats, GameTeamScore
 from datetime import datetime, timedelta
 import numpy as np
 from app.db.db_utils import get_db
+from app.services import defesa_service
+from app.etl.func_normalize import _segundos_do_registro, _segundos_para_minutos
 
 def converter_para_int(valor):
     if valor is None:
@@ -57,7 +59,7 @@ def calcular_totais_e_medias(stats_data):
         total_steals = total_steals + converter_para_int(stat.steals)
         total_blocks = total_blocks + converter_para_int(stat.blocks)
         total_turnovers = total_turnovers + converter_para_int(stat.turnovers)
-        total_minutes = total_minutes + converter_para_int(stat.minutes)
+        total_minutes = total_minutes + _segundos_para_minutos(_segundos_do_registro(stat))
         total_fgm = total_fgm + converter_para_int(stat.fgm)
         total_fga = total_fga + converter_para_int(stat.fga)
         total_tpm = total_tpm + converter_para_int(stat.tpm)
@@ -255,6 +257,9 @@ def calcular_medias_ultimos_dias(db, player_id, days, season=None):
     return resultado
 
 def calcular_defesa_adversaria_stat(db: Session, team_id: int, season: int, stat_name: str = "points"):
+    if stat_name in defesa_service.STATS_DEFESA:
+        return defesa_service.media_sofrida(db, team_id, season, stat_name, excluir_pre_temporada=False)
+
     stats_sofridas = (db.query(PlayerGameStats).join(Game, PlayerGameStats.game_id == Game.id)
                       .filter(Game.season == season, Game.status_short == 3, PlayerGameStats.team_id != team_id,
                               ((Game.home_team_id == team_id) | (Game.away_team_id == team_id))).all()
@@ -0,0 +1,329 @@
+import sys
+import json
+import time
+import logging
+import argparse
+import numpy as np
+
+from app.config import config
+from app.services import feature_store, modelo_service, snapshot_temporada
+from app.services.feature_store import _para_timestamp
+from app.services.gravador_predicoes import gravar_predicoes
+from app.services.prediction_service import _montar_vetores_solicitacao, _previsoes_vazias, _traduzir_chave_stat
+from app.services.replay_service import _avancar_minutos, _carregar_jogos, _carregar_minutos_temporada, _carregar_posicoes, _solicitacoes_do_jogo
+
+logger = logging.getLogger(__name__)
+
+# walk-forward: a cada passo os modelos sao treinados so com jogos anteriores ao
+# primeiro jogo do passo e pontuam os jogos ate o proximo passo; nada vai para o
+# banco a menos que gravar=True
+STATS_BACKTEST = modelo_service.STATS_PARA_TREINAR
+CHAVES_RESULTADO = {"points": "pontos", "assists": "assistencias", "tot_reb": "rebotes", "steals": "roubos", "blocks": "bloqueios"}
+SEGUNDOS_DIA = 86400
+
+
+def calcular_metricas(previsto, real):
+    # mesma regra de verificar_acerto_linha (linha = parte inteira + 0.5) sobre arrays
+    previsto = np.asarray(previsto, dtype=float)
+    real = np.asarray(real, dtype=float)
+    total = len(previsto)
+    if total == 0:
+        return {"total_avaliadas": 0, "total_acertos": 0, "win_rate": 0.0, "mae_medio": None, "rmse": None}
+
+    linha = np.trunc(previsto) + 0.5
+    acertos = np.where(previsto >= linha, real >= linha, real < linha)
+    erros = previsto - real
+    total_acertos = int(np.count_nonzero(acertos))
+
+    metricas = {}
+    metricas["total_avaliadas"] = total
+    metricas["total_acertos"] = total_acertos
+    metricas["win_rate"] = round(total_acertos / total * 100, 2)
+    metricas["mae_medio"] = round(float(np.mean(np.abs(erros))), 2)
+    metricas["rmse"] = round(float(np.sqrt(np.mean(erros ** 2))), 2)
+    return metricas
+
+
+def consolidar_metricas(avaliacoes):
+    # mesmo formato de calcular_win_rate: medias simples entre as stats com dados
+    resultado = {}
+    win_rates = []
+    maes = []
+    rmses = []
+    for stat_name in STATS_BACKTEST:
+        linhas = avaliacoes[stat_name]
+        metricas = calcular_metricas(linhas["previsto"], linhas["real"])
+        resultado[CHAVES_RESULTADO[stat_name]] = metricas
+        if metricas["total_avaliadas"] > 0:
+            win_rates.append(metricas["win_rate"])
+            maes.append(metricas["mae_medio"])
+            rmses.append(metricas["rmse"])
+    resultado["win_rate_geral"] = round(float(np.mean(win_rates)), 2) if win_rates else 0.0
+    resultado["mae_medio_geral"] = round(float(np.mean(maes)), 2) if maes else None
+    resultado["rmse_geral"] = round(float(np.mean(rmses)), 2) if rmses else None
+    return resultado
+
+
+def _novas_avaliacoes():
+    avaliacoes = {}
+    for stat_name in STATS_BACKTEST:
+        avaliacoes[stat_name] = {"previsto": [], "real": []}
+    return avaliacoes
+
+
+def _valores_reais(db, season):
+    # (player_id, game_id) -> linha do snapshot; so conta quem entrou em quadra
+    snapshot = snapshot_temporada.obter_snapshot(db, season)
+    colunas = snapshot["colunas"]
+    reais = {}
+    player_ids = colunas["player_id"].tolist()
+    game_ids = colunas["game_id"].tolist()
+    segundos = colunas["seconds_played"].tolist()
+    valores_stats = {}
+    for stat_name in STATS_BACKTEST:
+        valores_stats[stat_name] = colunas[stat_name].tolist()
+    for indice in range(len(player_ids)):
+        if not segundos[indice]:
+            continue
+        valores = {}
+        for stat_name in STATS_BACKTEST:
+            valores[stat_name] = valores_stats[stat_name][indice]
+        reais[(player_ids[indice], game_ids[indice])] = valores
+    return reais
+
+
+def _dados_ate_corte(dados_por_jogador, corte):
+    # views ate o corte; temporadas anteriores (historico) entram inteiras
+    truncados = {}
+    for player_id in dados_por_jogador:
+        jogos = dados_por_jogador[player_id]
+        total = int(np.searchsorted(jogos["timestamps"], corte, side="left"))
+        if total == 0:
+            continue
+        jogos_ate_corte = {}
+        for nome in jogos:
+            if nome == "historico":
+                jogos_ate_corte[nome] = jogos[nome]
+            else:
+                jogos_ate_corte[nome] = jogos[nome][:total]
+        truncados[player_id] = jogos_ate_corte
+    return truncados
+
+
+def _treinar_unidades_em_memoria(unidades):
+    from concurrent.futures import ProcessPoolExecutor
+
+    workers = min(modelo_service._quantidade_workers_retreino(), max(len(unidades), 1))
+    if workers <= 1:
+        respostas = [modelo_service._executar_unidade_treino(unidade, True) for unidade in unidades]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            respostas = list(executor.map(modelo_service._executar_unidade_treino, unidades, [True] * len(unidades)))
+
+    modelos = {}
+    for indice in range(len(unidades)):
+        player_id, stat_name, _, _, _ = unidades[indice]
+        erro, serializado, _ = respostas[indice]
+        if erro is not None:
+            logger.warning(f"Erro ao treinar no backtest: player_id={player_id}, stat={stat_name}: {erro}")
+            continue
+        modelos[(player_id, stat_name)] = modelo_service._desserializar_booster(serializado)
+    return modelos
+
+
+def _treinar_passo(dados_ate_corte, posicoes_treino, modelos_anteriores):
+    ids_jogadores = modelo_service._ids_jogadores_treino(dados_ate_corte)
+    if modelo_service.modo_agrupado_ativo():
+        modelos = {}
+        for stat_name in STATS_BACKTEST:
+            linhas, alvos, pesos = modelo_service._montar_amostras_agrupadas(dados_ate_corte, ids_jogadores, posicoes_treino, stat_name)
+            if not linhas:
+                continue
+            pesos_treino = None
+            if config.TREINO_TEMPORADAS_ANTERIORES > 0:
+                pesos_treino = np.array(pesos)
+            modelos[stat_name] = (len(alvos), modelo_service._treinar_modelo_agrupado(np.array(linhas), np.array(alvos), pesos_treino))
+        return modelos, len(modelos)
+
+    # jogador sem jogo novo desde o passo anterior reaproveita o modelo
+    unidades = modelo_service._montar_unidades_treino(dados_ate_corte, ids_jogadores)
+    modelos = {}
+    pendentes = []
+    for unidade in unidades:
+        chave = (unidade[0], unidade[1])
+        anterior = modelos_anteriores.get(chave)
+        if anterior is not None and anterior[0] == len(unidade[3]):
+            modelos[chave] = anterior
+            continue
+        pendentes.append(unidade)
+    treinados = _treinar_unidades_em_memoria(pendentes)
+    for unidade in pendentes:
+        chave = (unidade[0], unidade[1])
+        if chave in treinados:
+            modelos[chave] = (len(unidade[3]), treinados[chave])
+    return modelos, len(treinados)
+
+
+def _pontuar_passo(db, solicitacoes, season, modelos):
+    # monta os mesmos vetores da previsao em producao e chama predict uma vez por modelo
+    agrupado = modelo_service.modo_agrupado_ativo()
+    resultados = []
+    linhas_por_modelo = {}
+    for indice in range(len(solicitacoes)):
+        resultados.append(_previsoes_vazias())
+        try:
+            vetores = _montar_vetores_solicitacao(db, solicitacoes[indice], season)
+        except Exception as erro:
+            logger.warning(f"Erro ao montar features no backtest: player_id={solicitacoes[indice]['player_id']}: {erro}")
+            resultados[indice] = None
+            continue
+        for stat_name, vetor, contexto in vetores:
+            if agrupado:
+                chave = stat_name
+                linha = list(vetor) + contexto
+            else:
+                chave = (solicitacoes[indice]["player_id"], stat_name)
+                linha = list(vetor)
+            if chave not in modelos:
+                continue
+            if chave not in linhas_por_modelo:
+                linhas_por_modelo[chave] = []
+            linhas_por_modelo[chave].append((indice, stat_name, linha))
+
+    for chave in linhas_por_modelo:
+        linhas = linhas_por_modelo[chave]
+        valores = modelos[chave][1].predict(np.array([linha for _, _, linha in linhas]))
+        for posicao in range(len(linhas)):
+            indice, stat_name, _ = linhas[posicao]
+            resultados[indice][_traduzir_chave_stat(stat_name)] = round(float(valores[posicao]), 2)
+    return resultados
+
+
+def _acumular_avaliacoes(avaliacoes, solicitacoes, resultados, reais):
+    for indice in range(len(solicitacoes)):
+        if resultados[indice] is None:
+            continue
+        real = reais.get((solicitacoes[indice]["player_id"], solicitacoes[indice]["game_id"]))
+        if real is None:
+            continue
+        for stat_name in STATS_BACKTEST:
+            previsto = resultados[indice][_traduzir_chave_stat(stat_name)]
+            if previsto is None:
+                continue
+            avaliacoes[stat_name]["previsto"].append(previsto)
+            avaliacoes[stat_name]["real"].append(real[stat_name])
+
+
+def backtest_temporada(db, season, passo_dias=None, dias_aquecimento=None, gravar=False):
+    if passo_dias is None:
+        passo_dias = config.BACKTEST_PASSO_DIAS
+    if dias_aquecimento is None:
+        dias_aquecimento = config.BACKTEST_DIAS_AQUECIMENTO
+
+    inicio = time.monotonic()
+    jogos = _carregar_jogos(db, season)
+    if not jogos:
+        logger.warning(f"Nenhum jogo finalizado para o backtest: temporada={season}")
+        return None
+
+    dados_por_jogador = modelo_service._pre_carregar_dados_temporada(db, season)
+    reais = _valores_reais(db, season)
+    linhas_minutos = _carregar_minutos_temporada(db, season)
+    posicoes = _carregar_posicoes(db, season)
+    posicoes_treino = modelo_service._carregar_posicoes_temporada(db, season)
+    store = feature_store.obter_feature_store(db, season)
+
+    estado = {}
+    estado["posicao"] = 0
+    estado["minutos_por_time"] = {}
+    estado["elencos"] = {}
+
+    avaliacoes = _novas_avaliacoes()
+    inicio_avaliacao = _para_timestamp(jogos[0].date_start) + dias_aquecimento * SEGUNDOS_DIA
+    proximo_corte = inicio_avaliacao
+    modelos = {}
+    pendentes = []
+    total_passos = 0
+    total_treinados = 0
+    total_jogos = 0
+    total_gravadas = 0
+
+    for jogo in jogos + [None]:
+        timestamp = None
+        if jogo is not None:
+            timestamp = _para_timestamp(jogo.date_start)
+            _avancar_minutos(estado, linhas_minutos, timestamp)
+            if timestamp < inicio_avaliacao:
+                continue
+
+        if jogo is None or timestamp >= proximo_corte:
+            # fecha o passo anterior com os modelos dele antes de treinar os do proximo
+            if pendentes:
+                resultados = _pontuar_passo(db, pendentes, season, modelos)
+                _acumular_avaliacoes(avaliacoes, pendentes, resultados, reais)
+                if gravar:
+                    total_gravadas = total_gravadas + gravar_predicoes(db, pendentes, resultados, season)["inseridas"]
+                    db.commit()
+                pendentes = []
+            if jogo is None:
+                break
+            modelos, treinados = _treinar_passo(_dados_ate_corte(dados_por_jogador, timestamp), posicoes_treino, modelos)
+            total_passos = total_passos + 1
+            total_treinados = total_treinados + treinados
+            proximo_corte = timestamp + passo_dias * SEGUNDOS_DIA
+            logger.warning(f"Backtest: passo={total_passos}, modelos={len(modelos)}, treinados={treinados}, temporada={season}")
+
+        pendentes.extend(_solicitacoes_do_jogo(db, estado, store, posicoes, jogo, season))
+        total_jogos = total_jogos + 1
+
+    resultado = consolidar_metricas(avaliacoes)
+    resultado["temporada"] = season
+    resultado["jogos_avaliados"] = total_jogos
+    resultado["passos"] = total_passos
+    resultado["modelos_treinados"] = total_treinados
+    resultado["predicoes_gravadas"] = total_gravadas
+    resultado["duracao_segundos"] = round(time.monotonic() - inicio, 2)
+    logger.warning(f"Backtest concluido: temporada={season}, jogos={total_jogos}, passos={total_passos}, win_rate={resultado['win_rate_geral']}, mae={resultado['mae_medio_geral']}, duracao={resultado['duracao_segundos']}s")
+    return resultado, avaliacoes
+
+
+def executar_backtest(db, seasons, passo_dias=None, dias_aquecimento=None, gravar=False):
+    resultado = {}
+    resultado["temporadas"] = []
+    todas = _novas_avaliacoes()
+    for season in seasons:
+        retorno = backtest_temporada(db, season, passo_dias=passo_dias, dias_aquecimento=dias_aquecimento, gravar=gravar)
+        if retorno is None:
+            continue
+        resultado_temporada, avaliacoes = retorno
+        resultado["temporadas"].append(resultado_temporada)
+        for stat_name in STATS_BACKTEST:
+            todas[stat_name]["previsto"].extend(avaliacoes[stat_name]["previsto"])
+            todas[stat_name]["real"].extend(avaliacoes[stat_name]["real"])
+    resultado["geral"] = consolidar_metricas(todas)
+    return resultado
+
+
+def main():
+    from app.db.db_utils import get_db
+
+    parser = argparse.ArgumentParser(description="Backtest walk-forward dos modelos, em memoria")
+    parser.add_argument("--temporadas", type=int, nargs="+", default=[config.NBA_SEASON])
+    parser.add_argument("--passo-dias", type=int, default=None)
+    parser.add_argument("--dias-aquecimento", type=int, default=None)
+    parser.add_argument("--gravar", action="store_true", help="grava as predicoes do backtest na tabela predictions (ignora as ja existentes)")
+    parser.add_argument("--saida", default=None, help="arquivo JSON com o resultado")
+    args = parser.parse_args()
+
+    for db in get_db():
+        resultado = executar_backtest(db, args.temporadas, passo_dias=args.passo_dias, dias_aquecimento=args.dias_aquecimento, gravar=args.gravar)
+    texto = json.dumps(resultado, indent=2, ensure_ascii=False)
+    if args.saida:
+        with open(args.saida, "w", encoding="utf-8") as arquivo:
+            arquivo.write(texto)
+    print(texto)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,161 @@
+import os
+import gzip
+import json
+import time
+import hashlib
+import logging
+import threading
+
+from app.config import config
+
+logger = logging.getLogger(__name__)
+
+# cache em disco das respostas da API-Sports: um .json.gz por (endpoint, params).
+# resposta final (jogo encerrado) nunca expira; o resto vale por API_CACHE_TTL_SEGUNDOS
+STATUS_FINALIZADO = 3
+NOME_INDICE_FINALIZADOS = "jogos_finalizados.json"
+# endpoints por jogo -> parametro que carrega o id do jogo
+PARAMETRO_JOGO = {"players/statistics": "game", "games/statistics": "id"}
+
+_trava = threading.Lock()
+_contadores = {"acertos": 0, "falhas": 0, "expirados": 0, "gravacoes": 0}
+_finalizados = {"carregado": False, "ids": set()}
+
+
+def cache_api_ativo():
+    return config.API_CACHE_ATIVO
+
+
+def _chave(endpoint, params):
+    texto = json.dumps({"endpoint": endpoint, "params": params or {}}, sort_keys=True, default=str)
+    return hashlib.sha256(texto.encode("utf-8")).hexdigest()
+
+
+def _caminho(chave):
+    return os.path.join(config.PASTA_CACHE_API, chave[:2], f"{chave}.json.gz")
+
+
+def _caminho_indice_finalizados():
+    return os.path.join(config.PASTA_CACHE_API, NOME_INDICE_FINALIZADOS)
+
+
+def _gravar_atomico(caminho, conteudo, compactar):
+    pasta = os.path.dirname(caminho)
+    if not os.path.exists(pasta):
+        os.makedirs(pasta, exist_ok=True)
+    caminho_temporario = f"{caminho}.{os.getpid()}.{threading.get_ident()}.tmp"
+    if compactar:
+        with gzip.open(caminho_temporario, "wt", encoding="utf-8") as arquivo:
+            json.dump(conteudo, arquivo)
+    else:
+        with open(caminho_temporario, "w", encoding="utf-8") as arquivo:
+            json.dump(conteudo, arquivo)
+    os.replace(caminho_temporario, caminho)
+
+
+def _ids_finalizados():
+    # chamado com _trava adquirida
+    if not _finalizados["carregado"]:
+        caminho = _caminho_indice_finalizados()
+        if os.path.exists(caminho):
+            try:
+                with open(caminho, "r", encoding="utf-8") as arquivo:
+                    _finalizados["ids"] = set(json.load(arquivo))
+            except Exception as erro:
+                logger.warning(f"Falha ao ler indice de jogos finalizados: {erro}")
+        _finalizados["carregado"] = True
+    return _finalizados["ids"]
+
+
+def marcar_jogos_finalizados(game_ids):
+    with _trava:
+        # relê o indice: outro processo (task do Airflow) pode ter marcado jogos
+        _finalizados["carregado"] = False
+        ids = _ids_finalizados()
+        novos = set(game_ids) - ids
+        if not novos:
+            return 0
+        ids.update(novos)
+        _gravar_atomico(_caminho_indice_finalizados(), sorted(ids), False)
+    return len(novos)
+
+
+def jogo_finalizado(game_id):
+    with _trava:
+        return game_id in _ids_finalizados()
+
+
+def _resposta_final(endpoint, params, resposta):
+    if endpoint == "games":
+        if not resposta:
+            return False
+        ids = []
+        for item in resposta:
+            if (item.get("status") or {}).get("short") != STATUS_FINALIZADO:
+                return False
+            ids.append(item.get("id"))
+        marcar_jogos_finalizados(ids)
+        return True
+
+    parametro = PARAMETRO_JOGO.get(endpoint)
+    if parametro is None or not params or params.get(parametro) is None:
+        return False
+    return jogo_finalizado(int(params[parametro]))
+
+
+def ler(endpoint, params=None):
+    if not cache_api_ativo():
+        return None
+    caminho = _caminho(_chave(endpoint, params))
+    if not os.path.exists(caminho):
+        with _trava:
+            _contadores["falhas"] = _contadores["falhas"] + 1
+        return None
+    try:
+        with gzip.open(caminho, "rt", encoding="utf-8") as arquivo:
+            entrada = json.load(arquivo)
+    except Exception as erro:
+        logger.warning(f"Cache da API ilegivel em '{endpoint}': {erro}")
+        with _trava:
+            _contadores["falhas"] = _contadores["falhas"] + 1
+        return None
+
+    with _trava:
+        if not entrada["final"] and (time.time() - entrada["gravado_em"]) > config.API_CACHE_TTL_SEGUNDOS:
+            _contadores["expirados"] = _contadores["expirados"] + 1
+            _contadores["falhas"] = _contadores["falhas"] + 1
+            return None
+        _contadores["acertos"] = _contadores["acertos"] + 1
+    return entrada["response"]
+
+
+def gravar(endpoint, params, resposta):
+    if not cache_api_ativo() or resposta is None:
+        return False
+    final = _resposta_final(endpoint, params, resposta)
+    entrada = {"endpoint": endpoint, "params": params or {}, "final": final, "gravado_em": time.time(), "response": resposta}
+    try:
+        _gravar_atomico(_caminho(_chave(endpoint, params)), entrada, True)
+    except Exception as erro:
+        logger.warning(f"Falha ao gravar cache da API em '{endpoint}': {erro}")
+        return False
+    with _trava:
+        _contadores["gravacoes"] = _contadores["gravacoes"] + 1
+    return final
+
+
+def estatisticas_cache_api():
+    with _trava:
+        acertos = _contadores["acertos"]
+        falhas = _contadores["falhas"]
+        total = acertos + falhas
+        resultado = {}
+        resultado["ativo"] = cache_api_ativo()
+        resultado["ttl_segundos"] = config.API_CACHE_TTL_SEGUNDOS
+        resultado["acertos"] = acertos
+        resultado["falhas"] = falhas
+        resultado["expirados"] = _contadores["expirados"]
+        resultado["gravacoes"] = _contadores["gravacoes"]
+        resultado["jogos_finalizados"] = len(_ids_finalizados())
+        resultado["taxa_acerto"] = round(acertos / total * 100, 2) if total > 0 else 0.0
+        return resultado
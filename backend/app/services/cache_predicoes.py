@@ -0,0 +1,133 @@
+import os
+import json
+import time
+import logging
+import threading
+from collections import OrderedDict
+from datetime import datetime, timezone
+
+from app.config import config
+from app.services import modelo_service
+
+logger = logging.getLogger(__name__)
+
+# versao dos dados por temporada, gravada pelo ETL ao lado dos modelos para que
+# API e Airflow (processos diferentes) enxerguem a mesma versao
+NOME_ARQUIVO_VERSAO_DADOS = "versao_dados.json"
+
+_trava = threading.Lock()
+_entradas = OrderedDict()
+_contadores = {"acertos": 0, "falhas": 0, "expirados": 0, "invalidacoes": 0}
+_versoes_dados = {"mtime": None, "versoes": {}}
+
+
+def _caminho_versao_dados():
+    return os.path.join(config.PASTA_MODELOS, NOME_ARQUIVO_VERSAO_DADOS)
+
+
+def _ler_versoes_dados():
+    caminho = _caminho_versao_dados()
+    if os.path.exists(caminho):
+        mtime = os.path.getmtime(caminho)
+    else:
+        mtime = None
+    if mtime == _versoes_dados["mtime"]:
+        return _versoes_dados["versoes"]
+
+    versoes = {}
+    if mtime is not None:
+        try:
+            with open(caminho, "r", encoding="utf-8") as arquivo:
+                versoes = json.load(arquivo)
+        except Exception as erro:
+            logger.warning(f"Falha ao ler versao dos dados: {erro}")
+    _versoes_dados["mtime"] = mtime
+    _versoes_dados["versoes"] = versoes
+    return versoes
+
+
+def versao_dados_temporada(season):
+    with _trava:
+        return _ler_versoes_dados().get(str(season))
+
+
+def versao_dados(season):
+    return (versao_dados_temporada(season), modelo_service.versao_modelos_atual())
+
+
+def registrar_nova_versao_dados(season):
+    pasta = config.PASTA_MODELOS
+    if not os.path.exists(pasta):
+        os.makedirs(pasta)
+    with _trava:
+        versoes = dict(_ler_versoes_dados())
+        versoes[str(season)] = datetime.now(timezone.utc).isoformat()
+        caminho = _caminho_versao_dados()
+        caminho_temporario = caminho + ".tmp"
+        with open(caminho_temporario, "w", encoding="utf-8") as arquivo:
+            json.dump(versoes, arquivo)
+        os.replace(caminho_temporario, caminho)
+    invalidar_cache_predicoes(season)
+    return versoes[str(season)]
+
+
+def montar_chave(player_id, opponent_team_id, season, is_home, stat_name):
+    return (player_id, opponent_team_id, season, is_home, stat_name, versao_dados(season))
+
+
+def obter(chave):
+    with _trava:
+        entrada = _entradas.get(chave)
+        if entrada is None:
+            _contadores["falhas"] = _contadores["falhas"] + 1
+            return None
+        if (time.monotonic() - entrada["criado_em"]) > config.PREDICOES_CACHE_TTL_SEGUNDOS:
+            del _entradas[chave]
+            _contadores["expirados"] = _contadores["expirados"] + 1
+            _contadores["falhas"] = _contadores["falhas"] + 1
+            return None
+        _entradas.move_to_end(chave)
+        _contadores["acertos"] = _contadores["acertos"] + 1
+        return entrada["valor"]
+
+
+def guardar(chave, valor):
+    with _trava:
+        _entradas[chave] = {"valor": valor, "criado_em": time.monotonic()}
+        _entradas.move_to_end(chave)
+        while len(_entradas) > config.PREDICOES_CACHE_MAX:
+            _entradas.popitem(last=False)
+
+
+def invalidar_cache_predicoes(season=None):
+    with _trava:
+        if season is None:
+            total = len(_entradas)
+            _entradas.clear()
+        else:
+            chaves = []
+            for chave in _entradas:
+                if chave[2] == season:
+                    chaves.append(chave)
+            for chave in chaves:
+                del _entradas[chave]
+            total = len(chaves)
+        _contadores["invalidacoes"] = _contadores["invalidacoes"] + 1
+    return total
+
+
+def estatisticas_cache_predicoes():
+    with _trava:
+        acertos = _contadores["acertos"]
+        falhas = _contadores["falhas"]
+        total = acertos + falhas
+        resultado = {}
+        resultado["tamanho"] = len(_entradas)
+        resultado["capacidade"] = config.PREDICOES_CACHE_MAX
+        resultado["ttl_segundos"] = config.PREDICOES_CACHE_TTL_SEGUNDOS
+        resultado["acertos"] = acertos
+        resultado["falhas"] = falhas
+        resultado["expirados"] = _contadores["expirados"]
+        resultado["invalidacoes"] = _contadores["invalidacoes"]
+        resultado["taxa_acerto"] = round(acertos / total * 100, 2) if total > 0 else 0.0
+        return resultado
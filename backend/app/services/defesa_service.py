@@ -0,0 +1,188 @@
+import logging
+import threading
+import time
+import numpy as np
+
+from sqlalchemy import func
+
+from app.db.models import Game, PlayerGameStats, TeamGameDefense
+from app.services.cache_predicoes import registrar_nova_versao_dados
+from app.services.feature_store import _para_timestamp, versao_dados_atual, estrutura_desatualizada
+
+logger = logging.getLogger(__name__)
+
+STATS_DEFESA = ["points", "assists", "tot_reb", "steals", "blocks"]
+STAGE_PRE_TEMPORADA = 1
+
+_trava = threading.Lock()
+_tabelas_por_temporada = {}
+
+
+def _calcular_linhas_defesa(db, season, game_id=None):
+    consulta_jogos = db.query(Game.id, Game.season, Game.date_start, Game.stage, Game.home_team_id, Game.away_team_id).filter(Game.season == season, Game.status_short == 3)
+    colunas_soma = []
+    for stat_name in STATS_DEFESA:
+        colunas_soma.append(func.coalesce(func.sum(getattr(PlayerGameStats, stat_name)), 0).label(stat_name))
+    consulta_somas = db.query(PlayerGameStats.game_id, PlayerGameStats.team_id, *colunas_soma).join(Game, PlayerGameStats.game_id == Game.id).filter(Game.season == season, Game.status_short == 3)
+
+    if game_id is not None:
+        consulta_jogos = consulta_jogos.filter(Game.id == game_id)
+        consulta_somas = consulta_somas.filter(Game.id == game_id)
+
+    jogos = consulta_jogos.all()
+    somas = consulta_somas.group_by(PlayerGameStats.game_id, PlayerGameStats.team_id).all()
+
+    somas_por_jogo = {}
+    for registro in somas:
+        if registro.game_id not in somas_por_jogo:
+            somas_por_jogo[registro.game_id] = []
+        somas_por_jogo[registro.game_id].append(registro)
+
+    linhas = []
+    for jogo in jogos:
+        for time_defensor in (jogo.home_team_id, jogo.away_team_id):
+            linha = {}
+            linha["team_id"] = time_defensor
+            linha["game_id"] = jogo.id
+            linha["season"] = jogo.season
+            linha["date_start"] = jogo.date_start
+            linha["stage"] = jogo.stage
+            for stat_name in STATS_DEFESA:
+                linha[f"{stat_name}_allowed"] = 0
+            for registro in somas_por_jogo.get(jogo.id, []):
+                if registro.team_id == time_defensor:
+                    continue
+                for stat_name in STATS_DEFESA:
+                    linha[f"{stat_name}_allowed"] = linha[f"{stat_name}_allowed"] + int(getattr(registro, stat_name) or 0)
+            linhas.append(linha)
+
+    return linhas
+
+
+def atualizar_defesa_jogo(db, game_id):
+    jogo = db.query(Game).filter(Game.id == game_id).first()
+    if jogo is None or jogo.status_short != 3:
+        return 0
+
+    linhas = _calcular_linhas_defesa(db, jogo.season, game_id=game_id)
+    for linha in linhas:
+        existente = db.query(TeamGameDefense).filter(TeamGameDefense.team_id == linha["team_id"], TeamGameDefense.game_id == game_id).first()
+        if existente:
+            for campo in linha:
+                setattr(existente, campo, linha[campo])
+        else:
+            db.add(TeamGameDefense(**linha))
+
+    invalidar_tabela_defesa(jogo.season)
+    return len(linhas)
+
+
+def reconstruir_defesa_temporada(db, season):
+    inicio = time.monotonic()
+    linhas = _calcular_linhas_defesa(db, season)
+
+    db.query(TeamGameDefense).filter(TeamGameDefense.season == season).delete(synchronize_session=False)
+    if linhas:
+        db.bulk_insert_mappings(TeamGameDefense, linhas)
+    db.commit()
+
+    # sem versao nova a API e o cache de predicoes nao enxergam a reconstrucao
+    registrar_nova_versao_dados(season)
+    invalidar_tabela_defesa(season)
+    duracao = round(time.monotonic() - inicio, 2)
+    logger.warning(f"Tabela de defesa reconstruida: temporada={season}, linhas={len(linhas)}, duracao={duracao}s")
+    return len(linhas)
+
+
+def _carregar_linhas_tabela(db, season):
+    colunas = [TeamGameDefense.team_id, TeamGameDefense.date_start, TeamGameDefense.stage]
+    for stat_name in STATS_DEFESA:
+        colunas.append(getattr(TeamGameDefense, f"{stat_name}_allowed"))
+    registros = db.query(*colunas).filter(TeamGameDefense.season == season).all()
+
+    if not registros:
+        logger.warning(f"Tabela team_game_defense vazia, calculando em memoria: temporada={season}")
+        return _calcular_linhas_defesa(db, season)
+
+    linhas = []
+    for registro in registros:
+        linhas.append(dict(registro._mapping))
+    return linhas
+
+
+def _montar_serie(linhas_time):
+    linhas_time.sort(key=lambda linha: linha["timestamp"])
+    serie = {}
+    serie["timestamps"] = np.array([linha["timestamp"] for linha in linhas_time], dtype=float)
+    serie["acumulados"] = {}
+    for stat_name in STATS_DEFESA:
+        valores = np.array([linha[f"{stat_name}_allowed"] or 0 for linha in linhas_time], dtype=float)
+        serie["acumulados"][stat_name] = np.concatenate(([0.0], np.cumsum(valores)))
+    return serie
+
+
+def construir_tabela_defesa(db, season):
+    linhas = _carregar_linhas_tabela(db, season)
+
+    linhas_por_time = {}
+    for linha in linhas:
+        linha["timestamp"] = _para_timestamp(linha["date_start"])
+        chave_todos = (linha["team_id"], False)
+        if chave_todos not in linhas_por_time:
+            linhas_por_time[chave_todos] = []
+        linhas_por_time[chave_todos].append(linha)
+
+        if linha["stage"] is not None and linha["stage"] != STAGE_PRE_TEMPORADA:
+            chave_sem_pre = (linha["team_id"], True)
+            if chave_sem_pre not in linhas_por_time:
+                linhas_por_time[chave_sem_pre] = []
+            linhas_por_time[chave_sem_pre].append(linha)
+
+    series = {}
+    for chave in linhas_por_time:
+        series[chave] = _montar_serie(linhas_por_time[chave])
+
+    tabela = {}
+    tabela["season"] = season
+    tabela["series"] = series
+    tabela["construido_em"] = time.monotonic()
+    return tabela
+
+
+def obter_tabela_defesa(db, season):
+    versao = versao_dados_atual(season)
+    with _trava:
+        tabela = _tabelas_por_temporada.get(season)
+        if tabela is None or estrutura_desatualizada(tabela, versao):
+            tabela = construir_tabela_defesa(db, season)
+            tabela["versao_dados"] = versao
+            _tabelas_por_temporada[season] = tabela
+        return tabela
+
+
+def invalidar_tabela_defesa(season=None):
+    with _trava:
+        if season is None:
+            _tabelas_por_temporada.clear()
+        else:
+            _tabelas_por_temporada.pop(season, None)
+
+
+def consultar_media_sofrida(tabela, team_id, stat_name, data_corte=None, excluir_pre_temporada=True):
+    serie = tabela["series"].get((team_id, excluir_pre_temporada))
+    if serie is None:
+        return 0.0
+
+    if data_corte is None:
+        k = len(serie["timestamps"])
+    else:
+        k = int(np.searchsorted(serie["timestamps"], _para_timestamp(data_corte), side="left"))
+
+    if k == 0:
+        return 0.0
+    return round(float(serie["acumulados"][stat_name][k]) / k, 2)
+
+
+def media_sofrida(db, team_id, season, stat_name, data_corte=None, excluir_pre_temporada=True):
+    tabela = obter_tabela_defesa(db, season)
+    return consultar_media_sofrida(tabela, team_id, stat_name, data_corte=data_corte, excluir_pre_temporada=excluir_pre_temporada)
@@ -0,0 +1,168 @@
+import logging
+import threading
+import time
+import numpy as np
+
+from datetime import timezone
+
+from app.config import config
+from app.db.models import Game, PlayerGameStats
+from app.services import janelas_moveis
+from app.etl.func_normalize import _segundos_para_minutos
+
+logger = logging.getLogger(__name__)
+
+STATS_FEATURE_STORE = ["points", "assists", "tot_reb", "steals", "blocks"]
+
+_trava = threading.Lock()
+_stores_por_temporada = {}
+
+
+def _para_timestamp(data):
+    if data is None:
+        return None
+    if data.tzinfo is None:
+        data = data.replace(tzinfo=timezone.utc)
+    return data.timestamp()
+
+
+def calcular_features_jogador(valores, minutos):
+    # posicao k de cada array = features com o historico dos k primeiros jogos
+    features = janelas_moveis.calcular_janelas(valores, minutos)
+    features["ema_3"] = np.round(features["ema_3"], 4)
+    features["ema_10"] = np.round(features["ema_10"], 4)
+    return features
+
+
+def _montar_jogador(linhas):
+    jogador = {}
+    jogador["timestamps"] = np.array([linha["timestamp"] for linha in linhas], dtype=float)
+    jogador["datas"] = [linha["data"] for linha in linhas]
+    jogador["adversarios"] = np.array([linha["adversario"] for linha in linhas], dtype=np.int64)
+
+    minutos = np.array([linha["minutes"] for linha in linhas], dtype=float)
+    jogador["valores"] = {}
+    jogador["features"] = {}
+    for stat_name in STATS_FEATURE_STORE:
+        valores = np.array([linha[stat_name] for linha in linhas], dtype=float)
+        jogador["valores"][stat_name] = valores
+        jogador["features"][stat_name] = calcular_features_jogador(valores, minutos)
+    return jogador
+
+
+def _carregar_linhas_temporada(db, season):
+    colunas = [PlayerGameStats.player_id, PlayerGameStats.team_id, PlayerGameStats.seconds_played, Game.date_start, Game.home_team_id, Game.away_team_id]
+    for stat_name in STATS_FEATURE_STORE:
+        colunas.append(getattr(PlayerGameStats, stat_name))
+
+    resultados = db.query(*colunas).join(Game, PlayerGameStats.game_id == Game.id).filter(Game.season == season, Game.status_short == 3, Game.stage != 1).order_by(PlayerGameStats.player_id, Game.date_start.asc()).all()
+
+    linhas_por_jogador = {}
+    for registro in resultados:
+        pid = registro.player_id
+        if pid not in linhas_por_jogador:
+            linhas_por_jogador[pid] = []
+
+        if registro.team_id == registro.home_team_id:
+            adversario = registro.away_team_id
+        else:
+            adversario = registro.home_team_id
+
+        linha = {}
+        linha["data"] = registro.date_start
+        linha["timestamp"] = _para_timestamp(registro.date_start)
+        linha["adversario"] = adversario
+        linha["minutes"] = _segundos_para_minutos(registro.seconds_played)
+        for stat_name in STATS_FEATURE_STORE:
+            linha[stat_name] = float(getattr(registro, stat_name) or 0)
+        linhas_por_jogador[pid].append(linha)
+
+    return linhas_por_jogador, len(resultados)
+
+
+def construir_feature_store(db, season):
+    inicio = time.monotonic()
+    linhas_por_jogador, total_registros = _carregar_linhas_temporada(db, season)
+
+    jogadores = {}
+    for pid in linhas_por_jogador:
+        jogadores[pid] = _montar_jogador(linhas_por_jogador[pid])
+
+    store = {}
+    store["season"] = season
+    store["jogadores"] = jogadores
+    store["construido_em"] = time.monotonic()
+
+    duracao = round(time.monotonic() - inicio, 2)
+    logger.info(f"Feature store construido: temporada={season}, jogadores={len(jogadores)}, registros={total_registros}, duracao={duracao}s")
+    return store
+
+
+def versao_dados_atual(season):
+    # versao publicada pelo ETL (outro processo) no arquivo compartilhado
+    from app.services.cache_predicoes import versao_dados_temporada
+    return versao_dados_temporada(season)
+
+
+def estrutura_desatualizada(estrutura, versao):
+    # com versao publicada, reconstroi quando ela muda; sem versao, vale o TTL
+    if versao is not None or estrutura["versao_dados"] is not None:
+        return estrutura["versao_dados"] != versao
+    return (time.monotonic() - estrutura["construido_em"]) > config.FEATURE_STORE_TTL_SEGUNDOS
+
+
+def obter_feature_store(db, season):
+    versao = versao_dados_atual(season)
+    with _trava:
+        store = _stores_por_temporada.get(season)
+        if store is None or estrutura_desatualizada(store, versao):
+            store = construir_feature_store(db, season)
+            store["versao_dados"] = versao
+            _stores_por_temporada[season] = store
+        return store
+
+
+def invalidar_feature_store(season=None):
+    with _trava:
+        if season is None:
+            _stores_por_temporada.clear()
+        else:
+            _stores_por_temporada.pop(season, None)
+
+
+def _quantidade_jogos_antes(jogador, data_corte):
+    if data_corte is None:
+        return len(jogador["timestamps"])
+    corte = _para_timestamp(data_corte)
+    return int(np.searchsorted(jogador["timestamps"], corte, side="left"))
+
+
+def consultar_features_jogador(store, player_id, stat_name, data_corte=None, opponent_team_id=None):
+    jogador = store["jogadores"].get(player_id)
+    if jogador is None:
+        return None
+
+    k = _quantidade_jogos_antes(jogador, data_corte)
+    if k == 0:
+        return None
+
+    features_stat = jogador["features"][stat_name]
+
+    resultado = {}
+    resultado["total_jogos"] = k
+    for nome in features_stat:
+        resultado[nome] = float(features_stat[nome][k])
+    resultado["data_ultimo_jogo"] = jogador["datas"][k - 1]
+
+    resultado["media_vs_adversario"] = None
+    if opponent_team_id is not None:
+        mascara = jogador["adversarios"][:k] == opponent_team_id
+        if mascara.any():
+            resultado["media_vs_adversario"] = float(jogador["valores"][stat_name][:k][mascara].mean())
+
+    return resultado
+
+
+def consultar_features(db, player_id, season, stat_name, data_corte=None, opponent_team_id=None):
+    store = obter_feature_store(db, season)
+    return consultar_features_jogador(store, player_id, stat_name, data_corte=data_corte, opponent_team_id=opponent_team_id)
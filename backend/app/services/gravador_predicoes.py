@@ -0,0 +1,134 @@
+import io
+import csv
+import logging
+from datetime import datetime, timezone
+
+from sqlalchemy.dialects import postgresql, sqlite
+
+from app.config import config
+from app.db.models import Prediction
+
+logger = logging.getLogger(__name__)
+
+COLUNAS_PREDICAO = ["player_id", "game_id", "team_id", "opponent_team_id", "season", "is_home", "predicted_points", "predicted_assists", "predicted_rebounds", "predicted_steals", "predicted_blocks", "created_at"]
+COLUNAS_VALORES = ["predicted_points", "predicted_assists", "predicted_rebounds", "predicted_steals", "predicted_blocks", "created_at"]
+
+
+def _linha_predicao(solicitacao, previsoes, season, criado_em):
+    linha = {}
+    linha["player_id"] = solicitacao["player_id"]
+    linha["game_id"] = solicitacao["game_id"]
+    linha["team_id"] = solicitacao["team_id"]
+    linha["opponent_team_id"] = solicitacao["opponent_team_id"]
+    linha["season"] = season
+    linha["is_home"] = solicitacao["is_home"]
+    linha["predicted_points"] = previsoes.get("points", 0.0)
+    linha["predicted_assists"] = previsoes.get("assists", 0.0)
+    linha["predicted_rebounds"] = previsoes.get("rebounds", 0.0)
+    linha["predicted_steals"] = previsoes.get("steals", 0.0)
+    linha["predicted_blocks"] = previsoes.get("blocks", 0.0)
+    linha["created_at"] = criado_em
+    return linha
+
+
+def montar_linhas(solicitacoes, resultados, season):
+    criado_em = datetime.now(timezone.utc)
+    linhas = []
+    vistos = set()
+    total_erros = 0
+    for indice in range(len(solicitacoes)):
+        previsoes = resultados[indice]
+        if previsoes is None:
+            total_erros = total_erros + 1
+            continue
+        chave = (solicitacoes[indice]["player_id"], solicitacoes[indice]["game_id"])
+        # duas linhas com a mesma chave no mesmo INSERT quebram o ON CONFLICT DO UPDATE
+        if chave in vistos:
+            continue
+        vistos.add(chave)
+        linhas.append(_linha_predicao(solicitacoes[indice], previsoes, season, criado_em))
+    return linhas, total_erros
+
+
+def _nome_dialeto(db):
+    return db.get_bind().dialect.name
+
+
+def _inserir_on_conflict(db, linhas, atualizar=False):
+    if _nome_dialeto(db) == "sqlite":
+        construtor = sqlite.insert
+    else:
+        construtor = postgresql.insert
+
+    total_inseridas = 0
+    tamanho_lote = max(config.PREDICOES_LOTE_INSERT, 1)
+    for inicio in range(0, len(linhas), tamanho_lote):
+        comando = construtor(Prediction.__table__).values(linhas[inicio:inicio + tamanho_lote])
+        if atualizar:
+            novos_valores = {}
+            for coluna in COLUNAS_VALORES:
+                novos_valores[coluna] = comando.excluded[coluna]
+            comando = comando.on_conflict_do_update(index_elements=["player_id", "game_id"], set_=novos_valores)
+        else:
+            comando = comando.on_conflict_do_nothing(index_elements=["player_id", "game_id"])
+        resultado = db.execute(comando)
+        total_inseridas = total_inseridas + max(resultado.rowcount, 0)
+    return total_inseridas
+
+
+def _inserir_via_copy(db, linhas, atualizar=False):
+    # COPY para uma tabela temporaria e um unico INSERT ... SELECT com ON CONFLICT
+    buffer = io.StringIO()
+    escritor = csv.writer(buffer)
+    for linha in linhas:
+        valores = []
+        for coluna in COLUNAS_PREDICAO:
+            valor = linha[coluna]
+            if isinstance(valor, datetime):
+                valor = valor.isoformat()
+            valores.append(valor)
+        escritor.writerow(valores)
+    buffer.seek(0)
+
+    colunas = ", ".join(COLUNAS_PREDICAO)
+    if atualizar:
+        atribuicoes = []
+        for coluna in COLUNAS_VALORES:
+            atribuicoes.append(f"{coluna} = EXCLUDED.{coluna}")
+        conflito = "DO UPDATE SET " + ", ".join(atribuicoes)
+    else:
+        conflito = "DO NOTHING"
+
+    conexao = db.connection().connection
+    cursor = conexao.cursor()
+    try:
+        cursor.execute("CREATE TEMP TABLE tmp_predicoes_copy (LIKE predictions INCLUDING DEFAULTS) ON COMMIT DROP")
+        cursor.copy_expert(f"COPY tmp_predicoes_copy ({colunas}) FROM STDIN WITH (FORMAT csv)", buffer)
+        cursor.execute(f"INSERT INTO predictions ({colunas}) SELECT {colunas} FROM tmp_predicoes_copy ON CONFLICT (player_id, game_id) {conflito}")
+        total_inseridas = max(cursor.rowcount, 0)
+        cursor.execute("DROP TABLE tmp_predicoes_copy")
+    finally:
+        cursor.close()
+    return total_inseridas
+
+
+def gravar_predicoes(db, solicitacoes, resultados, season, atualizar=False):
+    linhas, total_erros = montar_linhas(solicitacoes, resultados, season)
+
+    resumo = {}
+    resumo["inseridas"] = 0
+    resumo["ignoradas"] = 0
+    resumo["erros"] = total_erros
+    if not linhas:
+        return resumo
+
+    if _nome_dialeto(db) == "postgresql" and len(linhas) >= config.PREDICOES_LIMIAR_COPY:
+        total_inseridas = _inserir_via_copy(db, linhas, atualizar=atualizar)
+    else:
+        total_inseridas = _inserir_on_conflict(db, linhas, atualizar=atualizar)
+
+    resumo["inseridas"] = total_inseridas
+    resumo["ignoradas"] = len(solicitacoes) - total_erros - total_inseridas
+    if resumo["ignoradas"] > 0:
+        logger.warning(f"Predicoes ja existentes ignoradas: total={resumo['ignoradas']}, inseridas={total_inseridas}")
+    return resumo
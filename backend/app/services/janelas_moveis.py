@@ -0,0 +1,100 @@
+import numpy as np
+
+# kernels de janela movel sobre o log de jogos inteiro de uma vez.
+# convencao: cada funcao recebe n valores e devolve um array com n+1 posicoes,
+# em que a posicao k usa apenas os k primeiros valores (historico antes do jogo k)
+
+JANELA_CURTA = 3
+JANELA_LONGA = 10
+
+
+def _acumulado(valores):
+    return np.concatenate(([0.0], np.cumsum(valores)))
+
+
+def _somas_janela(acumulado, tamanho_janela):
+    # soma dos ultimos min(k, janela) valores para cada k em 0..n
+    n = len(acumulado) - 1
+    fim = np.arange(n + 1)
+    inicio = np.maximum(fim - tamanho_janela, 0)
+    return acumulado[fim] - acumulado[inicio], fim - inicio, inicio
+
+
+def media_expandida(valores):
+    valores = np.asarray(valores, dtype=float)
+    acumulado = _acumulado(valores)
+    resultado = np.zeros(len(acumulado))
+    resultado[1:] = acumulado[1:] / np.arange(1, len(acumulado))
+    return resultado
+
+
+def media_movel(valores, tamanho_janela):
+    valores = np.asarray(valores, dtype=float)
+    soma, tamanho, _ = _somas_janela(_acumulado(valores), tamanho_janela)
+    resultado = np.zeros(len(soma))
+    com_dados = tamanho > 0
+    resultado[com_dados] = soma[com_dados] / tamanho[com_dados]
+    return resultado
+
+
+def media_ponderada_linear(valores, tamanho_janela):
+    # peso 1 para o jogo mais antigo da janela e peso m para o mais recente
+    valores = np.asarray(valores, dtype=float)
+    indices = np.arange(len(valores), dtype=float)
+    soma, tamanho, inicio = _somas_janela(_acumulado(valores), tamanho_janela)
+    soma_indice, _, _ = _somas_janela(_acumulado(valores * indices), tamanho_janela)
+    soma_ponderada = soma_indice - (inicio - 1) * soma
+    soma_pesos = tamanho * (tamanho + 1) / 2.0
+    resultado = np.zeros(len(soma))
+    com_dados = tamanho > 0
+    resultado[com_dados] = soma_ponderada[com_dados] / soma_pesos[com_dados]
+    return resultado
+
+
+def _momentos_janela(valores, tamanho_janela):
+    valores = np.asarray(valores, dtype=float)
+    indices = np.arange(len(valores), dtype=float)
+    soma, tamanho, inicio = _somas_janela(_acumulado(valores), tamanho_janela)
+    soma_quadrado, _, _ = _somas_janela(_acumulado(valores * valores), tamanho_janela)
+    soma_indice, _, _ = _somas_janela(_acumulado(valores * indices), tamanho_janela)
+    return soma, soma_quadrado, soma_indice, tamanho, inicio
+
+
+def inclinacao_movel(valores, tamanho_janela):
+    # inclinacao OLS com x = 0..m-1 sobre os ultimos m valores (0 quando m < 2)
+    soma, _, soma_indice, tamanho, inicio = _momentos_janela(valores, tamanho_janela)
+    resultado = np.zeros(len(soma))
+    validos = tamanho >= 2
+    m = tamanho[validos].astype(float)
+    soma_xy = soma_indice[validos] - inicio[validos] * soma[validos]
+    media_x = (m - 1) / 2.0
+    soma_xx = m * (m * m - 1) / 12.0
+    resultado[validos] = (soma_xy - media_x * soma[validos]) / soma_xx
+    return resultado
+
+
+def desvio_movel(valores, tamanho_janela):
+    # desvio padrao populacional dos ultimos m valores (0 quando m < 2)
+    soma, soma_quadrado, _, tamanho, _ = _momentos_janela(valores, tamanho_janela)
+    resultado = np.zeros(len(soma))
+    validos = tamanho >= 2
+    m = tamanho[validos].astype(float)
+    media = soma[validos] / m
+    resultado[validos] = np.sqrt(np.maximum(soma_quadrado[validos] / m - media * media, 0.0))
+    return resultado
+
+
+def calcular_janelas(valores, minutos):
+    janelas = {}
+    janelas["ema_3"] = media_ponderada_linear(valores, JANELA_CURTA)
+    janelas["ema_10"] = media_ponderada_linear(valores, JANELA_LONGA)
+    janelas["media_10"] = media_movel(valores, JANELA_LONGA)
+    janelas["media_minutos"] = media_movel(minutos, JANELA_LONGA)
+    janelas["media_temporada"] = media_expandida(valores)
+    janelas["inclinacao"] = inclinacao_movel(valores, JANELA_CURTA)
+    janelas["variancia"] = desvio_movel(valores, JANELA_CURTA)
+    return janelas
+
+
+def combinar_janelas(ema_3, ema_10, media_temporada):
+    return (ema_3 * 0.40) + (ema_10 * 0.35) + (media_temporada * 0.25)
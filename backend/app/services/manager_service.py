@@ -1,97 +1,87 @@
 from datetime import datetime, timezone, timedelta
 from zoneinfo import ZoneInfo
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import logging
+import time
 
-from sqlalchemy.exc import IntegrityError
+from sqlalchemy import and_, case, func, literal, select, union_all
 
 from app.config import config
 from app.db.models import Game, PlayerGameStats, PlayerTeamSeason, Prediction
-from app.services.prediction_service import prever_multiplas_stats_jogador
+from app.services import gravador_predicoes
+from app.services.prediction_service import prever_lote
 
 logger = logging.getLogger("manager_service")
 FUSO_SP = ZoneInfo("America/Sao_Paulo")
 
-def _converter_minutos(minutos_str):
-    if not minutos_str:
-        return 0.0
-    minutos_limpo = str(minutos_str).strip()
-    if minutos_limpo == "" or minutos_limpo == "0:00" or minutos_limpo == "00:00":
-        return 0.0
-    if ":" in minutos_limpo:
-        partes = minutos_limpo.split(":")
-        try:
-            minutos = int(partes[0])
-            segundos = int(partes[1])
-            return minutos + (segundos / 60.0)
-        except (ValueError, IndexError):
-            return 0.0
-    try:
-        return float(minutos_limpo)
-    except ValueError:
-        return 0.0
+JOGOS_RECENTES_ATIVOS = 5
 
-def _buscar_jogadores_titulares(db, team_id, season, data_corte=None):
-    limiar = config.MIN_MINUTOS_PALPITE
-    query = db.query(PlayerGameStats).filter(PlayerGameStats.team_id == team_id, PlayerGameStats.season == season)
-    if data_corte is not None:
-        query = query.join(Game, PlayerGameStats.game_id == Game.id).filter(Game.date_start < data_corte)
-    stats = query.all()
-
-    soma_minutos = {}
-    contagem_jogos = {}
-    for stat in stats:
-        pid = stat.player_id
-        minutos = _converter_minutos(stat.minutes)
-        if pid not in soma_minutos:
-            soma_minutos[pid] = 0.0
-            contagem_jogos[pid] = 0
-        soma_minutos[pid] = soma_minutos[pid] + minutos
-        contagem_jogos[pid] = contagem_jogos[pid] + 1
-
-    lista_titulares = []
-    for pid in soma_minutos:
-        if contagem_jogos[pid] == 0:
-            continue
-        media = soma_minutos[pid] / contagem_jogos[pid]
-        if media >= limiar:
-            lista_titulares.append(pid)
+def _subquery_ultimos_jogos(team_ids, season):
+    # ultimos JOGOS_RECENTES_ATIVOS jogos finalizados de cada time, numerados no banco
+    casa = select(Game.id.label("game_id"), Game.home_team_id.label("team_id"), Game.date_start.label("date_start")).where(Game.season == season, Game.status_short == 3, Game.home_team_id.in_(team_ids))
+    fora = select(Game.id.label("game_id"), Game.away_team_id.label("team_id"), Game.date_start.label("date_start")).where(Game.season == season, Game.status_short == 3, Game.away_team_id.in_(team_ids))
+    lados = union_all(casa, fora).subquery()
+    ordem = func.row_number().over(partition_by=lados.c.team_id, order_by=lados.c.date_start.desc()).label("ordem")
+    numerados = select(lados.c.team_id, lados.c.game_id, ordem).subquery()
+    return select(numerados.c.team_id, numerados.c.game_id).where(numerados.c.ordem <= JOGOS_RECENTES_ATIVOS).subquery()
 
-    if not lista_titulares:
-        return _buscar_jogadores_do_time(db=db, team_id=team_id, season=season)
+def _consultar_titulares_rodada(db, team_ids, season, data_corte=None):
+    # uma consulta para todos os times: media de segundos e "jogou nos ultimos 5" agregados no banco
+    limiar_segundos = config.MIN_MINUTOS_PALPITE * 60
+    media_segundos = func.avg(func.coalesce(PlayerGameStats.seconds_played, 0))
 
     if data_corte is None:
-        lista_ativos = _filtrar_jogadores_ativos(db=db, player_ids=lista_titulares, team_id=team_id, season=season)
-        if not lista_ativos:
-            return lista_titulares
-        return lista_ativos
-
-    return lista_titulares
-
-def _filtrar_jogadores_ativos(db, player_ids, team_id, season):
-    ultimos_jogos = db.query(Game).filter(Game.season == season, Game.status_short == 3, (Game.home_team_id == team_id) | (Game.away_team_id == team_id)).order_by(Game.date_start.desc()).limit(5).all()
-
-    if not ultimos_jogos:
-        return player_ids
-
-    ids_ultimos_jogos = []
-    for jogo in ultimos_jogos:
-        ids_ultimos_jogos.append(jogo.id)
+        recentes = _subquery_ultimos_jogos(team_ids, season)
+        jogou_recente = func.max(case((and_(recentes.c.game_id.isnot(None), PlayerGameStats.seconds_played > 0), 1), else_=0))
+        query = db.query(PlayerGameStats.team_id, PlayerGameStats.player_id, jogou_recente.label("jogou_recente"))
+        query = query.outerjoin(recentes, and_(recentes.c.team_id == PlayerGameStats.team_id, recentes.c.game_id == PlayerGameStats.game_id))
+    else:
+        # caminho retroativo: so a media antes do tip-off, sem o filtro de ativos
+        query = db.query(PlayerGameStats.team_id, PlayerGameStats.player_id, literal(1).label("jogou_recente"))
+        query = query.join(Game, PlayerGameStats.game_id == Game.id).filter(Game.date_start < data_corte)
 
-    jogou_recentemente = set()
-    for pid in player_ids:
-        stats_recentes = db.query(PlayerGameStats).filter(PlayerGameStats.player_id == pid, PlayerGameStats.game_id.in_(ids_ultimos_jogos)).all()
-        for stat in stats_recentes:
-            minutos = _converter_minutos(stat.minutes)
-            if minutos > 0:
-                jogou_recentemente.add(pid)
-                break
+    query = query.filter(PlayerGameStats.team_id.in_(team_ids), PlayerGameStats.season == season)
+    return query.group_by(PlayerGameStats.team_id, PlayerGameStats.player_id).having(media_segundos >= limiar_segundos).order_by(PlayerGameStats.team_id.asc(), PlayerGameStats.player_id.asc()).all()
 
-    lista_ativos = []
-    for pid in player_ids:
-        if pid in jogou_recentemente:
-            lista_ativos.append(pid)
+def _montar_elegiveis(registros):
+    # titulares que jogaram recentemente; se nenhum jogou, todos os titulares
+    titulares_por_time = {}
+    ativos_por_time = {}
+    for registro in registros:
+        if registro.team_id not in titulares_por_time:
+            titulares_por_time[registro.team_id] = []
+            ativos_por_time[registro.team_id] = []
+        titulares_por_time[registro.team_id].append(registro.player_id)
+        if registro.jogou_recente:
+            ativos_por_time[registro.team_id].append(registro.player_id)
+
+    elegiveis = {}
+    for team_id in titulares_por_time:
+        if ativos_por_time[team_id]:
+            elegiveis[team_id] = ativos_por_time[team_id]
+        else:
+            elegiveis[team_id] = titulares_por_time[team_id]
+    return elegiveis
+
+def selecionar_jogadores_rodada(db, team_ids, season, data_corte=None):
+    team_ids = sorted(set(team_ids))
+    if not team_ids:
+        return {}
+
+    elegiveis = _montar_elegiveis(_consultar_titulares_rodada(db, team_ids, season, data_corte=data_corte))
+
+    sem_titulares = []
+    for team_id in team_ids:
+        if team_id not in elegiveis:
+            sem_titulares.append(team_id)
+    if sem_titulares:
+        elencos = _buscar_elencos_times(db=db, team_ids=sem_titulares, season=season)
+        for team_id in sem_titulares:
+            elegiveis[team_id] = elencos.get(team_id, [])
+    return elegiveis
 
-    return lista_ativos
+def _buscar_jogadores_titulares(db, team_id, season, data_corte=None):
+    return selecionar_jogadores_rodada(db=db, team_ids=[team_id], season=season, data_corte=data_corte)[team_id]
 
 def _buscar_jogos_do_dia(db, season):
     agora_sp = datetime.now(FUSO_SP)
@@ -102,6 +92,27 @@ def _buscar_jogos_do_dia(db, season):
     jogos = db.query(Game).filter(Game.season == season, Game.date_start >= inicio_utc, Game.date_start < fim_utc).all()
     return jogos
 
+def _buscar_elencos_times(db, team_ids, season):
+    # mesma regra de _buscar_jogadores_do_time (ativos, senao o elenco inteiro) para varios times
+    registros = db.query(PlayerTeamSeason.team_id, PlayerTeamSeason.player_id, PlayerTeamSeason.active).filter(PlayerTeamSeason.team_id.in_(team_ids), PlayerTeamSeason.season == season).order_by(PlayerTeamSeason.id.asc()).all()
+    todos = {}
+    ativos = {}
+    for registro in registros:
+        if registro.team_id not in todos:
+            todos[registro.team_id] = []
+            ativos[registro.team_id] = []
+        todos[registro.team_id].append(registro.player_id)
+        if registro.active:
+            ativos[registro.team_id].append(registro.player_id)
+
+    elencos = {}
+    for team_id in todos:
+        if ativos[team_id]:
+            elencos[team_id] = ativos[team_id]
+        else:
+            elencos[team_id] = todos[team_id]
+    return elencos
+
 def _buscar_jogadores_do_time(db, team_id, season):
     registros = db.query(PlayerTeamSeason).filter(PlayerTeamSeason.team_id == team_id, PlayerTeamSeason.season == season, PlayerTeamSeason.active == True).all()
     if not registros:
@@ -111,61 +122,118 @@ def _buscar_jogadores_do_time(db, team_id, season):
         lista_ids.append(registro.player_id)
     return lista_ids
 
-def _predicao_ja_existe(db, player_id, game_id):
-    existente = db.query(Prediction).filter(Prediction.player_id == player_id, Prediction.game_id == game_id).first()
-    if existente:
-        return True
-    return False
-
-def _gerar_predicao(db, player_id, game_id, team_id, opponent_team_id, is_home, season, data_corte=None):
-    previsoes = prever_multiplas_stats_jogador(db=db, player_id=player_id, opponent_team_id=opponent_team_id, season=season, is_home=is_home, data_corte=data_corte)
-
-    pontos_previstos = previsoes.get("points", 0.0)
-    assist_previstos = previsoes.get("assists", 0.0)
-    rebotes_previstos = previsoes.get("rebounds", 0.0)
-    roubos_previstos = previsoes.get("steals", 0.0)
-    bloqueios_previstos = previsoes.get("blocks", 0.0)
-
-    nova_predicao = Prediction(player_id=player_id, game_id=game_id, team_id=team_id, opponent_team_id=opponent_team_id, season=season, is_home=is_home, predicted_points=pontos_previstos, predicted_assists=assist_previstos, predicted_rebounds=rebotes_previstos, predicted_steals=roubos_previstos, predicted_blocks=bloqueios_previstos, created_at=datetime.now(timezone.utc))
-
-    db.add(nova_predicao)
-    return nova_predicao
+def _jogadores_com_predicao(db, game_id):
+    registros = db.query(Prediction.player_id).filter(Prediction.game_id == game_id).all()
+    existentes = set()
+    for registro in registros:
+        existentes.add(registro.player_id)
+    return existentes
+
+def _jogadores_com_predicao_rodada(db, game_ids):
+    registros = db.query(Prediction.game_id, Prediction.player_id).filter(Prediction.game_id.in_(game_ids)).all()
+    existentes = {}
+    for game_id in game_ids:
+        existentes[game_id] = set()
+    for registro in registros:
+        existentes[registro.game_id].add(registro.player_id)
+    return existentes
+
+def _coletar_solicitacoes_jogo(db, jogo, season, data_corte=None, elegiveis=None, existentes=None):
+    if elegiveis is None:
+        elegiveis = selecionar_jogadores_rodada(db=db, team_ids=[jogo.home_team_id, jogo.away_team_id], season=season, data_corte=data_corte)
+    if existentes is None:
+        existentes = _jogadores_com_predicao(db=db, game_id=jogo.id)
+    jogadores_casa = elegiveis.get(jogo.home_team_id, [])
+    jogadores_fora = elegiveis.get(jogo.away_team_id, [])
+
+    lados = []
+    lados.append((jogadores_casa, jogo.home_team_id, jogo.away_team_id, 1))
+    lados.append((jogadores_fora, jogo.away_team_id, jogo.home_team_id, 0))
+
+    solicitacoes = []
+    for jogadores, team_id, opponent_team_id, is_home in lados:
+        for player_id in jogadores:
+            if player_id in existentes:
+                continue
+            existentes.add(player_id)
+            solicitacao = {}
+            solicitacao["player_id"] = player_id
+            solicitacao["game_id"] = jogo.id
+            solicitacao["team_id"] = team_id
+            solicitacao["opponent_team_id"] = opponent_team_id
+            solicitacao["is_home"] = is_home
+            solicitacoes.append(solicitacao)
+    return solicitacoes
+
+def _gravar_predicoes(db, solicitacoes, resultados, season):
+    return gravador_predicoes.gravar_predicoes(db=db, solicitacoes=solicitacoes, resultados=resultados, season=season)
 
 def _processar_jogo(db, jogo, season, total_geradas, total_erros, data_corte=None):
-    game_id = jogo.id
-    home_team_id = jogo.home_team_id
-    away_team_id = jogo.away_team_id
-
-    jogadores_casa = _buscar_jogadores_titulares(db=db, team_id=home_team_id, season=season, data_corte=data_corte)
-    jogadores_fora = _buscar_jogadores_titulares(db=db, team_id=away_team_id, season=season, data_corte=data_corte)
-
-    for player_id in jogadores_casa:
-        if _predicao_ja_existe(db=db, player_id=player_id, game_id=game_id):
-            continue
-        try:
-            with db.begin_nested():
-                _gerar_predicao(db=db, player_id=player_id, game_id=game_id, team_id=home_team_id, opponent_team_id=away_team_id, is_home=1, season=season, data_corte=data_corte)
-            total_geradas = total_geradas + 1
-        except IntegrityError:
-            logger.warning(f"Predicao ja existe (ignorado): player_id={player_id}, game_id={game_id}")
-        except Exception as erro:
-            total_erros = total_erros + 1
-            logger.error(f"Erro ao gerar predicao: player_id={player_id}, game_id={game_id}: {erro}")
-
-    for player_id in jogadores_fora:
-        if _predicao_ja_existe(db=db, player_id=player_id, game_id=game_id):
-            continue
-        try:
-            with db.begin_nested():
-                _gerar_predicao(db=db, player_id=player_id, game_id=game_id, team_id=away_team_id, opponent_team_id=home_team_id, is_home=0, season=season, data_corte=data_corte)
-            total_geradas = total_geradas + 1
-        except IntegrityError:
-            logger.warning(f"Predicao ja existe (ignorado): player_id={player_id}, game_id={game_id}")
-        except Exception as erro:
-            total_erros = total_erros + 1
-            logger.error(f"Erro ao gerar predicao: player_id={player_id}, game_id={game_id}: {erro}")
-
-    return total_geradas, total_erros
+    solicitacoes = _coletar_solicitacoes_jogo(db=db, jogo=jogo, season=season, data_corte=data_corte)
+    if not solicitacoes:
+        return total_geradas, total_erros
+
+    resultados = prever_lote(db=db, solicitacoes=solicitacoes, season=season, data_corte=data_corte)
+    resumo = _gravar_predicoes(db=db, solicitacoes=solicitacoes, resultados=resultados, season=season)
+    return total_geradas + resumo["inseridas"], total_erros + resumo["erros"]
+
+def _limite_workers_rodada(total_jogos):
+    limite = config.RODADA_WORKERS
+    if limite <= 0:
+        # cada worker segura uma conexao do pool; a sessao principal fica com outra
+        from app.db.session import engine
+        limite = max(engine.pool.size() - 1, 1)
+    return max(min(limite, total_jogos), 1)
+
+def _prever_jogo_em_sessao(fabrica_sessao, game_id, solicitacoes, season):
+    inicio = time.monotonic()
+    db_worker = fabrica_sessao()
+    try:
+        resultados = prever_lote(db=db_worker, solicitacoes=solicitacoes, season=season)
+    finally:
+        db_worker.close()
+    return game_id, resultados, round(time.monotonic() - inicio, 3)
+
+def _prever_rodada(db, solicitacoes_por_jogo, season, fabrica_sessao=None):
+    # jogos independentes: cada worker monta features e pontua um jogo na propria sessao
+    solicitacoes = []
+    resultados = []
+    if not solicitacoes_por_jogo:
+        return solicitacoes, resultados
+
+    limite = _limite_workers_rodada(len(solicitacoes_por_jogo))
+    inicio = time.monotonic()
+    resultados_por_jogo = {}
+    if limite == 1:
+        for game_id, solicitacoes_jogo in solicitacoes_por_jogo:
+            inicio_jogo = time.monotonic()
+            resultados_por_jogo[game_id] = prever_lote(db=db, solicitacoes=solicitacoes_jogo, season=season)
+            logger.warning(f"Jogo pontuado: game_id={game_id}, jogadores={len(solicitacoes_jogo)}, duracao={round(time.monotonic() - inicio_jogo, 3)}s")
+    else:
+        if fabrica_sessao is None:
+            from app.db.session import SessionLocal
+            fabrica_sessao = SessionLocal
+        with ThreadPoolExecutor(max_workers=limite) as executor:
+            futuros = {}
+            for game_id, solicitacoes_jogo in solicitacoes_por_jogo:
+                futuro = executor.submit(_prever_jogo_em_sessao, fabrica_sessao, game_id, solicitacoes_jogo, season)
+                futuros[futuro] = (game_id, solicitacoes_jogo)
+            for futuro in as_completed(futuros):
+                game_id, solicitacoes_jogo = futuros[futuro]
+                try:
+                    _, resultados_jogo, duracao = futuro.result()
+                except Exception as erro:
+                    logger.error(f"Erro ao pontuar jogo: game_id={game_id}: {erro}")
+                    resultados_jogo = [None] * len(solicitacoes_jogo)
+                    duracao = None
+                resultados_por_jogo[game_id] = resultados_jogo
+                logger.warning(f"Jogo pontuado: game_id={game_id}, jogadores={len(solicitacoes_jogo)}, duracao={duracao}s")
+
+    for game_id, solicitacoes_jogo in solicitacoes_por_jogo:
+        solicitacoes.extend(solicitacoes_jogo)
+        resultados.extend(resultados_por_jogo[game_id])
+    logger.warning(f"Rodada pontuada: jogos={len(solicitacoes_por_jogo)}, workers={limite}, duracao={round(time.monotonic() - inicio, 2)}s")
+    return solicitacoes, resultados
 
 def salvar_predicoes_dia_atual(db, season):
     jogos_do_dia = _buscar_jogos_do_dia(db=db, season=season)
@@ -174,15 +242,27 @@ def salvar_predicoes_dia_atual(db, season):
         logger.warning(f"Nenhum jogo encontrado para hoje: temporada={season}")
         return 0
 
-    total_geradas = 0
-    total_erros = 0
+    team_ids = []
+    game_ids = []
+    for jogo in jogos_do_dia:
+        team_ids.append(jogo.home_team_id)
+        team_ids.append(jogo.away_team_id)
+        game_ids.append(jogo.id)
+    elegiveis = selecionar_jogadores_rodada(db=db, team_ids=team_ids, season=season)
+    existentes_por_jogo = _jogadores_com_predicao_rodada(db=db, game_ids=game_ids)
 
+    solicitacoes_por_jogo = []
     for jogo in jogos_do_dia:
-        total_geradas, total_erros = _processar_jogo(db, jogo, season, total_geradas, total_erros)
+        solicitacoes_jogo = _coletar_solicitacoes_jogo(db=db, jogo=jogo, season=season, elegiveis=elegiveis, existentes=existentes_por_jogo[jogo.id])
+        if solicitacoes_jogo:
+            solicitacoes_por_jogo.append((jogo.id, solicitacoes_jogo))
+
+    solicitacoes, resultados = _prever_rodada(db=db, solicitacoes_por_jogo=solicitacoes_por_jogo, season=season)
+    resumo = _gravar_predicoes(db=db, solicitacoes=solicitacoes, resultados=resultados, season=season)
 
     db.commit()
-    logger.warning(f"Predicoes do dia geradas: total={total_geradas}, erros={total_erros}, temporada={season}")
-    return total_geradas
+    logger.warning(f"Predicoes do dia geradas: total={resumo['inseridas']}, ignoradas={resumo['ignoradas']}, erros={resumo['erros']}, jogos={len(jogos_do_dia)}, temporada={season}")
+    return resumo["inseridas"]
 
 def deletar_todas_predicoes(db, season):
     total = db.query(Prediction).filter(Prediction.season == season).delete()
@@ -191,32 +271,8 @@ def deletar_todas_predicoes(db, season):
     return total
 
 def gerar_predicoes_retroativas(db, season):
-    jogos = db.query(Game).filter(Game.season == season, Game.status_short == 3, Game.stage != 1).order_by(Game.date_start.asc()).all()
-
-    if not jogos:
-        logger.warning(f"Nenhum jogo finalizado encontrado: temporada={season}")
-        return 0
-
-    total_geradas = 0
-    total_erros = 0
-    contador = 0
-
-    for jogo in jogos:
-        data_corte = jogo.date_start
-        predicoes_existentes = db.query(Prediction).filter(Prediction.game_id == jogo.id).count()
-        if predicoes_existentes > 0:
-            continue
-
-        total_geradas, total_erros = _processar_jogo(db, jogo, season, total_geradas, total_erros, data_corte=data_corte)
-        contador = contador + 1
-
-        if contador % 10 == 0:
-            db.commit()
-            logger.warning(f"Progresso retroativo: jogos={contador}, predicoes={total_geradas}, erros={total_erros}, temporada={season}")
-
-    db.commit()
-    logger.warning(f"Predicoes retroativas concluidas: total={total_geradas}, erros={total_erros}, temporada={season}")
-    return total_geradas
+    from app.services.replay_service import reproduzir_temporada
+    return reproduzir_temporada(db=db, season=season)
 
 def salvar_predicoes_temporada(db, season):
     jogos = db.query(Game).filter(Game.season == season, Game.status_short == 3, Game.stage != 1).order_by(Game.date_start.asc()).all()
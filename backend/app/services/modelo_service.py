@@ -1,14 +1,37 @@
 import os
+import json
+import hashlib
 import logging
+import threading
+import time
 import numpy as np
 
+from collections import OrderedDict
+from datetime import datetime, timezone
+
 from app.config import config
-from app.db.models import Game, PlayerGameStats
+from app.db.models import PlayerTeamSeason
+from app.etl.func_normalize import _normalizar_segundos, _segundos_para_minutos
+from app.services import janelas_moveis, pacote_modelos, snapshot_temporada
 
 logger = logging.getLogger(__name__)
 
 STATS_PARA_TREINAR = ["points", "assists", "tot_reb", "steals", "blocks"]
 N_ESTIMADORES_TOTAL = 150
+MODO_ATUALIZACAO_COMPLETO = "completo"
+MODO_ATUALIZACAO_INCREMENTAL = "incremental"
+TIPO_REFIT_COMPLETO = "completo"
+TIPO_INCREMENTAL = "incremental"
+NOME_MANIFESTO_VERSAO = "versao_modelos.json"
+VERSAO_DADOS_TREINO = 2
+FORMATO_PICKLE = "pickle"
+FORMATO_PACOTE = "pacote"
+
+_trava_registro = threading.Lock()
+_registro_modelos = OrderedDict()
+_contadores_registro = {"acertos": 0, "falhas": 0, "despejos": 0}
+_versao_registro = None
+_mtime_manifesto_registro = None
 
 LIMIARES_TREINO = {}
 LIMIARES_TREINO["points"] = 5.0
@@ -17,23 +40,25 @@ LIMIARES_TREINO["tot_reb"] = 2.5
 LIMIARES_TREINO["steals"] = 0.5
 LIMIARES_TREINO["blocks"] = 0.4
 
+MODO_TREINO_JOGADOR = "jogador"
+MODO_TREINO_AGRUPADO = "agrupado"
+N_ESTIMADORES_AGRUPADO = 300
+
+CODIGOS_POSICAO = {}
+CODIGOS_POSICAO["PG"] = 1
+CODIGOS_POSICAO["SG"] = 2
+CODIGOS_POSICAO["G"] = 2
+CODIGOS_POSICAO["GF"] = 3
+CODIGOS_POSICAO["SF"] = 3
+CODIGOS_POSICAO["F"] = 4
+CODIGOS_POSICAO["PF"] = 4
+CODIGOS_POSICAO["C"] = 5
+
+FAIXAS_MINUTOS = [15.0, 25.0, 32.0]
+
 
 def _converter_minutos(minutos_str):
-    if not minutos_str:
-        return 0.0
-    minutos_limpo = str(minutos_str).strip()
-    if minutos_limpo == "" or minutos_limpo == "0:00" or minutos_limpo == "00:00":
-        return 0.0
-    if ":" in minutos_limpo:
-        partes = minutos_limpo.split(":")
-        try:
-            return int(partes[0]) + (int(partes[1]) / 60.0)
-        except (ValueError, IndexError):
-            return 0.0
-    try:
-        return float(minutos_limpo)
-    except ValueError:
-        return 0.0
+    return _segundos_para_minutos(_normalizar_segundos(minutos_str))
 
 
 def _caminho_modelo(player_id, stat_name):
@@ -41,217 +66,867 @@ def _caminho_modelo(player_id, stat_name):
     return os.path.join(pasta, f"modelo_{player_id}_{stat_name}.pkl")
 
 
-def salvar_modelo(modelo, player_id, stat_name):
+def _caminho_manifesto_versao():
+    return os.path.join(config.PASTA_MODELOS, NOME_MANIFESTO_VERSAO)
+
+
+def _gravar_modelo_disco(modelo, caminho):
     import pickle
     pasta = config.PASTA_MODELOS
     if not os.path.exists(pasta):
         os.makedirs(pasta)
-    caminho = _caminho_modelo(player_id, stat_name)
     with open(caminho, "wb") as arquivo:
         pickle.dump(modelo, arquivo)
 
 
-def carregar_modelo(player_id, stat_name):
+def formato_pacote_ativo():
+    return config.FORMATO_MODELOS == FORMATO_PACOTE
+
+
+def _caminho_pacote(stat_name, season):
+    pasta = config.PASTA_MODELOS
+    return os.path.join(pasta, f"pacote_{stat_name}_{season}.ubjp")
+
+
+def _serializar_booster(modelo):
+    return bytes(modelo.get_booster().save_raw(raw_format="ubj"))
+
+
+def _desserializar_booster(dados):
+    from xgboost import XGBRegressor
+    modelo = XGBRegressor()
+    modelo.load_model(bytearray(dados))
+    return modelo
+
+
+def _pasta_avulsos(stat_name, season):
+    return os.path.join(config.PASTA_MODELOS, f"avulsos_{stat_name}_{season}")
+
+
+def _caminho_avulso(player_id, stat_name, season):
+    return os.path.join(_pasta_avulsos(stat_name, season), f"{player_id}.ubj")
+
+
+def _gravar_avulso(dados, caminho):
+    # modelo treinado sob demanda no formato pacote: arquivo proprio ate o proximo
+    # retreino juntar ao pacote, sem regravar o pacote a cada modelo
+    pasta = os.path.dirname(caminho)
+    if not os.path.exists(pasta):
+        os.makedirs(pasta, exist_ok=True)
+    caminho_temporario = f"{caminho}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(caminho_temporario, "wb") as arquivo:
+        arquivo.write(dados)
+    os.replace(caminho_temporario, caminho)
+
+
+def _ler_avulso(caminho):
+    with open(caminho, "rb") as arquivo:
+        return arquivo.read()
+
+
+def _ler_avulsos(stat_name, season):
+    # player_id -> (caminho, mtime_ns, dados)
+    pasta = _pasta_avulsos(stat_name, season)
+    avulsos = {}
+    if not os.path.exists(pasta):
+        return avulsos
+    for nome in os.listdir(pasta):
+        if not nome.endswith(".ubj"):
+            continue
+        caminho = os.path.join(pasta, nome)
+        try:
+            mtime_ns = os.stat(caminho).st_mtime_ns
+            avulsos[nome[:-len(".ubj")]] = (caminho, mtime_ns, _ler_avulso(caminho))
+        except FileNotFoundError:
+            continue
+    return avulsos
+
+
+def _remover_avulsos_incorporados(avulsos):
+    for chave in avulsos:
+        caminho, mtime_ns, _ = avulsos[chave]
+        try:
+            # regravado depois da leitura: fica para o proximo retreino
+            if os.stat(caminho).st_mtime_ns == mtime_ns:
+                os.remove(caminho)
+        except FileNotFoundError:
+            continue
+
+
+def atualizar_pacote(stat_name, season, modelos_serializados):
+    # regrava o pacote inteiro mantendo as entradas que nao foram substituidas e
+    # incorporando os modelos avulsos; a trava cobre leitura e escrita para
+    # gravacoes concorrentes nao se perderem
+    caminho = _caminho_pacote(stat_name, season)
+    with pacote_modelos.trava_escrita(caminho):
+        entradas = pacote_modelos.ler_todas_entradas(caminho)
+        avulsos = _ler_avulsos(stat_name, season)
+        for chave in avulsos:
+            entradas[chave] = avulsos[chave][2]
+        for player_id in modelos_serializados:
+            entradas[str(player_id)] = modelos_serializados[player_id]
+        total = pacote_modelos.escrever_pacote(caminho, entradas)
+        _remover_avulsos_incorporados(avulsos)
+    logger.info(f"Pacote de modelos gravado: stat={stat_name}, temporada={season}, modelos={total}")
+    return total
+
+
+def salvar_modelo(modelo, player_id, stat_name, season=None):
+    if formato_pacote_ativo() and season is not None:
+        chave = (player_id, stat_name, season)
+        caminho = _caminho_avulso(player_id, stat_name, season)
+        _gravar_avulso(_serializar_booster(modelo), caminho)
+    else:
+        chave = (player_id, stat_name, None)
+        caminho = _caminho_modelo(player_id, stat_name)
+        _gravar_modelo_disco(modelo, caminho)
+    _registrar_modelo(chave, modelo, caminho, os.path.getmtime(caminho))
+
+
+def _ler_pickle(caminho):
     import pickle
-    caminho = _caminho_modelo(player_id, stat_name)
+    with open(caminho, "rb") as arquivo:
+        return pickle.load(arquivo)
+
+
+def _carregar_modelo_disco(caminho, descricao, carregador=None):
+    try:
+        if carregador is None:
+            return _ler_pickle(caminho)
+        return carregador(caminho)
+    except Exception as erro:
+        logger.warning(f"Falha ao carregar modelo: {descricao}: {erro}")
+        return None
+
+
+def _caminho_modelo_agrupado(stat_name, season):
+    pasta = config.PASTA_MODELOS
+    return os.path.join(pasta, f"modelo_agrupado_{stat_name}_{season}.pkl")
+
+
+def salvar_modelo_agrupado(modelo, stat_name, season):
+    caminho = _caminho_modelo_agrupado(stat_name, season)
+    _gravar_modelo_disco(modelo, caminho)
+    _registrar_modelo(("agrupado", stat_name, season), modelo, caminho, os.path.getmtime(caminho))
+
+
+def salvar_versao_manifesto():
+    pasta = config.PASTA_MODELOS
+    if not os.path.exists(pasta):
+        os.makedirs(pasta)
+    versao = datetime.now(timezone.utc).isoformat()
+    with open(_caminho_manifesto_versao(), "w", encoding="utf-8") as arquivo:
+        json.dump({"versao": versao}, arquivo)
+    return versao
+
+
+def _ler_versao_manifesto():
+    caminho = _caminho_manifesto_versao()
     if not os.path.exists(caminho):
         return None
     try:
-        with open(caminho, "rb") as arquivo:
-            return pickle.load(arquivo)
+        with open(caminho, "r", encoding="utf-8") as arquivo:
+            return json.load(arquivo).get("versao")
     except Exception as erro:
-        logger.warning(f"Falha ao carregar modelo: player_id={player_id}, stat={stat_name}: {erro}")
+        logger.warning(f"Falha ao ler versao do manifesto de modelos: {erro}")
         return None
 
 
-def _treinar_modelo_novo(lista_features, lista_alvos):
+def _verificar_versao_manifesto():
+    global _versao_registro, _mtime_manifesto_registro
+    caminho = _caminho_manifesto_versao()
+    if os.path.exists(caminho):
+        mtime = os.path.getmtime(caminho)
+    else:
+        mtime = None
+    if mtime == _mtime_manifesto_registro:
+        return
+    _mtime_manifesto_registro = mtime
+
+    versao = _ler_versao_manifesto()
+    if versao != _versao_registro:
+        if _registro_modelos:
+            logger.info(f"Versao dos modelos alterada ({_versao_registro} -> {versao}), limpando registro")
+        _registro_modelos.clear()
+        _versao_registro = versao
+
+
+def versao_modelos_atual():
+    with _trava_registro:
+        _verificar_versao_manifesto()
+        return _versao_registro
+
+
+def _registrar_modelo(chave, modelo, caminho, mtime):
+    with _trava_registro:
+        _registro_modelos[chave] = {"modelo": modelo, "caminho": caminho, "mtime": mtime}
+        _registro_modelos.move_to_end(chave)
+        while len(_registro_modelos) > config.REGISTRO_MODELOS_MAX:
+            _registro_modelos.popitem(last=False)
+            _contadores_registro["despejos"] = _contadores_registro["despejos"] + 1
+
+
+def _carregar_com_registro(chave, caminho, descricao, carregador=None):
+    with _trava_registro:
+        _verificar_versao_manifesto()
+        if not os.path.exists(caminho):
+            _registro_modelos.pop(chave, None)
+            return None
+        mtime = os.path.getmtime(caminho)
+        entrada = _registro_modelos.get(chave)
+        # a mesma chave pode vir do pacote ou do pickle: vale o arquivo e o mtime
+        if entrada is not None and entrada["caminho"] == caminho and entrada["mtime"] == mtime:
+            _registro_modelos.move_to_end(chave)
+            _contadores_registro["acertos"] = _contadores_registro["acertos"] + 1
+            return entrada["modelo"]
+        _contadores_registro["falhas"] = _contadores_registro["falhas"] + 1
+
+    modelo = _carregar_modelo_disco(caminho, descricao, carregador)
+    if modelo is not None:
+        _registrar_modelo(chave, modelo, caminho, mtime)
+    return modelo
+
+
+def _carregar_do_pacote(caminho, player_id):
+    dados = pacote_modelos.ler_entrada(caminho, player_id)
+    if dados is None:
+        return None
+    return _desserializar_booster(dados)
+
+
+def carregar_modelo(player_id, stat_name, season=None):
+    descricao = f"player_id={player_id}, stat={stat_name}"
+    if formato_pacote_ativo() and season is not None and pacote_modelos.contem_entrada(_caminho_pacote(stat_name, season), player_id):
+        caminho = _caminho_pacote(stat_name, season)
+        modelo = _carregar_com_registro((player_id, stat_name, season), caminho, descricao, lambda caminho_pacote: _carregar_do_pacote(caminho_pacote, player_id))
+        if modelo is not None:
+            return modelo
+    if formato_pacote_ativo() and season is not None:
+        caminho = _caminho_avulso(player_id, stat_name, season)
+        modelo = _carregar_com_registro((player_id, stat_name, season), caminho, descricao, lambda caminho_avulso: _desserializar_booster(_ler_avulso(caminho_avulso)))
+        if modelo is not None:
+            return modelo
+    # o pickle nao tem temporada: uma entrada so no registro, seja qual for a season pedida
+    caminho = _caminho_modelo(player_id, stat_name)
+    return _carregar_com_registro((player_id, stat_name, None), caminho, descricao)
+
+
+def _modelo_existe(player_id, stat_name, season=None):
+    if formato_pacote_ativo() and season is not None:
+        if pacote_modelos.contem_entrada(_caminho_pacote(stat_name, season), player_id):
+            return True
+        return os.path.exists(_caminho_avulso(player_id, stat_name, season))
+    return os.path.exists(_caminho_modelo(player_id, stat_name))
+
+
+def carregar_modelo_agrupado(stat_name, season):
+    caminho = _caminho_modelo_agrupado(stat_name, season)
+    return _carregar_com_registro(("agrupado", stat_name, season), caminho, f"agrupado, stat={stat_name}, temporada={season}")
+
+
+def limpar_registro_modelos():
+    with _trava_registro:
+        _registro_modelos.clear()
+
+
+def estatisticas_registro_modelos():
+    with _trava_registro:
+        acertos = _contadores_registro["acertos"]
+        falhas = _contadores_registro["falhas"]
+        total = acertos + falhas
+        resultado = {}
+        resultado["tamanho"] = len(_registro_modelos)
+        resultado["capacidade"] = config.REGISTRO_MODELOS_MAX
+        resultado["acertos"] = acertos
+        resultado["falhas"] = falhas
+        resultado["despejos"] = _contadores_registro["despejos"]
+        resultado["taxa_acerto"] = round(acertos / total * 100, 2) if total > 0 else 0.0
+        resultado["versao_manifesto"] = _versao_registro
+        return resultado
+
+
+def _chaves_modelos_pickle(pasta):
+    chaves = []
+    for nome in os.listdir(pasta):
+        if not nome.startswith("modelo_") or not nome.endswith(".pkl"):
+            continue
+        if nome.startswith("modelo_agrupado_"):
+            continue
+        partes = nome[len("modelo_"):-len(".pkl")].split("_", 1)
+        if len(partes) != 2:
+            continue
+        try:
+            chaves.append((int(partes[0]), partes[1]))
+        except ValueError:
+            continue
+    return chaves
+
+
+def _chaves_modelos_pacote(pasta):
+    chaves = []
+    for nome in os.listdir(pasta):
+        if not nome.startswith("pacote_") or not nome.endswith(".ubjp"):
+            continue
+        partes = nome[len("pacote_"):-len(".ubjp")].rsplit("_", 1)
+        if len(partes) != 2:
+            continue
+        stat_name = partes[0]
+        season = int(partes[1])
+        for chave in pacote_modelos.listar_chaves(os.path.join(pasta, nome)):
+            chaves.append((int(chave), stat_name, season))
+    return chaves
+
+
+def aquecer_registro_modelos():
+    pasta = config.PASTA_MODELOS
+    if not os.path.exists(pasta):
+        return 0
+
+    if formato_pacote_ativo():
+        chaves = _chaves_modelos_pacote(pasta)
+    else:
+        chaves = _chaves_modelos_pickle(pasta)
+
+    total_carregados = 0
+    for chave in chaves[:config.REGISTRO_MODELOS_MAX]:
+        if carregar_modelo(*chave) is not None:
+            total_carregados = total_carregados + 1
+
+    logger.warning(f"Registro de modelos aquecido: carregados={total_carregados}, disponiveis={len(chaves)}")
+    return total_carregados
+
+
+def _parametros_modelo_jogador(n_estimators, n_jobs):
+    return dict(n_estimators=n_estimators, max_depth=4, learning_rate=0.05, subsample=0.8, colsample_bytree=0.7, min_child_weight=5, gamma=0.1, reg_alpha=0.1, reg_lambda=2.0, random_state=42, objective="reg:squarederror", n_jobs=n_jobs)
+
+
+def _treinar_modelo_novo(lista_features, lista_alvos, n_jobs=-1, lista_pesos=None):
     from xgboost import XGBRegressor
     matriz = np.array(lista_features)
     alvos = np.array(lista_alvos)
-    modelo = XGBRegressor(n_estimators=N_ESTIMADORES_TOTAL, max_depth=4, learning_rate=0.05, subsample=0.8, colsample_bytree=0.7, min_child_weight=5, gamma=0.1, reg_alpha=0.1, reg_lambda=2.0, random_state=42, objective="reg:squarederror", n_jobs=-1)
-    modelo.fit(matriz, alvos)
+    modelo = XGBRegressor(**_parametros_modelo_jogador(N_ESTIMADORES_TOTAL, n_jobs))
+    if lista_pesos is None:
+        modelo.fit(matriz, alvos)
+    else:
+        modelo.fit(matriz, alvos, sample_weight=np.array(lista_pesos))
     return modelo
 
 
-def _treinar_modelo_jogador(player_id, stat_name, lista_features, lista_alvos):
-    if lista_features is None or len(lista_features) < 5:
-        return None
-    logger.info(f"Treinando: player_id={player_id}, stat={stat_name}, amostras={len(lista_features)}")
-    return _treinar_modelo_novo(lista_features, lista_alvos)
+def _pesos_temporadas_anteriores(season):
+    # [(temporada, peso)] da mais recente para a mais antiga, peso = decaimento^distancia
+    pesos = []
+    for distancia in range(1, config.TREINO_TEMPORADAS_ANTERIORES + 1):
+        pesos.append((season - distancia, config.TREINO_DECAIMENTO_TEMPORADA ** distancia))
+    return pesos
 
 
 def _pre_carregar_dados_temporada(db, season):
+    # colunas por jogador (views do snapshot colunar): points, ..., minutes, timestamps.
+    # com lookback, "historico" guarda as temporadas anteriores do jogador com o peso de cada uma
     logger.warning(f"Pre-carregando dados da temporada: {season}")
+    snapshot = snapshot_temporada.obter_snapshot(db, season)
+    dados_por_jogador = snapshot_temporada.dados_por_jogador(snapshot)
+    total_registros = snapshot["meta"]["linhas"]
+
+    for temporada_anterior, peso in _pesos_temporadas_anteriores(season):
+        snapshot_anterior = snapshot_temporada.obter_snapshot(db, temporada_anterior)
+        anteriores = snapshot_temporada.dados_por_jogador(snapshot_anterior)
+        total_registros = total_registros + snapshot_anterior["meta"]["linhas"]
+        for player_id in dados_por_jogador:
+            if player_id not in anteriores:
+                continue
+            if "historico" not in dados_por_jogador[player_id]:
+                dados_por_jogador[player_id]["historico"] = []
+            dados_por_jogador[player_id]["historico"].append((peso, anteriores[player_id]))
 
-    resultados = db.query(PlayerGameStats, Game.date_start).join(Game, PlayerGameStats.game_id == Game.id).filter(Game.season == season, Game.status_short == 3, Game.stage != 1).order_by(PlayerGameStats.player_id, Game.date_start.asc()).all()
-
-    dados_por_jogador = {}
-    for stat, data_jogo in resultados:
-        pid = stat.player_id
-        if pid not in dados_por_jogador:
-            dados_por_jogador[pid] = []
-
-        item = {}
-        item["points"] = float(stat.points or 0)
-        item["assists"] = float(stat.assists or 0)
-        item["tot_reb"] = float(stat.tot_reb or 0)
-        item["steals"] = float(stat.steals or 0)
-        item["blocks"] = float(stat.blocks or 0)
-        item["minutes"] = _converter_minutos(stat.minutes)
-        item["data"] = data_jogo
-        dados_por_jogador[pid].append(item)
-
-    logger.warning(f"Dados carregados: {len(dados_por_jogador)} jogadores, {len(resultados)} registros")
+    logger.warning(f"Dados carregados: {len(dados_por_jogador)} jogadores, {total_registros} registros, temporadas_anteriores={config.TREINO_TEMPORADAS_ANTERIORES}")
     return dados_por_jogador
 
 
+def _total_jogos(jogos_jogador):
+    return len(jogos_jogador["minutes"])
+
+
 def _extrair_features_em_memoria(jogos_jogador, stat_name):
-    if len(jogos_jogador) < 5:
+    total_jogos = _total_jogos(jogos_jogador)
+    if total_jogos < 5:
+        return None, None
+
+    valores = np.asarray(jogos_jogador[stat_name], dtype=float)
+    minutos = np.asarray(jogos_jogador["minutes"], dtype=float)
+    janelas = janelas_moveis.calcular_janelas(valores, minutos)
+
+    # linha idx usa o historico dos idx primeiros jogos para prever o jogo idx
+    posicoes = slice(5, total_jogos)
+    media_temporada = janelas["media_temporada"][posicoes]
+    ema_ponderada = janelas_moveis.combinar_janelas(janelas["ema_3"][posicoes], janelas["ema_10"][posicoes], media_temporada)
+    zeros = np.zeros(len(media_temporada))
+
+    matriz = np.column_stack([ema_ponderada, zeros, zeros, zeros + 3, janelas["media_minutos"][posicoes], janelas["inclinacao"][posicoes], ema_ponderada, janelas["variancia"][posicoes], zeros, media_temporada, janelas["media_10"][posicoes]])
+
+    if len(matriz) < 5:
         return None, None
 
+    return matriz.tolist(), valores[posicoes].tolist()
+
+
+def _segmentos_treino(jogos_jogador):
+    # temporadas anteriores (da mais antiga) e por ultimo a atual com peso 1: jogos
+    # novos so acrescentam linhas no fim. as features de cada segmento usam so o
+    # historico da propria temporada, como na previsao
+    segmentos = []
+    for peso, jogos_anteriores in reversed(jogos_jogador.get("historico", [])):
+        segmentos.append((peso, jogos_anteriores))
+    segmentos.append((1.0, jogos_jogador))
+    return segmentos
+
+
+def _extrair_features_com_historico(jogos_jogador, stat_name):
     lista_features = []
     lista_alvos = []
+    lista_pesos = []
+    for peso, jogos_segmento in _segmentos_treino(jogos_jogador):
+        features_segmento, alvos_segmento = _extrair_features_em_memoria(jogos_segmento, stat_name)
+        if features_segmento is None:
+            continue
+        lista_features.extend(features_segmento)
+        lista_alvos.extend(alvos_segmento)
+        lista_pesos.extend([peso] * len(alvos_segmento))
+    if not lista_features:
+        return None, None, None
+    if "historico" not in jogos_jogador:
+        lista_pesos = None
+    return lista_features, lista_alvos, lista_pesos
 
-    for idx in range(5, len(jogos_jogador)):
-        alvo = jogos_jogador[idx][stat_name]
 
-        inicio_10 = max(0, idx - 10)
-        inicio_3 = max(0, idx - 3)
+def modo_agrupado_ativo():
+    return config.MODO_TREINO_MODELOS == MODO_TREINO_AGRUPADO
 
-        valores_10 = []
-        for j in jogos_jogador[inicio_10:idx]:
-            valores_10.append(j[stat_name])
 
-        valores_3 = []
-        for j in jogos_jogador[inicio_3:idx]:
-            valores_3.append(j[stat_name])
+def faixa_minutos(media_minutos):
+    faixa = 0
+    for limite in FAIXAS_MINUTOS:
+        if media_minutos >= limite:
+            faixa = faixa + 1
+    return faixa
 
-        valores_minutos = []
-        for j in jogos_jogador[inicio_10:idx]:
-            valores_minutos.append(j["minutes"])
 
-        todos_anteriores = []
-        for j in jogos_jogador[:idx]:
-            todos_anteriores.append(j[stat_name])
+def montar_contexto_agrupado(pos_normalizada, media_minutos, total_jogos):
+    codigo = CODIGOS_POSICAO.get(pos_normalizada, 0)
+    return [codigo, faixa_minutos(media_minutos), total_jogos]
 
-        if todos_anteriores:
-            media_temporada = sum(todos_anteriores) / len(todos_anteriores)
-        else:
-            media_temporada = 0.0
 
-        if valores_10:
-            media_10 = sum(valores_10) / len(valores_10)
+def _carregar_posicoes_temporada(db, season):
+    # mesma regra da previsao: vale o primeiro vinculo por id, mesmo sem posicao
+    registros = db.query(PlayerTeamSeason.player_id, PlayerTeamSeason.pos).filter(PlayerTeamSeason.season == season).order_by(PlayerTeamSeason.id.asc()).all()
+    posicoes = {}
+    for registro in registros:
+        if registro.player_id in posicoes:
+            continue
+        if registro.pos:
+            posicoes[registro.player_id] = registro.pos.split("-")[0]
         else:
-            media_10 = 0.0
+            posicoes[registro.player_id] = None
+    return posicoes
 
-        if valores_minutos:
-            media_minutos = sum(valores_minutos) / len(valores_minutos)
-        else:
-            media_minutos = 0.0
-
-        soma_pesos_3 = 0.0
-        soma_ponderada_3 = 0.0
-        for i in range(len(valores_3)):
-            peso = i + 1
-            soma_ponderada_3 = soma_ponderada_3 + (valores_3[i] * peso)
-            soma_pesos_3 = soma_pesos_3 + peso
-        if soma_pesos_3 > 0:
-            ema_3 = soma_ponderada_3 / soma_pesos_3
-        else:
-            ema_3 = 0.0
-
-        soma_pesos_10 = 0.0
-        soma_ponderada_10 = 0.0
-        for i in range(len(valores_10)):
-            peso = i + 1
-            soma_ponderada_10 = soma_ponderada_10 + (valores_10[i] * peso)
-            soma_pesos_10 = soma_pesos_10 + peso
-        if soma_pesos_10 > 0:
-            ema_10 = soma_ponderada_10 / soma_pesos_10
-        else:
-            ema_10 = 0.0
 
-        ema_ponderada = (ema_3 * 0.40) + (ema_10 * 0.35) + (media_temporada * 0.25)
+def _treinar_modelo_agrupado(matriz, alvos, pesos=None):
+    from xgboost import XGBRegressor
+    modelo = XGBRegressor(n_estimators=N_ESTIMADORES_AGRUPADO, max_depth=6, learning_rate=0.05, subsample=0.8, colsample_bytree=0.8, min_child_weight=10, gamma=0.1, reg_alpha=0.1, reg_lambda=2.0, random_state=42, objective="reg:squarederror", n_jobs=-1)
+    if pesos is None:
+        modelo.fit(matriz, alvos)
+    else:
+        modelo.fit(matriz, alvos, sample_weight=pesos)
+    return modelo
 
-        if len(valores_3) >= 2:
-            eixo_x = np.arange(len(valores_3))
-            inclinacao = float(np.polyfit(eixo_x, np.array(valores_3), 1)[0])
-            variancia = float(np.std(valores_3))
-        else:
-            inclinacao = 0.0
-            variancia = 0.0
 
-        vetor = [ema_ponderada, 0, 0, 3, media_minutos, inclinacao, ema_ponderada, variancia, 0, media_temporada, media_10]
-        lista_features.append(vetor)
-        lista_alvos.append(alvo)
+def _montar_amostras_agrupadas(dados_por_jogador, ids_jogadores, posicoes, stat_name):
+    limiar_stat = LIMIARES_TREINO.get(stat_name, 0.0)
+    linhas = []
+    alvos = []
+    pesos = []
+    for player_id in ids_jogadores:
+        jogos_jogador = dados_por_jogador[player_id]
+        media = float(np.mean(jogos_jogador[stat_name]))
+        if media < limiar_stat:
+            continue
+        pos_normalizada = posicoes.get(player_id)
+        for peso, jogos_segmento in _segmentos_treino(jogos_jogador):
+            lista_features, lista_alvos = _extrair_features_em_memoria(jogos_segmento, stat_name)
+            if lista_features is None:
+                continue
+            for posicao in range(len(lista_features)):
+                vetor = lista_features[posicao]
+                contexto = montar_contexto_agrupado(pos_normalizada, vetor[4], posicao + 5)
+                linhas.append(vetor + contexto)
+                alvos.append(lista_alvos[posicao])
+                pesos.append(peso)
+    return linhas, alvos, pesos
 
-    if len(lista_features) < 5:
-        return None, None
 
-    return lista_features, lista_alvos
+def _retreinar_modelos_agrupados(db, season, dados_por_jogador, ids_jogadores):
+    posicoes = _carregar_posicoes_temporada(db, season)
+    total_salvos = 0
+    total_erros = 0
 
+    for stat_name in STATS_PARA_TREINAR:
+        linhas, alvos, pesos = _montar_amostras_agrupadas(dados_por_jogador, ids_jogadores, posicoes, stat_name)
 
-def retreinar_todos_modelos(db, season):
-    limiar_minutos = config.MIN_MINUTOS_PALPITE
-    dados_por_jogador = _pre_carregar_dados_temporada(db, season)
+        if not linhas:
+            logger.warning(f"Sem amostras para modelo agrupado: stat={stat_name}, temporada={season}")
+            continue
+
+        try:
+            logger.info(f"Treinando modelo agrupado: stat={stat_name}, amostras={len(linhas)}")
+            pesos_treino = None
+            if config.TREINO_TEMPORADAS_ANTERIORES > 0:
+                pesos_treino = np.array(pesos)
+            modelo = _treinar_modelo_agrupado(np.array(linhas), np.array(alvos), pesos_treino)
+            salvar_modelo_agrupado(modelo, stat_name, season)
+            total_salvos = total_salvos + 1
+        except Exception as erro:
+            total_erros = total_erros + 1
+            logger.warning(f"Erro ao treinar modelo agrupado: stat={stat_name}: {erro}")
+
+    return total_salvos, total_erros
+
+
+def _quantidade_workers_retreino():
+    workers = config.RETREINO_WORKERS
+    if workers <= 0:
+        workers = os.cpu_count() or 1
+    return workers
 
+
+def _ids_jogadores_treino(dados_por_jogador):
+    limiar_minutos = config.MIN_MINUTOS_PALPITE
     ids_jogadores = []
     for pid in dados_por_jogador:
         jogos = dados_por_jogador[pid]
-        if len(jogos) == 0:
+        if _total_jogos(jogos) == 0:
             continue
-        soma_minutos = 0.0
-        for j in jogos:
-            soma_minutos = soma_minutos + j["minutes"]
-        media_minutos = soma_minutos / len(jogos)
+        media_minutos = float(np.mean(jogos["minutes"]))
         if media_minutos >= limiar_minutos:
             ids_jogadores.append(pid)
+    return ids_jogadores
 
-    total_jogadores = len(ids_jogadores)
-    total_salvos = 0
-    total_erros = 0
-
-    logger.warning(f"Retreinamento iniciado: jogadores={total_jogadores}, temporada={season}")
 
+def _montar_unidades_treino(dados_por_jogador, ids_jogadores):
+    unidades = []
     for player_id in ids_jogadores:
         jogos_jogador = dados_por_jogador[player_id]
 
-        medias_temporada = {}
-        for stat_name in STATS_PARA_TREINAR:
-            soma = 0.0
-            for j in jogos_jogador:
-                soma = soma + j[stat_name]
-            if len(jogos_jogador) > 0:
-                medias_temporada[stat_name] = soma / len(jogos_jogador)
-            else:
-                medias_temporada[stat_name] = 0.0
-
         for stat_name in STATS_PARA_TREINAR:
-            media = medias_temporada.get(stat_name, 0.0)
+            media = float(np.mean(jogos_jogador[stat_name]))
             limiar_stat = LIMIARES_TREINO.get(stat_name, 0.0)
             if media < limiar_stat:
                 logger.debug(f"Treino ignorado (stat irrelevante): player_id={player_id}, stat={stat_name}, media={round(media, 2)}")
                 continue
-            try:
-                lista_features, lista_alvos = _extrair_features_em_memoria(jogos_jogador, stat_name)
-                modelo = _treinar_modelo_jogador(player_id=player_id, stat_name=stat_name, lista_features=lista_features, lista_alvos=lista_alvos)
-                if modelo is None:
-                    continue
-                salvar_modelo(modelo=modelo, player_id=player_id, stat_name=stat_name)
-                total_salvos = total_salvos + 1
-            except Exception as erro:
-                total_erros = total_erros + 1
-                logger.warning(f"Erro ao treinar: player_id={player_id}, stat={stat_name}: {erro}")
+            lista_features, lista_alvos, lista_pesos = _extrair_features_com_historico(jogos_jogador, stat_name)
+            if lista_features is None or len(lista_features) < 5:
+                continue
+            unidades.append((player_id, stat_name, lista_features, lista_alvos, lista_pesos))
+    return unidades
+
+
+def _atualizar_modelo_incremental(modelo_anterior, lista_features, lista_alvos, lista_pesos, inicio_novas):
+    # continua o boosting do modelo salvo nas amostras recentes; None = pedir refit completo
+    from xgboost import XGBRegressor
+    matriz = np.array(lista_features)
+    alvos = np.array(lista_alvos)
+    novas = slice(inicio_novas, len(alvos))
+
+    # drift: erro do modelo atual nos jogos novos contra o da media da temporada (coluna 9)
+    erro_modelo = float(np.mean(np.abs(modelo_anterior.predict(matriz[novas]) - alvos[novas])))
+    erro_media = float(np.mean(np.abs(matriz[novas, 9] - alvos[novas])))
+    if erro_modelo > config.INCREMENTAL_LIMIAR_DRIFT * max(erro_media, 0.01):
+        return None
+
+    booster_anterior = modelo_anterior.get_booster()
+    if booster_anterior.num_boosted_rounds() + config.INCREMENTAL_RODADAS > config.INCREMENTAL_MAX_ARVORES:
+        return None
+
+    tamanho_janela = max(len(alvos) - inicio_novas, config.INCREMENTAL_JANELA_AMOSTRAS)
+    janela = slice(max(len(alvos) - tamanho_janela, 0), len(alvos))
+    modelo = XGBRegressor(**_parametros_modelo_jogador(config.INCREMENTAL_RODADAS, 1))
+    pesos = None
+    if lista_pesos is not None:
+        pesos = np.array(lista_pesos)[janela]
+    modelo.fit(matriz[janela], alvos[janela], sample_weight=pesos, xgb_model=booster_anterior)
+    return modelo
+
+
+def _executar_unidade_treino(unidade, formato_pacote=False, plano=None):
+    # roda no processo filho: um fit com n_jobs=1; no formato pickle o worker
+    # grava o arquivo direto, no formato pacote devolve o booster em UBJSON.
+    # com plano, tenta antes a atualizacao incremental do modelo salvo
+    player_id, stat_name, lista_features, lista_alvos, lista_pesos = unidade
+    try:
+        modelo = None
+        tipo = TIPO_REFIT_COMPLETO
+        if plano is not None:
+            modelo_anterior = carregar_modelo(player_id, stat_name, season=plano["season"])
+            if modelo_anterior is not None:
+                modelo = _atualizar_modelo_incremental(modelo_anterior, lista_features, lista_alvos, lista_pesos, plano["inicio_novas"])
+            if modelo is not None:
+                tipo = TIPO_INCREMENTAL
+        if modelo is None:
+            modelo = _treinar_modelo_novo(lista_features, lista_alvos, n_jobs=1, lista_pesos=lista_pesos)
+        if formato_pacote:
+            return None, _serializar_booster(modelo), tipo
+        _gravar_modelo_disco(modelo, _caminho_modelo(player_id, stat_name))
+        return None, None, tipo
+    except Exception as erro:
+        return str(erro), None, None
+
+
+def _treinar_unidades(unidades, ao_progredir=None, season=None, planos=None):
+    from concurrent.futures import ProcessPoolExecutor, as_completed
+
+    total = len(unidades)
+    if planos is None:
+        planos = [None] * total
+    workers = min(_quantidade_workers_retreino(), max(total, 1))
+    passo_log = max(total // 10, 1)
+    formato_pacote = formato_pacote_ativo() and season is not None
+    falhas = [None] * total
+    serializados = [None] * total
+    tipos = [None] * total
+    concluidas = 0
+
+    logger.warning(f"Treinando unidades: total={total}, workers={workers}")
+
+    if workers <= 1:
+        for indice in range(total):
+            falhas[indice], serializados[indice], tipos[indice] = _executar_unidade_treino(unidades[indice], formato_pacote, planos[indice])
+            concluidas = concluidas + 1
+            if ao_progredir is not None:
+                ao_progredir(concluidas, total)
+            if concluidas % passo_log == 0:
+                logger.warning(f"Progresso retreino: {concluidas}/{total}")
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futuros = {}
+            for indice in range(total):
+                futuros[executor.submit(_executar_unidade_treino, unidades[indice], formato_pacote, planos[indice])] = indice
+            for futuro in as_completed(futuros):
+                indice = futuros[futuro]
+                try:
+                    falhas[indice], serializados[indice], tipos[indice] = futuro.result()
+                except Exception as erro:
+                    falhas[indice] = str(erro)
+                concluidas = concluidas + 1
+                if ao_progredir is not None:
+                    ao_progredir(concluidas, total)
+                if concluidas % passo_log == 0:
+                    logger.warning(f"Progresso retreino: {concluidas}/{total}")
+
+    total_salvos = 0
+    erros_unidades = []
+    for indice in range(total):
+        player_id, stat_name, _, _, _ = unidades[indice]
+        if falhas[indice] is None:
+            total_salvos = total_salvos + 1
+            continue
+        logger.warning(f"Erro ao treinar: player_id={player_id}, stat={stat_name}: {falhas[indice]}")
+        erro_unidade = {}
+        erro_unidade["player_id"] = player_id
+        erro_unidade["stat"] = stat_name
+        erro_unidade["erro"] = falhas[indice]
+        erros_unidades.append(erro_unidade)
+
+    if formato_pacote:
+        novos_por_stat = {}
+        for indice in range(total):
+            if serializados[indice] is None:
+                continue
+            player_id, stat_name, _, _, _ = unidades[indice]
+            if stat_name not in novos_por_stat:
+                novos_por_stat[stat_name] = {}
+            novos_por_stat[stat_name][player_id] = serializados[indice]
+        for stat_name in novos_por_stat:
+            atualizar_pacote(stat_name, season, novos_por_stat[stat_name])
+
+    # os modelos foram gravados fora do registro; ele revalida por mtime
+    return total_salvos, erros_unidades, tipos
+
+
+def _caminho_manifesto_treino(season):
+    return os.path.join(config.PASTA_MODELOS, f"manifesto_treino_{season}.json")
+
+
+def carregar_manifesto_treino(season):
+    caminho = _caminho_manifesto_treino(season)
+    if not os.path.exists(caminho):
+        return {}
+    try:
+        with open(caminho, "r", encoding="utf-8") as arquivo:
+            return json.load(arquivo)
+    except Exception as erro:
+        logger.warning(f"Falha ao ler manifesto de treino: {erro}")
+        return {}
+
+
+def salvar_manifesto_treino(season, manifesto):
+    pasta = config.PASTA_MODELOS
+    if not os.path.exists(pasta):
+        os.makedirs(pasta)
+    caminho = _caminho_manifesto_treino(season)
+    caminho_temporario = caminho + ".tmp"
+    with open(caminho_temporario, "w", encoding="utf-8") as arquivo:
+        json.dump(manifesto, arquivo, ensure_ascii=False, indent=1, sort_keys=True)
+    os.replace(caminho_temporario, caminho)
+
+
+def _hash_dados_treino(lista_features, lista_alvos, lista_pesos=None):
+    resumo = hashlib.sha1()
+    resumo.update(str(VERSAO_DADOS_TREINO).encode())
+    resumo.update(str(N_ESTIMADORES_TOTAL).encode())
+    resumo.update(np.asarray(lista_features, dtype=float).tobytes())
+    resumo.update(np.asarray(lista_alvos, dtype=float).tobytes())
+    if lista_pesos is not None:
+        resumo.update(np.asarray(lista_pesos, dtype=float).tobytes())
+    return resumo.hexdigest()
+
+
+def _entrada_manifesto(jogos_jogador, lista_features, lista_alvos, lista_pesos=None):
+    ultimo_jogo = float(jogos_jogador["timestamps"][-1])
+    entrada = {}
+    entrada["ultimo_jogo"] = datetime.fromtimestamp(ultimo_jogo, tz=timezone.utc).isoformat() if not np.isnan(ultimo_jogo) else None
+    entrada["amostras"] = len(lista_alvos)
+    entrada["hash"] = _hash_dados_treino(lista_features, lista_alvos, lista_pesos)
+    return entrada
+
+
+def _classificar_unidades(unidades, dados_por_jogador, manifesto, forcar_completo=False, season=None):
+    # separa as unidades em pular (dados iguais e modelo no disco), retreinar e novas
+    pendentes = []
+    entradas = []
+    classificacao = {"pulados": 0, "retreinados": 0, "novos": 0}
+    for unidade in unidades:
+        player_id, stat_name, lista_features, lista_alvos, lista_pesos = unidade
+        chave = f"{player_id}_{stat_name}"
+        entrada = _entrada_manifesto(dados_por_jogador[player_id], lista_features, lista_alvos, lista_pesos)
+        anterior = manifesto.get(chave)
+        modelo_existe = _modelo_existe(player_id, stat_name, season)
+
+        if not forcar_completo and anterior is not None and modelo_existe and anterior.get("hash") == entrada["hash"]:
+            classificacao["pulados"] = classificacao["pulados"] + 1
+            continue
+        if anterior is not None and modelo_existe:
+            classificacao["retreinados"] = classificacao["retreinados"] + 1
+        else:
+            classificacao["novos"] = classificacao["novos"] + 1
+        pendentes.append(unidade)
+        entradas.append((chave, entrada))
+    return pendentes, entradas, classificacao
+
+
+def modo_incremental_ativo():
+    return config.MODO_ATUALIZACAO_MODELOS == MODO_ATUALIZACAO_INCREMENTAL
+
+
+def _refit_completo_vencido(anterior):
+    # agenda: refit completo a cada N atualizacoes ou D dias desde o ultimo
+    if anterior.get("atualizacoes_incrementais", 0) >= config.INCREMENTAL_MAX_ATUALIZACOES:
+        return True
+    refit_em = anterior.get("refit_completo_em")
+    if refit_em is None:
+        return True
+    idade = datetime.now(timezone.utc) - datetime.fromisoformat(refit_em)
+    return idade.total_seconds() > config.INCREMENTAL_DIAS_REFIT * 86400
+
+
+def _planejar_atualizacoes(pendentes, manifesto, forcar_completo=False, season=None):
+    # plano incremental so quando os dados antigos sao prefixo exato dos novos
+    planos = []
+    for unidade in pendentes:
+        player_id, stat_name, lista_features, lista_alvos, lista_pesos = unidade
+        anterior = manifesto.get(f"{player_id}_{stat_name}")
+        plano = None
+        if modo_incremental_ativo() and not forcar_completo and anterior is not None and not _refit_completo_vencido(anterior):
+            inicio_novas = anterior.get("amostras", 0)
+            if 0 < inicio_novas < len(lista_alvos):
+                pesos_prefixo = None
+                if lista_pesos is not None:
+                    pesos_prefixo = lista_pesos[:inicio_novas]
+                if _hash_dados_treino(lista_features[:inicio_novas], lista_alvos[:inicio_novas], pesos_prefixo) == anterior.get("hash"):
+                    plano = {"inicio_novas": inicio_novas, "season": season}
+        planos.append(plano)
+    return planos
+
+
+def _registrar_tipo_atualizacao(entrada, anterior, tipo):
+    if tipo == TIPO_INCREMENTAL and anterior is not None:
+        entrada["atualizacoes_incrementais"] = anterior.get("atualizacoes_incrementais", 0) + 1
+        entrada["refit_completo_em"] = anterior.get("refit_completo_em")
+    else:
+        entrada["atualizacoes_incrementais"] = 0
+        entrada["refit_completo_em"] = datetime.now(timezone.utc).isoformat()
+
+
+def retreinar_todos_modelos(db, season, ao_progredir=None, forcar_completo=False):
+    dados_por_jogador = _pre_carregar_dados_temporada(db, season)
+    ids_jogadores = _ids_jogadores_treino(dados_por_jogador)
+
+    total_jogadores = len(ids_jogadores)
+    total_salvos = 0
+    total_erros = 0
+    total_unidades = len(STATS_PARA_TREINAR)
+    erros_unidades = []
+    classificacao = {"pulados": 0, "retreinados": 0, "novos": 0}
+    total_incrementais = 0
+    inicio = time.monotonic()
+
+    logger.warning(f"Retreinamento iniciado: jogadores={total_jogadores}, temporada={season}, modo={config.MODO_TREINO_MODELOS}")
+
+    if modo_agrupado_ativo():
+        total_salvos, total_erros = _retreinar_modelos_agrupados(db, season, dados_por_jogador, ids_jogadores)
+    else:
+        unidades = _montar_unidades_treino(dados_por_jogador, ids_jogadores)
+        manifesto = carregar_manifesto_treino(season)
+        pendentes, entradas, classificacao = _classificar_unidades(unidades, dados_por_jogador, manifesto, forcar_completo=forcar_completo, season=season)
+        logger.warning(f"Unidades de treino: total={len(unidades)}, pular={classificacao['pulados']}, retreinar={classificacao['retreinados']}, novas={classificacao['novos']}")
+
+        planos = _planejar_atualizacoes(pendentes, manifesto, forcar_completo=forcar_completo, season=season)
+        total_salvos, erros_unidades, tipos = _treinar_unidades(pendentes, ao_progredir=ao_progredir, season=season, planos=planos)
+        total_erros = len(erros_unidades)
+        total_unidades = len(unidades)
+
+        chaves_com_erro = set()
+        for erro_unidade in erros_unidades:
+            chaves_com_erro.add(f"{erro_unidade['player_id']}_{erro_unidade['stat']}")
+        for indice in range(len(entradas)):
+            chave, entrada = entradas[indice]
+            if chave in chaves_com_erro:
+                manifesto.pop(chave, None)
+                continue
+            if tipos[indice] == TIPO_INCREMENTAL:
+                total_incrementais = total_incrementais + 1
+            _registrar_tipo_atualizacao(entrada, manifesto.get(chave), tipos[indice])
+            manifesto[chave] = entrada
+        salvar_manifesto_treino(season, manifesto)
 
     total_registros_db = 0
     for pid in dados_por_jogador:
-        total_registros_db = total_registros_db + len(dados_por_jogador[pid])
+        total_registros_db = total_registros_db + _total_jogos(dados_por_jogador[pid])
 
-    logger.warning(f"Retreinamento concluido: salvos={total_salvos}, erros={total_erros}, registros_db={total_registros_db}")
+    versao = _versao_registro
+    if total_salvos > 0:
+        versao = salvar_versao_manifesto()
+    logger.warning(f"Retreinamento concluido: salvos={total_salvos}, incrementais={total_incrementais}, pulados={classificacao['pulados']}, erros={total_erros}, registros_db={total_registros_db}, versao={versao}")
 
     resultado = {}
     resultado["total_salvos"] = total_salvos
     resultado["total_erros"] = total_erros
     resultado["total_jogadores_treino"] = total_jogadores
     resultado["total_registros_db"] = total_registros_db
+    resultado["total_unidades"] = total_unidades
+    resultado["total_pulados"] = classificacao["pulados"]
+    resultado["total_retreinados"] = classificacao["retreinados"]
+    resultado["total_novos"] = classificacao["novos"]
+    resultado["total_incrementais"] = total_incrementais
+    resultado["erros_unidades"] = erros_unidades
+    resultado["workers"] = _quantidade_workers_retreino()
+    resultado["duracao_segundos"] = round(time.monotonic() - inicio, 2)
     return resultado
\ No newline at end of file
@@ -1,76 +1,116 @@
+import asyncio
 import logging
+import threading
 import time
 import requests
 
 from app.config import config
+from app.services import cache_api, zona_bruta
 
 logger = logging.getLogger(__name__)
 
 TENTATIVAS_MAXIMAS = 3
-REQUISICOES_POR_MINUTO = 280
-INTERVALO_MINIMO_SEGUNDOS = 60.0 / REQUISICOES_POR_MINUTO
 ESPERA_RATE_LIMIT_BASE_SEGUNDOS = 15
-_timestamp_ultimo_request = 0.0
+TIMEOUT_SEGUNDOS = 15
+
+# token bucket unico para o cliente sincrono e o assincrono: a taxa e a cota por
+# minuto do plano e a capacidade e a rajada permitida. o saldo pode ficar
+# negativo; cada chamada reserva o proximo token livre e espera ate ele
+_trava_balde = threading.Lock()
+_balde = {"tokens": None, "atualizado_em": 0.0}
+
+def _reservar_token():
+    taxa = config.API_SPORTS_REQUISICOES_POR_MINUTO / 60.0
+    capacidade = max(config.API_SPORTS_RAJADA, 1)
+    with _trava_balde:
+        agora = time.monotonic()
+        if _balde["tokens"] is None:
+            _balde["tokens"] = float(capacidade)
+        else:
+            _balde["tokens"] = min(float(capacidade), _balde["tokens"] + (agora - _balde["atualizado_em"]) * taxa)
+        _balde["atualizado_em"] = agora
+        _balde["tokens"] = _balde["tokens"] - 1
+        if _balde["tokens"] >= 0:
+            return 0.0
+        return -_balde["tokens"] / taxa
 
 def _throttle():
-    global _timestamp_ultimo_request
+    espera = _reservar_token()
+    if espera > 0:
+        time.sleep(espera)
+
+def _cabecalhos():
+    return {"x-apisports-key": config.API_SPORTS_KEY}
+
+# sessao unica com keep-alive: evita um handshake TLS por chamada
+_trava_sessao = threading.Lock()
+_sessao_http = {"sessao": None}
+
+def _sessao():
+    with _trava_sessao:
+        if _sessao_http["sessao"] is None:
+            tamanho_pool = max(config.API_SPORTS_CONCORRENCIA, 1)
+            adaptador = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=tamanho_pool)
+            sessao = requests.Session()
+            sessao.headers.update(_cabecalhos())
+            sessao.mount("https://", adaptador)
+            sessao.mount("http://", adaptador)
+            _sessao_http["sessao"] = sessao
+        return _sessao_http["sessao"]
+
+def _avaliar_resposta(endpoint, status_code, obter_dados, tentativa_atual):
+    # regra comum aos dois clientes: devolve (espera, dados); espera != None = repetir
+    if status_code == 429:
+        espera = ESPERA_RATE_LIMIT_BASE_SEGUNDOS * tentativa_atual
+        if tentativa_atual < TENTATIVAS_MAXIMAS:
+            logger.warning(f"Rate limit HTTP 429 em '{endpoint}' —> tentativa {tentativa_atual}/{TENTATIVAS_MAXIMAS}. Aguardando {espera}s...")
+            return espera, None
+        logger.error(f"Rate limit HTTP 429 em '{endpoint}' —> todas as {TENTATIVAS_MAXIMAS} tentativas esgotadas.")
+        return None, None
+    if status_code >= 400:
+        logger.error(f"Erro HTTP ao chamar '{endpoint}': status={status_code}")
+        return None, None
+
+    dados = obter_dados()
+    erros_api = dados.get("errors")
+    if erros_api:
+        erro_str = str(erros_api)
+        if "rateLimit" in erro_str or "Too many requests" in erro_str:
+            espera = ESPERA_RATE_LIMIT_BASE_SEGUNDOS * tentativa_atual
+            if tentativa_atual < TENTATIVAS_MAXIMAS:
+                logger.warning(f"Rate limit JSON em '{endpoint}' —> tentativa {tentativa_atual}/{TENTATIVAS_MAXIMAS}. Aguardando {espera}s...")
+                return espera, None
+            logger.error(f"Rate limit JSON em '{endpoint}' —> todas as {TENTATIVAS_MAXIMAS} tentativas esgotadas.")
+            return None, None
+
+        logger.error(f"Erro retornado pela API-Sports em '{endpoint}': {erros_api}")
+        return None, None
 
-    agora = time.monotonic()
-    tempo_desde_ultimo = agora - _timestamp_ultimo_request
-    espera_necessaria = INTERVALO_MINIMO_SEGUNDOS - tempo_desde_ultimo
+    if dados and dados.get("response") is not None:
+        return None, dados["response"]
+    return None, None
 
-    if espera_necessaria > 0:
-        time.sleep(espera_necessaria)
-    _timestamp_ultimo_request = time.monotonic()
+def _registrar_resposta(endpoint, params, dados):
+    zona_bruta.registrar_resposta(endpoint, params, dados)
+    cache_api.gravar(endpoint, params, dados)
 
 def _fazer_requisicao(endpoint, params=None):
+    if zona_bruta.modo_replay_ativo():
+        return zona_bruta.ler_resposta(endpoint, params)
+
+    em_cache = cache_api.ler(endpoint, params)
+    if em_cache is not None:
+        return em_cache
+
     url = f"{config.API_SPORTS_BASE_URL}/{endpoint}"
-    cabecalhos = {
-        "x-apisports-key": config.API_SPORTS_KEY
-    }
 
     tentativa_atual = 1
     while tentativa_atual <= TENTATIVAS_MAXIMAS:
         _throttle()
 
         try:
-            resposta = requests.get(url, headers=cabecalhos, params=params, timeout=15)
-            if resposta.status_code == 429:
-                espera = ESPERA_RATE_LIMIT_BASE_SEGUNDOS * tentativa_atual
-
-                if tentativa_atual < TENTATIVAS_MAXIMAS:
-                    logger.warning(f"Rate limit HTTP 429 em '{endpoint}' —> tentativa {tentativa_atual}/{TENTATIVAS_MAXIMAS}. Aguardando {espera}s...")
-                    time.sleep(espera)
-                    tentativa_atual = tentativa_atual + 1
-                    continue
-                else:
-                    logger.error(f"Rate limit HTTP 429 em '{endpoint}' —> todas as {TENTATIVAS_MAXIMAS} tentativas esgotadas.")
-                    return None
-            resposta.raise_for_status()
-            dados = resposta.json()
-
-            erros_api = dados.get("errors")
-            if erros_api:
-                erro_str = str(erros_api)
-                if "rateLimit" in erro_str or "Too many requests" in erro_str:
-                    espera = ESPERA_RATE_LIMIT_BASE_SEGUNDOS * tentativa_atual
-
-                    if tentativa_atual < TENTATIVAS_MAXIMAS:
-                        logger.warning(f"Rate limit JSON em '{endpoint}' —> tentativa {tentativa_atual}/{TENTATIVAS_MAXIMAS}. Aguardando {espera}s...")
-                        time.sleep(espera)
-                        tentativa_atual = tentativa_atual + 1
-                        continue
-                    else:
-                        logger.error(f"Rate limit JSON em '{endpoint}' —> todas as {TENTATIVAS_MAXIMAS} tentativas esgotadas.")
-                        return None
-
-                logger.error(f"Erro retornado pela API-Sports em '{endpoint}': {erros_api}")
-                return None
-
-            if dados and dados.get("response") is not None:
-                return dados["response"]
-            return None
-
+            resposta = _sessao().get(url, params=params, timeout=TIMEOUT_SEGUNDOS)
+            espera, dados = _avaliar_resposta(endpoint, resposta.status_code, resposta.json, tentativa_atual)
         except requests.exceptions.HTTPError as erro:
             logger.error(f"Erro HTTP ao chamar '{endpoint}': {erro}")
             return None
@@ -83,8 +123,78 @@ def _fazer_requisicao(endpoint, params=None):
         except requests.exceptions.RequestException as erro:
             logger.error(f"Erro ao chamar '{endpoint}': {erro}")
             return None
+
+        if espera is None:
+            _registrar_resposta(endpoint, params, dados)
+            return dados
+        time.sleep(espera)
+        tentativa_atual = tentativa_atual + 1
     return None
 
+async def _fazer_requisicao_async(cliente, semaforo, endpoint, params=None):
+    import httpx
+
+    url = f"{config.API_SPORTS_BASE_URL}/{endpoint}"
+    tentativa_atual = 1
+    while tentativa_atual <= TENTATIVAS_MAXIMAS:
+        # o semaforo limita as requisicoes em voo; o balde limita a taxa
+        async with semaforo:
+            espera_token = _reservar_token()
+            if espera_token > 0:
+                await asyncio.sleep(espera_token)
+            try:
+                resposta = await cliente.get(url, params=params)
+                espera, dados = _avaliar_resposta(endpoint, resposta.status_code, resposta.json, tentativa_atual)
+            except httpx.TimeoutException as erro:
+                logger.error(f"Timeout ao chamar '{endpoint}': {erro}")
+                return None
+            except httpx.HTTPError as erro:
+                logger.error(f"Erro ao chamar '{endpoint}': {erro}")
+                return None
+            except ValueError as erro:
+                logger.error(f"Resposta invalida em '{endpoint}': {erro}")
+                return None
+
+        if espera is None:
+            _registrar_resposta(endpoint, params, dados)
+            return dados
+        await asyncio.sleep(espera)
+        tentativa_atual = tentativa_atual + 1
+    return None
+
+async def _buscar_varios_async(endpoint, lista_params):
+    import httpx
+
+    respostas = []
+    pendentes = []
+    for posicao, params in enumerate(lista_params):
+        respostas.append(cache_api.ler(endpoint, params))
+        if respostas[posicao] is None:
+            pendentes.append(posicao)
+    if not pendentes:
+        return respostas
+
+    concorrencia = max(config.API_SPORTS_CONCORRENCIA, 1)
+    semaforo = asyncio.Semaphore(concorrencia)
+    limites = httpx.Limits(max_connections=concorrencia, max_keepalive_connections=concorrencia)
+    async with httpx.AsyncClient(headers=_cabecalhos(), timeout=TIMEOUT_SEGUNDOS, limits=limites) as cliente:
+        tarefas = []
+        for posicao in pendentes:
+            tarefas.append(_fazer_requisicao_async(cliente, semaforo, endpoint, lista_params[posicao]))
+        buscadas = await asyncio.gather(*tarefas)
+    for posicao, dados in zip(pendentes, buscadas):
+        respostas[posicao] = dados
+    return respostas
+
+def _buscar_varios(endpoint, lista_params):
+    # ponto de entrada sincrono para as cargas (Airflow/CLI), que nao tem loop rodando
+    if zona_bruta.modo_replay_ativo():
+        respostas = []
+        for params in lista_params:
+            respostas.append(zona_bruta.ler_resposta(endpoint, params))
+        return respostas
+    return asyncio.run(_buscar_varios_async(endpoint, lista_params))
+
 def get_seasons():
     return _fazer_requisicao("seasons")
 
@@ -131,4 +241,18 @@ def get_player_statistics(game_id):
 
 def get_game_statistics(game_id):
     params = {"id": game_id}
-    return _fazer_requisicao("games/statistics", params=params)
\ No newline at end of file
+    return _fazer_requisicao("games/statistics", params=params)
+
+def get_player_statistics_many(game_ids):
+    lista_params = []
+    for game_id in game_ids:
+        lista_params.append({"game": game_id})
+    respostas = _buscar_varios("players/statistics", lista_params)
+    return dict(zip(game_ids, respostas))
+
+def get_game_statistics_many(game_ids):
+    lista_params = []
+    for game_id in game_ids:
+        lista_params.append({"id": game_id})
+    respostas = _buscar_varios("games/statistics", lista_params)
+    return dict(zip(game_ids, respostas))
@@ -0,0 +1,154 @@
+import os
+import json
+import mmap
+import fcntl
+import struct
+import logging
+import threading
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# layout do pacote:
+#   MAGICO (8 bytes) | tamanho do indice (uint64 little-endian) | indice JSON | dados
+# o indice mapeia chave -> [offset, tamanho], com offset relativo ao inicio dos dados
+MAGICO = b"NBAPKG1\n"
+TAMANHO_CABECALHO = len(MAGICO) + 8
+
+_trava = threading.Lock()
+_pacotes_abertos = {}
+_travas_escrita = {}
+
+
+def _trava_do_caminho(caminho):
+    with _trava:
+        if caminho not in _travas_escrita:
+            _travas_escrita[caminho] = threading.Lock()
+        return _travas_escrita[caminho]
+
+
+@contextmanager
+def trava_escrita(caminho):
+    # leitura-alteracao-escrita de um pacote: trava por caminho entre threads e
+    # flock no arquivo .lock entre processos (API e Airflow)
+    pasta = os.path.dirname(caminho)
+    if pasta and not os.path.exists(pasta):
+        os.makedirs(pasta, exist_ok=True)
+    with _trava_do_caminho(caminho):
+        with open(caminho + ".lock", "a") as arquivo:
+            fcntl.flock(arquivo.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(arquivo.fileno(), fcntl.LOCK_UN)
+
+
+def escrever_pacote(caminho, entradas):
+    chaves = sorted(entradas, key=str)
+    indice = {}
+    offset = 0
+    for chave in chaves:
+        tamanho = len(entradas[chave])
+        indice[str(chave)] = [offset, tamanho]
+        offset = offset + tamanho
+    indice_bytes = json.dumps(indice, separators=(",", ":")).encode("utf-8")
+
+    pasta = os.path.dirname(caminho)
+    if pasta and not os.path.exists(pasta):
+        os.makedirs(pasta, exist_ok=True)
+
+    caminho_temporario = f"{caminho}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(caminho_temporario, "wb") as arquivo:
+        arquivo.write(MAGICO)
+        arquivo.write(struct.pack("<Q", len(indice_bytes)))
+        arquivo.write(indice_bytes)
+        for chave in chaves:
+            arquivo.write(entradas[chave])
+    os.replace(caminho_temporario, caminho)
+    fechar_pacote(caminho)
+    return len(chaves)
+
+
+def _assinatura_arquivo(caminho):
+    # os.replace gera inode novo: inode + mtime_ns identificam a versao mesmo com
+    # duas gravacoes dentro da resolucao do mtime
+    estado = os.stat(caminho)
+    return (estado.st_ino, estado.st_mtime_ns)
+
+
+def _abrir_pacote(caminho, assinatura):
+    with open(caminho, "rb") as arquivo:
+        mapa = mmap.mmap(arquivo.fileno(), 0, access=mmap.ACCESS_READ)
+    if mapa[:len(MAGICO)] != MAGICO:
+        mapa.close()
+        raise ValueError(f"Pacote de modelos invalido: {caminho}")
+    tamanho_indice = struct.unpack("<Q", mapa[len(MAGICO):TAMANHO_CABECALHO])[0]
+    indice = json.loads(mapa[TAMANHO_CABECALHO:TAMANHO_CABECALHO + tamanho_indice].decode("utf-8"))
+
+    pacote = {}
+    pacote["mapa"] = mapa
+    pacote["indice"] = indice
+    pacote["inicio_dados"] = TAMANHO_CABECALHO + tamanho_indice
+    pacote["assinatura"] = assinatura
+    return pacote
+
+
+def obter_pacote(caminho):
+    try:
+        assinatura = _assinatura_arquivo(caminho)
+    except FileNotFoundError:
+        fechar_pacote(caminho)
+        return None
+    with _trava:
+        pacote = _pacotes_abertos.get(caminho)
+        if pacote is not None and pacote["assinatura"] == assinatura:
+            return pacote
+        # o mapa antigo nao e fechado aqui: outra thread pode estar fatiando;
+        # ele fecha sozinho quando a ultima referencia sai de uso
+        pacote = _abrir_pacote(caminho, assinatura)
+        _pacotes_abertos[caminho] = pacote
+        return pacote
+
+
+def fechar_pacote(caminho=None):
+    # so descarta as referencias; mapas ainda em uso continuam validos
+    with _trava:
+        if caminho is None:
+            _pacotes_abertos.clear()
+        else:
+            _pacotes_abertos.pop(caminho, None)
+
+
+def ler_entrada(caminho, chave):
+    pacote = obter_pacote(caminho)
+    if pacote is None:
+        return None
+    posicao = pacote["indice"].get(str(chave))
+    if posicao is None:
+        return None
+    inicio = pacote["inicio_dados"] + posicao[0]
+    return pacote["mapa"][inicio:inicio + posicao[1]]
+
+
+def contem_entrada(caminho, chave):
+    pacote = obter_pacote(caminho)
+    return pacote is not None and str(chave) in pacote["indice"]
+
+
+def listar_chaves(caminho):
+    pacote = obter_pacote(caminho)
+    if pacote is None:
+        return []
+    return list(pacote["indice"])
+
+
+def ler_todas_entradas(caminho):
+    pacote = obter_pacote(caminho)
+    if pacote is None:
+        return {}
+    entradas = {}
+    for chave in pacote["indice"]:
+        posicao = pacote["indice"][chave]
+        inicio = pacote["inicio_dados"] + posicao[0]
+        entradas[chave] = pacote["mapa"][inicio:inicio + posicao[1]]
+    return entradas
@@ -5,7 +5,8 @@ from datetime import datetime, timezone
 from sqlalchemy import func
 
 from app.db.models import Game, PlayerGameStats, PlayerTeamSeason
-from app.services import modelo_service
+from app.etl.func_normalize import _segundos_para_minutos
+from app.services import defesa_service, feature_store, janelas_moveis, modelo_service
 
 logger = logging.getLogger(__name__)
 
@@ -27,35 +28,25 @@ FATOR_POSICAO["F"] = {"points": 1.0, "assists": 1.0, "steals": 1.0, "tot_reb": 0
 FATOR_POSICAO["GF"] = {"points": 1.0, "assists": 0.8, "steals": 0.8, "tot_reb": 1.1, "blocks": 1.3}
 
 def converter_minutos_para_float(minutos_str):
-    if not minutos_str or minutos_str == "":
-        return 0.0
-    try:
-        texto = str(minutos_str)
-        if ":" in texto:
-            partes = texto.split(":")
-            return float(partes[0]) + (float(partes[1]) / 60)
-        return float(texto)
-    except (ValueError, AttributeError):
-        return 0.0
+    return modelo_service._converter_minutos(minutos_str)
 
 
 def calcular_ema_ponderada(valores):
     if not valores:
         return 0.0
-    soma_pesos = 0.0
-    soma_ponderada = 0.0
-    for i in range(len(valores)):
-        peso = i + 1
-        soma_ponderada = soma_ponderada + (valores[i] * peso)
-        soma_pesos = soma_pesos + peso
-    return round(soma_ponderada / soma_pesos, 4)
+    resultado = janelas_moveis.media_ponderada_linear(valores, len(valores))[-1]
+    return round(float(resultado), 4)
+
+
+def _combinar_janelas(ema_3, ema_10, media_temporada):
+    resultado = janelas_moveis.combinar_janelas(ema_3, ema_10, media_temporada)
+    return round(resultado, 4)
 
 
 def calcular_media_multi_janela(valores_3, valores_10, media_temporada):
     ema_3 = calcular_ema_ponderada(valores_3)
     ema_10 = calcular_ema_ponderada(valores_10)
-    resultado = (ema_3 * 0.40) + (ema_10 * 0.35) + (media_temporada * 0.25)
-    return round(resultado, 4)
+    return _combinar_janelas(ema_3, ema_10, media_temporada)
 
 
 def _traduzir_chave_stat(stat_name):
@@ -65,7 +56,7 @@ def _traduzir_chave_stat(stat_name):
 
 
 def _obter_posicao_jogador(db, player_id, season):
-    vinculo = db.query(PlayerTeamSeason).filter(PlayerTeamSeason.player_id == player_id, PlayerTeamSeason.season == season).first()
+    vinculo = db.query(PlayerTeamSeason).filter(PlayerTeamSeason.player_id == player_id, PlayerTeamSeason.season == season).order_by(PlayerTeamSeason.id.asc()).first()
     if vinculo is None:
         return None
     if not vinculo.pos:
@@ -128,47 +119,7 @@ def _carregar_historico_jogador(db, player_id, season, data_corte=None):
 
 
 def _calcular_defesa_adversaria(db, opponent_team_id, season, stat_name, data_corte=None):
-    query = db.query(PlayerGameStats).join(Game, PlayerGameStats.game_id == Game.id).filter(Game.season == season, Game.status_short == 3, Game.stage != 1, PlayerGameStats.team_id != opponent_team_id, (Game.home_team_id == opponent_team_id) | (Game.away_team_id == opponent_team_id))
-
-    if data_corte is not None:
-        query = query.filter(Game.date_start < data_corte)
-
-    stats_sofridas = query.all()
-    if not stats_sofridas:
-        return 0.0
-
-    total_stat = 0.0
-    for s in stats_sofridas:
-        total_stat = total_stat + float(getattr(s, stat_name, 0) or 0)
-
-    query_jogos = db.query(Game).filter(Game.season == season, Game.status_short == 3, Game.stage != 1, (Game.home_team_id == opponent_team_id) | (Game.away_team_id == opponent_team_id))
-    if data_corte is not None:
-        query_jogos = query_jogos.filter(Game.date_start < data_corte)
-
-    num_jogos = query_jogos.count()
-    if num_jogos > 0:
-        return round(total_stat / num_jogos, 2)
-    return 0.0
-
-
-def _calcular_media_vs_adversario(historico_jogador, opponent_team_id, stat_name):
-    stats_vs = []
-    for stat, jogo in historico_jogador:
-        if jogo.home_team_id == stat.team_id:
-            adversario_id = jogo.away_team_id
-        else:
-            adversario_id = jogo.home_team_id
-        if adversario_id == opponent_team_id:
-            v = float(getattr(stat, stat_name, 0) or 0)
-            stats_vs.append(v)
-
-    if not stats_vs:
-        return None
-
-    soma = 0.0
-    for v in stats_vs:
-        soma = soma + v
-    return soma / len(stats_vs)
+    return defesa_service.media_sofrida(db, opponent_team_id, season, stat_name, data_corte=data_corte)
 
 
 def extrair_features_avancadas_jogador(db, player_id, season, stat_name, data_corte=None):
@@ -177,85 +128,40 @@ def extrair_features_avancadas_jogador(db, player_id, season, stat_name, data_co
     if len(jogos_com_data) < 5:
         return None, None
 
-    lista_features = []
-    lista_alvos = []
+    valores = np.array([float(getattr(stat, stat_name) or 0) for stat, _ in jogos_com_data], dtype=float)
+    minutos = np.array([_segundos_para_minutos(stat.seconds_played) for stat, _ in jogos_com_data], dtype=float)
+    janelas = janelas_moveis.calcular_janelas(valores, minutos)
 
-    for idx in range(5, len(jogos_com_data)):
-        stat_atual = jogos_com_data[idx][0]
-        jogo_atual = jogos_com_data[idx][1]
-        alvo = float(getattr(stat_atual, stat_name) or 0)
-
-        inicio_10 = max(0, idx - 10)
-        inicio_3 = max(0, idx - 3)
-
-        valores_10 = []
-        for j in jogos_com_data[inicio_10:idx]:
-            valores_10.append(float(getattr(j[0], stat_name) or 0))
-
-        valores_3 = []
-        for j in jogos_com_data[inicio_3:idx]:
-            valores_3.append(float(getattr(j[0], stat_name) or 0))
-
-        valores_minutos = []
-        for j in jogos_com_data[inicio_10:idx]:
-            valores_minutos.append(converter_minutos_para_float(j[0].minutes))
-
-        todos_anteriores = []
-        for j in jogos_com_data[:idx]:
-            todos_anteriores.append(float(getattr(j[0], stat_name) or 0))
-
-        if todos_anteriores:
-            media_temporada = float(np.mean(todos_anteriores))
-        else:
-            media_temporada = 0.0
-
-        ema_ponderada = calcular_media_multi_janela(valores_3, valores_10, media_temporada)
-
-        if valores_10:
-            media_10 = float(np.mean(valores_10))
-        else:
-            media_10 = 0.0
-
-        if valores_minutos:
-            media_minutos = float(np.mean(valores_minutos))
-        else:
-            media_minutos = 0.0
-
-        if len(valores_3) >= 2:
-            eixo_x = np.arange(len(valores_3))
-            inclinacao = float(np.polyfit(eixo_x, np.array(valores_3), 1)[0])
-            variancia = float(np.std(valores_3))
-        else:
-            inclinacao = 0.0
-            variancia = 0.0
+    # mesmo arredondamento do caminho de previsao (calcular_media_multi_janela)
+    posicoes = slice(5, len(jogos_com_data))
+    media_temporada = janelas["media_temporada"][posicoes]
+    ema_3 = np.round(janelas["ema_3"][posicoes], 4)
+    ema_10 = np.round(janelas["ema_10"][posicoes], 4)
+    ema_ponderada = np.round(janelas_moveis.combinar_janelas(ema_3, ema_10, media_temporada), 4)
 
+    em_casa = []
+    back_to_back = []
+    for idx in range(5, len(jogos_com_data)):
+        stat_atual, jogo_atual = jogos_com_data[idx]
         if stat_atual.team_id == jogo_atual.home_team_id:
-            is_home = 1
+            em_casa.append(1)
         else:
-            is_home = 0
-
-        if idx >= 2:
-            data_atual = jogos_com_data[idx][1].date_start
-            data_anterior = jogos_com_data[idx - 1][1].date_start
-            if data_atual is not None and data_anterior is not None:
-                delta = (data_atual - data_anterior).days
-                if delta == 1:
-                    back_to_back = 1
-                else:
-                    back_to_back = 0
-            else:
-                back_to_back = 0
+            em_casa.append(0)
+
+        data_atual = jogo_atual.date_start
+        data_anterior = jogos_com_data[idx - 1][1].date_start
+        if data_atual is not None and data_anterior is not None and (data_atual - data_anterior).days == 1:
+            back_to_back.append(1)
         else:
-            back_to_back = 0
+            back_to_back.append(0)
 
-        vetor = [ema_ponderada, is_home, 0.0, 3, media_minutos, inclinacao, ema_ponderada, variancia, back_to_back, media_temporada, media_10]
-        lista_features.append(vetor)
-        lista_alvos.append(alvo)
+    zeros = np.zeros(len(media_temporada))
+    matriz = np.column_stack([ema_ponderada, em_casa, zeros, zeros + 3, janelas["media_minutos"][posicoes], janelas["inclinacao"][posicoes], ema_ponderada, janelas["variancia"][posicoes], back_to_back, media_temporada, janelas["media_10"][posicoes]])
 
-    if len(lista_features) < 5:
+    if len(matriz) < 5:
         return None, None
 
-    return lista_features, lista_alvos
+    return matriz.tolist(), valores[posicoes].tolist()
 
 
 def _montar_vetor_previsao(db, player_id, opponent_team_id, season, stat_name, em_casa, media_temporada, data_corte=None):
@@ -263,49 +169,20 @@ def _montar_vetor_previsao(db, player_id, opponent_team_id, season, stat_name, e
     if media_temporada < limiar:
         return None
 
-    historico = _carregar_historico_jogador(db, player_id, season, data_corte)
+    features = feature_store.consultar_features(db, player_id, season, stat_name, data_corte=data_corte, opponent_team_id=opponent_team_id)
 
-    if not historico:
+    if features is None:
         return None
 
-    historico_recente_10 = historico[-10:]
-    historico_recente_3 = historico[-3:]
-
-    valores_10 = []
-    for stat, jogo in historico_recente_10:
-        valores_10.append(float(getattr(stat, stat_name) or 0))
-
-    valores_3 = []
-    for stat, jogo in historico_recente_3:
-        valores_3.append(float(getattr(stat, stat_name) or 0))
-
-    valores_minutos = []
-    for stat, jogo in historico_recente_10:
-        valores_minutos.append(converter_minutos_para_float(stat.minutes))
-
-    ema_ponderada = calcular_media_multi_janela(valores_3, valores_10, media_temporada)
-
-    if valores_10:
-        media_10 = float(np.mean(valores_10))
-    else:
-        media_10 = media_temporada
-
-    if valores_minutos:
-        media_minutos = float(np.mean(valores_minutos))
-    else:
-        media_minutos = 0.0
-
-    if len(valores_3) >= 2:
-        eixo_x = np.arange(len(valores_3))
-        inclinacao = float(np.polyfit(eixo_x, np.array(valores_3), 1)[0])
-        variancia = float(np.std(valores_3))
-    else:
-        inclinacao = 0.0
-        variancia = 0.0
+    ema_ponderada = _combinar_janelas(features["ema_3"], features["ema_10"], media_temporada)
+    media_10 = features["media_10"]
+    media_minutos = features["media_minutos"]
+    inclinacao = features["inclinacao"]
+    variancia = features["variancia"]
 
     defesa_adversaria = _calcular_defesa_adversaria(db, opponent_team_id, season, stat_name, data_corte)
 
-    media_vs_adversario = _calcular_media_vs_adversario(historico, opponent_team_id, stat_name)
+    media_vs_adversario = features["media_vs_adversario"]
     if media_vs_adversario is None:
         media_vs_adversario = ema_ponderada
 
@@ -314,16 +191,13 @@ def _montar_vetor_previsao(db, player_id, opponent_team_id, season, stat_name, e
     else:
         agora = datetime.now(timezone.utc)
 
-    if historico:
-        data_ultimo = historico[-1][1].date_start
-        if data_ultimo is not None:
-            if data_ultimo.tzinfo is None:
-                data_ultimo = data_ultimo.replace(tzinfo=timezone.utc)
-            if agora.tzinfo is None:
-                agora = agora.replace(tzinfo=timezone.utc)
-            dias_descanso = min((agora - data_ultimo).days, 7)
-        else:
-            dias_descanso = 3
+    data_ultimo = features["data_ultimo_jogo"]
+    if data_ultimo is not None:
+        if data_ultimo.tzinfo is None:
+            data_ultimo = data_ultimo.replace(tzinfo=timezone.utc)
+        if agora.tzinfo is None:
+            agora = agora.replace(tzinfo=timezone.utc)
+        dias_descanso = min((agora - data_ultimo).days, 7)
     else:
         dias_descanso = 3
 
@@ -336,20 +210,46 @@ def _montar_vetor_previsao(db, player_id, opponent_team_id, season, stat_name, e
     return np.array([vetor])
 
 
-def prever_performance_jogador_ml(db, player_id, opponent_team_id, season, stat_name, em_casa, media_temporada, data_corte=None):
+def _obter_modelo_ou_treinar(db, player_id, season, stat_name, data_corte=None):
     from xgboost import XGBRegressor
 
-    modelo = modelo_service.carregar_modelo(player_id=player_id, stat_name=stat_name)
+    modelo = modelo_service.carregar_modelo(player_id=player_id, stat_name=stat_name, season=season)
+    if modelo is not None:
+        return modelo
 
-    if modelo is None:
-        lista_features, lista_alvos = extrair_features_avancadas_jogador(db, player_id, season, stat_name, data_corte)
-        if lista_features is None or len(lista_features) < 5:
-            logger.debug(f"Dados insuficientes para previsão: player_id={player_id}, stat={stat_name}")
-            return None
+    lista_features, lista_alvos = extrair_features_avancadas_jogador(db, player_id, season, stat_name, data_corte)
+    if lista_features is None or len(lista_features) < 5:
+        logger.debug(f"Dados insuficientes para previsão: player_id={player_id}, stat={stat_name}")
+        return None
+
+    modelo = XGBRegressor(n_estimators=150, max_depth=4, learning_rate=0.05, subsample=0.8, colsample_bytree=0.7, min_child_weight=5, gamma=0.1, reg_alpha=0.1, reg_lambda=2.0, random_state=42, objective="reg:squarederror", n_jobs=-1)
+    modelo.fit(np.array(lista_features), np.array(lista_alvos))
+    modelo_service.salvar_modelo(modelo, player_id, stat_name, season=season)
+    return modelo
 
-        modelo = XGBRegressor(n_estimators=150, max_depth=4, learning_rate=0.05, subsample=0.8, colsample_bytree=0.7, min_child_weight=5, gamma=0.1, reg_alpha=0.1, reg_lambda=2.0, random_state=42, objective="reg:squarederror", n_jobs=-1)
-        modelo.fit(np.array(lista_features), np.array(lista_alvos))
-        modelo_service.salvar_modelo(modelo, player_id, stat_name)
+
+def _montar_contexto_agrupado(db, player_id, season, stat_name, vetor, pos_normalizada, data_corte=None):
+    features = feature_store.consultar_features(db, player_id, season, stat_name, data_corte=data_corte)
+    total_jogos = 0
+    if features is not None:
+        total_jogos = features["total_jogos"]
+    return modelo_service.montar_contexto_agrupado(pos_normalizada, vetor[4], total_jogos)
+
+
+def _obter_modelo_agrupado(season, stat_name):
+    if not modelo_service.modo_agrupado_ativo():
+        return None
+    return modelo_service.carregar_modelo_agrupado(stat_name, season)
+
+
+def prever_performance_jogador_ml(db, player_id, opponent_team_id, season, stat_name, em_casa, media_temporada, data_corte=None):
+    modelo_agrupado = _obter_modelo_agrupado(season, stat_name)
+    if modelo_agrupado is not None:
+        modelo = modelo_agrupado
+    else:
+        modelo = _obter_modelo_ou_treinar(db, player_id, season, stat_name, data_corte)
+    if modelo is None:
+        return None
 
     vetor_previsao = _montar_vetor_previsao(db, player_id, opponent_team_id, season, stat_name, em_casa, media_temporada, data_corte)
 
@@ -357,10 +257,144 @@ def prever_performance_jogador_ml(db, player_id, opponent_team_id, season, stat_
         logger.debug(f"Previsão ignorada (abaixo do limiar): player_id={player_id}, stat={stat_name}")
         return None
 
+    if modelo_agrupado is not None:
+        pos_normalizada = _obter_posicao_jogador(db, player_id, season)
+        contexto = _montar_contexto_agrupado(db, player_id, season, stat_name, vetor_previsao[0], pos_normalizada, data_corte)
+        vetor_previsao = np.array([list(vetor_previsao[0]) + contexto])
+
     resultado = modelo.predict(vetor_previsao)[0]
     return round(float(resultado), 2)
 
 
+def _previsoes_vazias():
+    previsoes = {}
+    previsoes["points"] = None
+    previsoes["assists"] = None
+    previsoes["rebounds"] = None
+    previsoes["steals"] = None
+    previsoes["blocks"] = None
+    return previsoes
+
+
+def _montar_vetores_solicitacao(db, solicitacao, season, data_corte=None):
+    # a solicitacao pode trazer data_corte, posicao e medias ja calculadas
+    # (replay cronologico); senao sao consultadas no banco
+    player_id = solicitacao["player_id"]
+    data_corte = solicitacao.get("data_corte", data_corte)
+    if "pos_normalizada" in solicitacao:
+        pos_normalizada = solicitacao["pos_normalizada"]
+    else:
+        pos_normalizada = _obter_posicao_jogador(db, player_id, season)
+    medias_por_stat = solicitacao.get("medias_por_stat")
+    if medias_por_stat is None:
+        medias_por_stat = _calcular_medias_temporada_por_stat(db, player_id, season, data_corte)
+    stats_relevantes = _stats_relevantes_para_jogador(pos_normalizada, medias_por_stat)
+
+    agrupado = modelo_service.modo_agrupado_ativo()
+    vetores = []
+    for stat_name in stats_relevantes:
+        media_temporada = medias_por_stat.get(stat_name, 0.0)
+        vetor = _montar_vetor_previsao(db, player_id, solicitacao["opponent_team_id"], season, stat_name, solicitacao["is_home"], media_temporada, data_corte)
+        if vetor is None:
+            continue
+        contexto = None
+        if agrupado:
+            contexto = _montar_contexto_agrupado(db, player_id, season, stat_name, vetor[0], pos_normalizada, data_corte)
+        vetores.append((stat_name, vetor[0], contexto))
+    return vetores
+
+
+def _pontuar_stat_agrupado(modelo, stat_name, linhas, resultados):
+    chave = _traduzir_chave_stat(stat_name)
+    try:
+        matriz = np.array([list(vetor) + contexto for _, _, vetor, contexto, _ in linhas])
+        valores = modelo.predict(matriz)
+    except Exception as erro:
+        logger.error(f"Erro ao pontuar lote agrupado: stat={stat_name}: {erro}")
+        for linha in linhas:
+            resultados[linha[0]] = None
+        return 0
+
+    for posicao in range(len(linhas)):
+        indice = linhas[posicao][0]
+        if resultados[indice] is not None:
+            resultados[indice][chave] = round(float(valores[posicao]), 2)
+    return 1
+
+
+def _pontuar_stat(db, stat_name, linhas, season, resultados):
+    modelo_agrupado = _obter_modelo_agrupado(season, stat_name)
+    if modelo_agrupado is not None:
+        return _pontuar_stat_agrupado(modelo_agrupado, stat_name, linhas, resultados)
+
+    linhas_por_jogador = {}
+    for indice, player_id, vetor, _, corte_linha in linhas:
+        if player_id not in linhas_por_jogador:
+            linhas_por_jogador[player_id] = []
+        linhas_por_jogador[player_id].append((indice, vetor, corte_linha))
+
+    chave = _traduzir_chave_stat(stat_name)
+    total_chamadas = 0
+    for player_id in linhas_por_jogador:
+        linhas_jogador = linhas_por_jogador[player_id]
+        try:
+            # sem modelo salvo, tenta treinar a cada novo corte (linhas em ordem
+            # cronologica) ate haver historico suficiente, como no fluxo jogo a jogo
+            modelo = None
+            cortes_tentados = []
+            pontuaveis = []
+            for indice, vetor, corte_linha in linhas_jogador:
+                if modelo is None and corte_linha not in cortes_tentados:
+                    cortes_tentados.append(corte_linha)
+                    modelo = _obter_modelo_ou_treinar(db, player_id, season, stat_name, corte_linha)
+                if modelo is not None:
+                    pontuaveis.append((indice, vetor))
+            if not pontuaveis:
+                continue
+            matriz = np.array([vetor for _, vetor in pontuaveis])
+            valores = modelo.predict(matriz)
+            total_chamadas = total_chamadas + 1
+        except Exception as erro:
+            logger.error(f"Erro ao pontuar lote: player_id={player_id}, stat={stat_name}: {erro}")
+            for indice, _, _ in linhas_jogador:
+                resultados[indice] = None
+            continue
+
+        for posicao in range(len(pontuaveis)):
+            indice = pontuaveis[posicao][0]
+            if resultados[indice] is not None:
+                resultados[indice][chave] = round(float(valores[posicao]), 2)
+
+    return total_chamadas
+
+
+def prever_lote(db, solicitacoes, season, data_corte=None):
+    resultados = []
+    linhas_por_stat = {}
+
+    for indice in range(len(solicitacoes)):
+        solicitacao = solicitacoes[indice]
+        resultados.append(_previsoes_vazias())
+        try:
+            vetores = _montar_vetores_solicitacao(db, solicitacao, season, data_corte)
+        except Exception as erro:
+            logger.error(f"Erro ao montar features: player_id={solicitacao['player_id']}: {erro}")
+            resultados[indice] = None
+            continue
+
+        for stat_name, vetor, contexto in vetores:
+            if stat_name not in linhas_por_stat:
+                linhas_por_stat[stat_name] = []
+            linhas_por_stat[stat_name].append((indice, solicitacao["player_id"], vetor, contexto, solicitacao.get("data_corte", data_corte)))
+
+    total_chamadas = 0
+    for stat_name in linhas_por_stat:
+        total_chamadas = total_chamadas + _pontuar_stat(db, stat_name, linhas_por_stat[stat_name], season, resultados)
+
+    logger.info(f"Lote pontuado: solicitacoes={len(solicitacoes)}, stats={len(linhas_por_stat)}, chamadas_predict={total_chamadas}")
+    return resultados
+
+
 def prever_multiplas_stats_jogador(db, player_id, opponent_team_id, season, is_home, data_corte=None):
     pos_normalizada = _obter_posicao_jogador(db, player_id, season)
     medias_por_stat = _calcular_medias_temporada_por_stat(db, player_id, season, data_corte)
@@ -369,20 +403,12 @@ def prever_multiplas_stats_jogador(db, player_id, opponent_team_id, season, is_h
     if not stats_relevantes:
         logger.debug(f"Nenhuma stat relevante: player_id={player_id}, pos={pos_normalizada}")
 
-    previsoes = {}
-    previsoes["points"] = None
-    previsoes["assists"] = None
-    previsoes["rebounds"] = None
-    previsoes["steals"] = None
-    previsoes["blocks"] = None
+    previsoes = _previsoes_vazias()
 
     for stat_name in stats_relevantes:
         media_temporada = medias_por_stat.get(stat_name, 0.0)
         previsao = prever_performance_jogador_ml(db=db, player_id=player_id, opponent_team_id=opponent_team_id, season=season, stat_name=stat_name, em_casa=is_home, media_temporada=media_temporada, data_corte=data_corte)
-        if stat_name == "tot_reb":
-            previsoes["rebounds"] = previsao
-        else:
-            previsoes[stat_name] = previsao
+        previsoes[_traduzir_chave_stat(stat_name)] = previsao
 
     return previsoes
 
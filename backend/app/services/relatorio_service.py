@@ -206,7 +206,7 @@ def _tabela_stats(c, x, y, largura, dados_stats, dados_anteriores=None):
     altura_total = altura_header + len(nomes_stats) * altura_linha
     return altura_total
 
-def gerar_relatorio_treinamento(season, total_registros_db, total_jogadores_treino, total_modelos_salvos, total_erros, dados_win_rate, dados_win_rate_anterior=None):
+def gerar_relatorio_treinamento(season, total_registros_db, total_jogadores_treino, total_modelos_salvos, total_erros, dados_win_rate, dados_win_rate_anterior=None, resumo_unidades=None):
     from reportlab.pdfgen import canvas
     from reportlab.lib.pagesizes import A4
     from reportlab.lib.colors import Color
@@ -255,6 +255,18 @@ def gerar_relatorio_treinamento(season, total_registros_db, total_jogadores_trei
             cor = VERMELHO
         _bloco_metrica(c, bx, y, larg_bloco, 76, blocos[i][0], blocos[i][1], blocos[i][2], cor)
 
+    if resumo_unidades is not None:
+        y = y - 86
+        larg_unidade = (area_util - 10) / 3
+        blocos_unidades = [
+            ("Unidades Puladas", str(resumo_unidades.get("pulados", 0)), "dados sem alteracao"),
+            ("Unidades Retreinadas", str(resumo_unidades.get("retreinados", 0)), "dados novos desde o ultimo treino"),
+            ("Unidades Novas", str(resumo_unidades.get("novos", 0)), "primeiro modelo do jogador/stat"),
+        ]
+        for i in range(len(blocos_unidades)):
+            bx = margem + i * (larg_unidade + 5)
+            _bloco_metrica(c, bx, y, larg_unidade, 76, blocos_unidades[i][0], blocos_unidades[i][1], blocos_unidades[i][2])
+
     y = y - 36
     _linha_divisoria(c, margem, y, area_util)
 
@@ -343,7 +355,7 @@ def gerar_relatorio_treinamento(season, total_registros_db, total_jogadores_trei
     logger.warning(f"Relatorio gerado: {caminho_pdf}")
     return caminho_pdf
 
-def gerar_e_salvar_relatorio(db, season, total_registros_db, total_jogadores_treino, total_modelos_salvos, total_erros):
+def gerar_e_salvar_relatorio(db, season, total_registros_db, total_jogadores_treino, total_modelos_salvos, total_erros, resumo_unidades=None):
     from app.services.win_rate_service import calcular_win_rate
 
     dados_win_rate_anterior = carregar_metadados_anterior()
@@ -354,7 +366,7 @@ def gerar_e_salvar_relatorio(db, season, total_registros_db, total_jogadores_tre
     except Exception as erro:
         logger.warning(f"Falha ao calcular win_rate para relatorio: {erro}")
 
-    caminho_pdf = gerar_relatorio_treinamento(season=season, total_registros_db=total_registros_db, total_jogadores_treino=total_jogadores_treino, total_modelos_salvos=total_modelos_salvos, total_erros=total_erros, dados_win_rate=dados_win_rate, dados_win_rate_anterior=dados_win_rate_anterior)
+    caminho_pdf = gerar_relatorio_treinamento(season=season, total_registros_db=total_registros_db, total_jogadores_treino=total_jogadores_treino, total_modelos_salvos=total_modelos_salvos, total_erros=total_erros, dados_win_rate=dados_win_rate, dados_win_rate_anterior=dados_win_rate_anterior, resumo_unidades=resumo_unidades)
 
     if dados_win_rate is not None:
         metadados = {}
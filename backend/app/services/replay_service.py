@@ -0,0 +1,190 @@
+import logging
+import time
+
+from app.config import config
+from app.db.models import Game, PlayerGameStats, PlayerTeamSeason, Prediction
+from app.services import feature_store
+from app.services.feature_store import _para_timestamp
+from app.services.manager_service import _buscar_jogadores_do_time, _gravar_predicoes
+from app.services.prediction_service import prever_lote
+
+logger = logging.getLogger(__name__)
+
+
+def _carregar_jogos(db, season):
+    return db.query(Game).filter(Game.season == season, Game.status_short == 3, Game.stage != 1).order_by(Game.date_start.asc()).all()
+
+
+def _carregar_minutos_temporada(db, season):
+    # mesmas linhas que _buscar_jogadores_titulares enxerga: todas as stats da
+    # temporada, sem filtro de status/stage, ordenadas pela data do jogo
+    registros = db.query(PlayerGameStats.player_id, PlayerGameStats.team_id, PlayerGameStats.seconds_played, Game.date_start).join(Game, PlayerGameStats.game_id == Game.id).filter(PlayerGameStats.season == season).order_by(Game.date_start.asc(), PlayerGameStats.game_id.asc(), PlayerGameStats.player_id.asc()).all()
+
+    linhas = []
+    for registro in registros:
+        linhas.append((_para_timestamp(registro.date_start), registro.team_id, registro.player_id, registro.seconds_played or 0))
+    return linhas
+
+
+def _carregar_posicoes(db, season):
+    registros = db.query(PlayerTeamSeason.player_id, PlayerTeamSeason.pos).filter(PlayerTeamSeason.season == season).order_by(PlayerTeamSeason.id.asc()).all()
+    posicoes = {}
+    for registro in registros:
+        if registro.player_id in posicoes:
+            continue
+        if registro.pos:
+            posicoes[registro.player_id] = registro.pos.split("-")[0]
+        else:
+            posicoes[registro.player_id] = None
+    return posicoes
+
+
+def _jogos_com_predicao(db, season):
+    registros = db.query(Prediction.game_id).filter(Prediction.season == season).distinct().all()
+    existentes = set()
+    for registro in registros:
+        existentes.add(registro.game_id)
+    return existentes
+
+
+def _avancar_minutos(estado, linhas_minutos, corte):
+    # acumula no estado dos times os segundos jogados antes do tip-off
+    posicao = estado["posicao"]
+    while posicao < len(linhas_minutos) and linhas_minutos[posicao][0] < corte:
+        _, team_id, player_id, segundos = linhas_minutos[posicao]
+        if team_id not in estado["minutos_por_time"]:
+            estado["minutos_por_time"][team_id] = {}
+        acumulado = estado["minutos_por_time"][team_id]
+        if player_id not in acumulado:
+            acumulado[player_id] = [0, 0]
+        acumulado[player_id][0] = acumulado[player_id][0] + segundos
+        acumulado[player_id][1] = acumulado[player_id][1] + 1
+        posicao = posicao + 1
+    estado["posicao"] = posicao
+
+
+def _titulares_do_estado(db, estado, team_id, season):
+    limiar_segundos = config.MIN_MINUTOS_PALPITE * 60
+    acumulado = estado["minutos_por_time"].get(team_id, {})
+    titulares = []
+    for player_id in acumulado:
+        soma, contagem = acumulado[player_id]
+        if contagem > 0 and soma / contagem >= limiar_segundos:
+            titulares.append(player_id)
+    if titulares:
+        return titulares
+
+    if team_id not in estado["elencos"]:
+        estado["elencos"][team_id] = _buscar_jogadores_do_time(db=db, team_id=team_id, season=season)
+    return estado["elencos"][team_id]
+
+
+def _medias_do_store(store, player_id, data_corte):
+    medias = {}
+    for stat_name in feature_store.STATS_FEATURE_STORE:
+        features = feature_store.consultar_features_jogador(store, player_id, stat_name, data_corte=data_corte)
+        if features is None:
+            medias[stat_name] = 0.0
+        else:
+            medias[stat_name] = round(features["media_temporada"], 2)
+    return medias
+
+
+def _solicitacoes_do_jogo(db, estado, store, posicoes, jogo, season):
+    lados = []
+    lados.append((_titulares_do_estado(db, estado, jogo.home_team_id, season), jogo.home_team_id, jogo.away_team_id, 1))
+    lados.append((_titulares_do_estado(db, estado, jogo.away_team_id, season), jogo.away_team_id, jogo.home_team_id, 0))
+
+    solicitacoes = []
+    incluidos = set()
+    for jogadores, team_id, opponent_team_id, is_home in lados:
+        for player_id in jogadores:
+            if player_id in incluidos:
+                continue
+            incluidos.add(player_id)
+            solicitacao = {}
+            solicitacao["player_id"] = player_id
+            solicitacao["game_id"] = jogo.id
+            solicitacao["team_id"] = team_id
+            solicitacao["opponent_team_id"] = opponent_team_id
+            solicitacao["is_home"] = is_home
+            solicitacao["data_corte"] = jogo.date_start
+            solicitacao["pos_normalizada"] = posicoes.get(player_id)
+            solicitacao["medias_por_stat"] = _medias_do_store(store, player_id, jogo.date_start)
+            solicitacoes.append(solicitacao)
+    return solicitacoes
+
+
+def _pontuar(db, solicitacoes, season, acumulado):
+    if not solicitacoes:
+        return
+    resultados = prever_lote(db=db, solicitacoes=solicitacoes, season=season)
+    acumulado["solicitacoes"].extend(solicitacoes)
+    acumulado["resultados"].extend(resultados)
+
+
+def _gravar_acumulado(db, acumulado, season):
+    # varios lotes de jogos numa gravacao so: volume retroativo chega ao limiar do COPY
+    if not acumulado["solicitacoes"]:
+        return 0, 0
+    resumo = _gravar_predicoes(db=db, solicitacoes=acumulado["solicitacoes"], resultados=acumulado["resultados"], season=season)
+    db.commit()
+    acumulado["solicitacoes"] = []
+    acumulado["resultados"] = []
+    return resumo["inseridas"], resumo["erros"]
+
+
+def reproduzir_temporada(db, season, jogos_por_lote=None):
+    if jogos_por_lote is None:
+        jogos_por_lote = config.REPLAY_JOGOS_POR_LOTE
+
+    inicio = time.monotonic()
+    jogos = _carregar_jogos(db, season)
+    if not jogos:
+        logger.warning(f"Nenhum jogo finalizado encontrado: temporada={season}")
+        return 0
+
+    linhas_minutos = _carregar_minutos_temporada(db, season)
+    posicoes = _carregar_posicoes(db, season)
+    ja_preditos = _jogos_com_predicao(db, season)
+    store = feature_store.obter_feature_store(db, season)
+
+    estado = {}
+    estado["posicao"] = 0
+    estado["minutos_por_time"] = {}
+    estado["elencos"] = {}
+
+    total_geradas = 0
+    total_erros = 0
+    contador = 0
+    pendentes = []
+    jogos_no_lote = 0
+    acumulado = {"solicitacoes": [], "resultados": []}
+
+    for jogo in jogos:
+        _avancar_minutos(estado, linhas_minutos, _para_timestamp(jogo.date_start))
+        if jogo.id in ja_preditos:
+            continue
+
+        pendentes.extend(_solicitacoes_do_jogo(db, estado, store, posicoes, jogo, season))
+        contador = contador + 1
+        jogos_no_lote = jogos_no_lote + 1
+
+        if jogos_no_lote >= jogos_por_lote:
+            _pontuar(db, pendentes, season, acumulado)
+            pendentes = []
+            jogos_no_lote = 0
+            if len(acumulado["solicitacoes"]) >= config.PREDICOES_LIMIAR_COPY:
+                geradas, erros = _gravar_acumulado(db, acumulado, season)
+                total_geradas = total_geradas + geradas
+                total_erros = total_erros + erros
+                logger.warning(f"Progresso retroativo: jogos={contador}, predicoes={total_geradas}, erros={total_erros}, temporada={season}")
+
+    _pontuar(db, pendentes, season, acumulado)
+    geradas, erros = _gravar_acumulado(db, acumulado, season)
+    total_geradas = total_geradas + geradas
+    total_erros = total_erros + erros
+
+    duracao = round(time.monotonic() - inicio, 2)
+    logger.warning(f"Predicoes retroativas concluidas: total={total_geradas}, erros={total_erros}, jogos={contador}, duracao={duracao}s, temporada={season}")
+    return total_geradas
@@ -0,0 +1,207 @@
+import os
+import json
+import shutil
+import logging
+import threading
+import numpy as np
+
+from datetime import datetime, timezone
+from sqlalchemy import func
+
+from app.config import config
+from app.db.models import Game, PlayerGameStats
+from app.services.feature_store import _para_timestamp
+
+logger = logging.getLogger(__name__)
+
+# snapshot colunar de uma temporada: um .npy por coluna + meta.json.
+# leitura com np.load(mmap_mode="r"): as colunas e as fatias por jogador sao
+# views do arquivo, sem copia nem objetos ORM
+VERSAO_FORMATO = 1
+NOME_META = "meta.json"
+STATS_SNAPSHOT = ["points", "assists", "tot_reb", "steals", "blocks"]
+COLUNAS_INTEIRAS = ["player_id", "game_id", "team_id", "opponent_team_id"]
+
+_trava = threading.Lock()
+
+
+def _pasta_snapshot(season):
+    return os.path.join(config.PASTA_SNAPSHOTS, f"temporada_{season}")
+
+
+def _filtros_temporada(season):
+    return [Game.season == season, Game.status_short == 3, Game.stage != 1]
+
+
+def _versao_dados_atual(season):
+    from app.services.cache_predicoes import versao_dados
+    return versao_dados(season)[0]
+
+
+def _assinatura_banco(db, season):
+    registro = db.query(func.count(PlayerGameStats.player_id), func.max(Game.date_start), func.sum(PlayerGameStats.seconds_played)).join(Game, PlayerGameStats.game_id == Game.id).filter(*_filtros_temporada(season)).one()
+    total, ultima_data, soma_segundos = registro
+    return [int(total or 0), _para_timestamp(ultima_data), int(soma_segundos or 0)]
+
+
+def _ler_meta(season):
+    caminho = os.path.join(_pasta_snapshot(season), NOME_META)
+    if not os.path.exists(caminho):
+        return None
+    try:
+        with open(caminho, "r", encoding="utf-8") as arquivo:
+            return json.load(arquivo)
+    except Exception as erro:
+        logger.warning(f"Falha ao ler meta do snapshot: temporada={season}: {erro}")
+        return None
+
+
+def snapshot_desatualizado(db, season, meta=None):
+    if meta is None:
+        meta = _ler_meta(season)
+    if meta is None or meta.get("versao_formato") != VERSAO_FORMATO:
+        return True
+    # com versao de dados publicada pelo ETL nao e preciso consultar o banco
+    versao = _versao_dados_atual(season)
+    if versao is not None:
+        return meta.get("versao_dados") != versao
+    return meta.get("assinatura") != _assinatura_banco(db, season)
+
+
+def _novas_listas():
+    listas = {}
+    for nome in COLUNAS_INTEIRAS + ["is_home", "timestamps", "seconds_played"] + STATS_SNAPSHOT:
+        listas[nome] = []
+    return listas
+
+
+def _listas_para_arrays(listas):
+    arrays = {}
+    for nome in COLUNAS_INTEIRAS:
+        arrays[nome] = np.array(listas[nome], dtype=np.int64)
+    arrays["is_home"] = np.array(listas["is_home"], dtype=np.int8)
+    arrays["timestamps"] = np.array(listas["timestamps"], dtype=np.float64)
+    arrays["seconds_played"] = np.array(listas["seconds_played"], dtype=np.int32)
+    for stat_name in STATS_SNAPSHOT:
+        arrays[stat_name] = np.array(listas[stat_name], dtype=np.float64)
+    return arrays
+
+
+def _consultar_colunas(db, season):
+    # cursor do servidor (yield_per): cada bloco de linhas vira arrays tipados antes
+    # do proximo, entao so um bloco existe como objetos Python por vez
+    adversario = func.coalesce(func.nullif(Game.home_team_id, PlayerGameStats.team_id), Game.away_team_id)
+    colunas = [PlayerGameStats.player_id, PlayerGameStats.game_id, PlayerGameStats.team_id, adversario.label("opponent_team_id"), Game.home_team_id, Game.date_start, PlayerGameStats.seconds_played]
+    for stat_name in STATS_SNAPSHOT:
+        colunas.append(getattr(PlayerGameStats, stat_name))
+
+    tamanho_bloco = config.SNAPSHOT_LINHAS_POR_BLOCO
+    query = db.query(*colunas).join(Game, PlayerGameStats.game_id == Game.id).filter(*_filtros_temporada(season))
+    registros = query.order_by(PlayerGameStats.player_id.asc(), Game.date_start.asc(), PlayerGameStats.game_id.asc()).execution_options(stream_results=True).yield_per(tamanho_bloco)
+
+    blocos = []
+    listas = _novas_listas()
+    for registro in registros:
+        listas["player_id"].append(registro.player_id)
+        listas["game_id"].append(registro.game_id)
+        listas["team_id"].append(registro.team_id)
+        listas["opponent_team_id"].append(registro.opponent_team_id)
+        listas["is_home"].append(1 if registro.home_team_id == registro.team_id else 0)
+        timestamp = _para_timestamp(registro.date_start)
+        listas["timestamps"].append(np.nan if timestamp is None else timestamp)
+        listas["seconds_played"].append(registro.seconds_played or 0)
+        for stat_name in STATS_SNAPSHOT:
+            listas[stat_name].append(getattr(registro, stat_name) or 0)
+        if len(listas["player_id"]) >= tamanho_bloco:
+            blocos.append(_listas_para_arrays(listas))
+            listas = _novas_listas()
+    blocos.append(_listas_para_arrays(listas))
+
+    colunas_numpy = {}
+    for nome in blocos[0]:
+        colunas_numpy[nome] = np.concatenate([bloco[nome] for bloco in blocos])
+    return colunas_numpy
+
+
+def exportar_snapshot(db, season):
+    pasta = _pasta_snapshot(season)
+    versao = _versao_dados_atual(season)
+    assinatura = _assinatura_banco(db, season)
+    colunas = _consultar_colunas(db, season)
+
+    pasta_temporaria = pasta + ".tmp"
+    shutil.rmtree(pasta_temporaria, ignore_errors=True)
+    os.makedirs(pasta_temporaria)
+    for nome in colunas:
+        np.save(os.path.join(pasta_temporaria, f"{nome}.npy"), colunas[nome])
+
+    meta = {}
+    meta["versao_formato"] = VERSAO_FORMATO
+    meta["temporada"] = season
+    meta["linhas"] = len(colunas["player_id"])
+    meta["colunas"] = sorted(colunas)
+    meta["versao_dados"] = versao
+    meta["assinatura"] = assinatura
+    meta["gerado_em"] = datetime.now(timezone.utc).isoformat()
+    with open(os.path.join(pasta_temporaria, NOME_META), "w", encoding="utf-8") as arquivo:
+        json.dump(meta, arquivo)
+
+    # troca de diretorio: leitores com mmap aberto continuam no inode antigo
+    pasta_antiga = pasta + ".old"
+    shutil.rmtree(pasta_antiga, ignore_errors=True)
+    if os.path.exists(pasta):
+        os.replace(pasta, pasta_antiga)
+    os.replace(pasta_temporaria, pasta)
+    shutil.rmtree(pasta_antiga, ignore_errors=True)
+
+    logger.warning(f"Snapshot exportado: temporada={season}, linhas={meta['linhas']}")
+    return meta
+
+
+def carregar_snapshot(season):
+    meta = _ler_meta(season)
+    if meta is None:
+        return None
+    pasta = _pasta_snapshot(season)
+    snapshot = {}
+    snapshot["meta"] = meta
+    snapshot["colunas"] = {}
+    for nome in meta["colunas"]:
+        snapshot["colunas"][nome] = np.load(os.path.join(pasta, f"{nome}.npy"), mmap_mode="r")
+    return snapshot
+
+
+def obter_snapshot(db, season, forcar=False):
+    with _trava:
+        meta = _ler_meta(season)
+        if forcar or snapshot_desatualizado(db, season, meta):
+            exportar_snapshot(db, season)
+        return carregar_snapshot(season)
+
+
+def fatias_por_jogador(snapshot):
+    # linhas ordenadas por jogador: cada jogador e um intervalo contiguo
+    player_ids = snapshot["colunas"]["player_id"]
+    if len(player_ids) == 0:
+        return {}
+    inicios = np.concatenate(([0], np.flatnonzero(np.diff(player_ids)) + 1))
+    fins = np.concatenate((inicios[1:], [len(player_ids)]))
+    fatias = {}
+    for posicao in range(len(inicios)):
+        fatias[int(player_ids[inicios[posicao]])] = slice(int(inicios[posicao]), int(fins[posicao]))
+    return fatias
+
+
+def dados_por_jogador(snapshot):
+    colunas = snapshot["colunas"]
+    fatias = fatias_por_jogador(snapshot)
+    dados = {}
+    for player_id in fatias:
+        fatia = fatias[player_id]
+        jogos = {}
+        jogos["timestamps"] = colunas["timestamps"][fatia]
+        jogos["minutes"] = colunas["seconds_played"][fatia] / 60.0
+        for stat_name in STATS_SNAPSHOT:
+            jogos[stat_name] = colunas[stat_name][fatia]
+        dados[player_id] = jogos
+    return dados
@@ -2,21 +2,15 @@ import logging
 import math
 
 from app.db.models import Game, PlayerGameStats, Prediction
+from app.etl.func_normalize import _segundos_do_registro
 from app.services.formatar_palpites import verificar_acerto_linha
 
 logger = logging.getLogger(__name__)
 
 def _jogador_teve_minutos(stat_real):
-    minutos = stat_real.minutes
-    if not minutos:
+    segundos = _segundos_do_registro(stat_real)
+    if not segundos:
         return False
-    minutos_limpo = str(minutos).strip()
-    if minutos_limpo in ("", "0:00", "00:00"):
-        return False
-    if ":" in minutos_limpo:
-        partes = minutos_limpo.split(":")
-        if int(partes[0]) == 0 and int(partes[1]) == 0:
-            return False
     return True
 
 def _calcular_win_rate_stat(predicoes_reais, campo_predicao, campo_real):
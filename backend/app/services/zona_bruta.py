@@ -0,0 +1,120 @@
+import os
+import gzip
+import json
+import logging
+import threading
+from datetime import datetime, timezone
+
+from app.config import config
+
+logger = logging.getLogger(__name__)
+
+# zona bruta: toda resposta da API-Sports anexada como uma linha JSON em
+# <pasta>/<endpoint>/data=AAAA-MM-DD/parte-<pid>.jsonl.gz. cada anexo e um membro
+# gzip novo, entao o arquivo so cresce e continua legivel por gzip.open.
+# no modo replay as cargas leem daqui e nao tocam a rede
+PREFIXO_PARTICAO = "data="
+
+_trava = threading.Lock()
+_indice_replay = {}
+_contadores = {"gravadas": 0, "lidas": 0, "ausentes": 0}
+
+
+def zona_bruta_ativa():
+    return config.ZONA_BRUTA_ATIVA
+
+
+def modo_replay_ativo():
+    return config.ETL_MODO_REPLAY
+
+
+def ativar_modo_replay(ativo=True):
+    config.ETL_MODO_REPLAY = ativo
+    with _trava:
+        _indice_replay.clear()
+
+
+def _pasta_endpoint(endpoint):
+    return os.path.join(config.PASTA_ZONA_BRUTA, endpoint.replace("/", "__"))
+
+
+def _chave(endpoint, params):
+    return json.dumps({"endpoint": endpoint, "params": params or {}}, sort_keys=True, default=str)
+
+
+def registrar_resposta(endpoint, params, resposta):
+    if not zona_bruta_ativa() or modo_replay_ativo() or resposta is None:
+        return
+    agora = datetime.now(timezone.utc)
+    registro = {"endpoint": endpoint, "params": params or {}, "recebido_em": agora.isoformat(), "response": resposta}
+    pasta = os.path.join(_pasta_endpoint(endpoint), f"{PREFIXO_PARTICAO}{agora.strftime('%Y-%m-%d')}")
+    caminho = os.path.join(pasta, f"parte-{os.getpid()}.jsonl.gz")
+    linha = json.dumps(registro, default=str) + "\n"
+    try:
+        with _trava:
+            if not os.path.exists(pasta):
+                os.makedirs(pasta, exist_ok=True)
+            with gzip.open(caminho, "at", encoding="utf-8") as arquivo:
+                arquivo.write(linha)
+            _contadores["gravadas"] = _contadores["gravadas"] + 1
+    except Exception as erro:
+        logger.warning(f"Falha ao gravar zona bruta em '{endpoint}': {erro}")
+
+
+def _arquivos_endpoint(endpoint):
+    pasta = _pasta_endpoint(endpoint)
+    if not os.path.exists(pasta):
+        return []
+    arquivos = []
+    for particao in sorted(os.listdir(pasta)):
+        if not particao.startswith(PREFIXO_PARTICAO):
+            continue
+        pasta_particao = os.path.join(pasta, particao)
+        for nome in sorted(os.listdir(pasta_particao)):
+            if nome.endswith(".jsonl.gz"):
+                arquivos.append(os.path.join(pasta_particao, nome))
+    return arquivos
+
+
+def _indexar_endpoint(endpoint):
+    # chave -> (recebido_em, linha crua); a linha so e decodificada quando pedida.
+    # a mesma chave pode aparecer varias vezes: vale a resposta mais recente
+    indice = {}
+    for caminho in _arquivos_endpoint(endpoint):
+        try:
+            with gzip.open(caminho, "rt", encoding="utf-8") as arquivo:
+                for linha in arquivo:
+                    if not linha.strip():
+                        continue
+                    registro = json.loads(linha)
+                    chave = _chave(registro["endpoint"], registro["params"])
+                    anterior = indice.get(chave)
+                    if anterior is None or registro["recebido_em"] >= anterior[0]:
+                        indice[chave] = (registro["recebido_em"], linha)
+        except Exception as erro:
+            # membro final truncado (processo morto no meio da escrita): fica o que foi lido
+            logger.warning(f"Zona bruta ilegivel em {caminho}: {erro}")
+    logger.warning(f"Zona bruta indexada: endpoint={endpoint}, respostas={len(indice)}")
+    return indice
+
+
+def ler_resposta(endpoint, params=None):
+    with _trava:
+        if endpoint not in _indice_replay:
+            _indice_replay[endpoint] = _indexar_endpoint(endpoint)
+        entrada = _indice_replay[endpoint].get(_chave(endpoint, params))
+        if entrada is None:
+            _contadores["ausentes"] = _contadores["ausentes"] + 1
+            logger.warning(f"Replay sem resposta na zona bruta: '{endpoint}' params={params}")
+            return None
+        _contadores["lidas"] = _contadores["lidas"] + 1
+    return json.loads(entrada[1])["response"]
+
+
+def estatisticas_zona_bruta():
+    with _trava:
+        resultado = dict(_contadores)
+        resultado["ativa"] = zona_bruta_ativa()
+        resultado["modo_replay"] = modo_replay_ativo()
+        resultado["endpoints_indexados"] = len(_indice_replay)
+        return resultado
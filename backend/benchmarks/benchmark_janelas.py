@@ -0,0 +1,118 @@
+import sys
+import time
+import argparse
+import numpy as np
+
+from app.services import janelas_moveis
+from app.services.modelo_service import _extrair_features_em_memoria
+
+JOGOS_POR_TEMPORADA = 82
+
+
+def _extrair_features_em_laco(jogos_jogador, stat_name):
+    # implementacao jogo a jogo anterior aos kernels, mantida so como referencia
+    lista_features = []
+    lista_alvos = []
+    for idx in range(5, len(jogos_jogador)):
+        valores_10 = [j[stat_name] for j in jogos_jogador[max(0, idx - 10):idx]]
+        valores_3 = [j[stat_name] for j in jogos_jogador[max(0, idx - 3):idx]]
+        valores_minutos = [j["minutes"] for j in jogos_jogador[max(0, idx - 10):idx]]
+        todos_anteriores = [j[stat_name] for j in jogos_jogador[:idx]]
+
+        media_temporada = sum(todos_anteriores) / len(todos_anteriores)
+        media_10 = sum(valores_10) / len(valores_10)
+        media_minutos = sum(valores_minutos) / len(valores_minutos)
+
+        soma_ponderada_3 = 0.0
+        for i in range(len(valores_3)):
+            soma_ponderada_3 = soma_ponderada_3 + valores_3[i] * (i + 1)
+        ema_3 = soma_ponderada_3 / (len(valores_3) * (len(valores_3) + 1) / 2.0)
+
+        soma_ponderada_10 = 0.0
+        for i in range(len(valores_10)):
+            soma_ponderada_10 = soma_ponderada_10 + valores_10[i] * (i + 1)
+        ema_10 = soma_ponderada_10 / (len(valores_10) * (len(valores_10) + 1) / 2.0)
+
+        ema_ponderada = (ema_3 * 0.40) + (ema_10 * 0.35) + (media_temporada * 0.25)
+        inclinacao = float(np.polyfit(np.arange(len(valores_3)), np.array(valores_3), 1)[0])
+        variancia = float(np.std(valores_3))
+
+        lista_features.append([ema_ponderada, 0, 0, 3, media_minutos, inclinacao, ema_ponderada, variancia, 0, media_temporada, media_10])
+        lista_alvos.append(jogos_jogador[idx][stat_name])
+    return lista_features, lista_alvos
+
+
+def _gerar_temporada(rng, total_jogos):
+    jogos = []
+    for _ in range(total_jogos):
+        jogo = {}
+        jogo["points"] = float(rng.integers(0, 40))
+        jogo["minutes"] = float(rng.uniform(10, 40))
+        jogos.append(jogo)
+    return jogos
+
+
+def _para_colunas(jogos):
+    # formato do snapshot colunar consumido pelo treino
+    colunas = {}
+    colunas["points"] = np.array([j["points"] for j in jogos])
+    colunas["minutes"] = np.array([j["minutes"] for j in jogos])
+    return colunas
+
+
+def _medir(funcao, temporadas, repeticoes):
+    melhor = None
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        for jogos in temporadas:
+            funcao(jogos, "points")
+        duracao = time.perf_counter() - inicio
+        if melhor is None or duracao < melhor:
+            melhor = duracao
+    return melhor / len(temporadas)
+
+
+def executar(total_temporadas=200, repeticoes=3, total_jogos=JOGOS_POR_TEMPORADA):
+    rng = np.random.default_rng(42)
+    temporadas = [_gerar_temporada(rng, total_jogos) for _ in range(total_temporadas)]
+
+    temporadas_colunas = [_para_colunas(jogos) for jogos in temporadas]
+
+    referencia, _ = _extrair_features_em_laco(temporadas[0], "points")
+    vetorizado, _ = _extrair_features_em_memoria(temporadas_colunas[0], "points")
+    diferenca = float(np.max(np.abs(np.array(referencia) - np.array(vetorizado))))
+
+    tempo_laco = _medir(_extrair_features_em_laco, temporadas, repeticoes)
+    tempo_kernels = _medir(_extrair_features_em_memoria, temporadas_colunas, repeticoes)
+
+    valores = np.array([j["points"] for j in temporadas[0]])
+    inicio = time.perf_counter()
+    for _ in range(1000):
+        janelas_moveis.calcular_janelas(valores, valores)
+    tempo_janelas = (time.perf_counter() - inicio) / 1000
+
+    resultado = {}
+    resultado["jogos_por_temporada"] = total_jogos
+    resultado["laco_ms"] = round(tempo_laco * 1000, 3)
+    resultado["kernels_ms"] = round(tempo_kernels * 1000, 3)
+    resultado["calcular_janelas_ms"] = round(tempo_janelas * 1000, 3)
+    resultado["aceleracao"] = round(tempo_laco / tempo_kernels, 1)
+    resultado["diferenca_maxima"] = diferenca
+    return resultado
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Microbenchmark dos kernels de janela movel (uma temporada por jogador)")
+    parser.add_argument("--temporadas", type=int, default=200)
+    parser.add_argument("--repeticoes", type=int, default=3)
+    parser.add_argument("--jogos", type=int, default=JOGOS_POR_TEMPORADA)
+    args = parser.parse_args()
+
+    resultado = executar(total_temporadas=args.temporadas, repeticoes=args.repeticoes, total_jogos=args.jogos)
+    for chave in resultado:
+        print(f"{chave}: {resultado[chave]}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,328 @@
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import tempfile
+import subprocess
+import numpy as np
+
+from datetime import datetime, timedelta, timezone
+
+# temporada sintetica fora do intervalo real: os ids derivam dela e nao colidem
+# com dados carregados pelo ETL quando o banco e um Postgres de testes
+TEMPORADA_SINTETICA = 2090
+TOTAL_TIMES = 30
+JOGADORES_POR_TIME = 13
+JOGOS_POR_TIME = 82
+TIMES_PLAYOFFS = 16
+JOGOS_HOJE = 8
+STAGE_TEMPORADA_REGULAR = 2
+STAGE_PLAYOFFS = 3
+STATUS_AGENDADO = 1
+STATUS_FINALIZADO = 3
+VITORIAS_SERIE = 4
+POSICOES = ["PG", "SG", "SF", "PF", "C"]
+ETAPAS = ["features", "treino", "rodada", "replay"]
+# minutos medios por posicao na rotacao: titulares, banco e fim de banco
+MINUTOS_ROTACAO = [34, 33, 32, 31, 29, 26, 23, 20, 16, 12, 9, 7, 5]
+TAMANHO_LOTE_INSERT = 5000
+
+
+def _id_time(season, indice):
+    return season * 100 + indice + 1
+
+
+def _id_jogador(season, indice):
+    return season * 10000 + indice + 1
+
+
+def _perfil_jogador(rng, posicao_rotacao, pos):
+    perfil = {}
+    perfil["minutos"] = MINUTOS_ROTACAO[min(posicao_rotacao, len(MINUTOS_ROTACAO) - 1)]
+    perfil["prob_ausencia"] = 0.04 if posicao_rotacao < 9 else 0.30
+    # taxas por minuto; armadores distribuem mais, pivos pegam mais rebotes
+    perfil["points"] = rng.uniform(0.35, 0.80)
+    perfil["assists"] = rng.uniform(0.12, 0.30) if pos in ("PG", "SG") else rng.uniform(0.03, 0.12)
+    perfil["tot_reb"] = rng.uniform(0.25, 0.40) if pos in ("PF", "C") else rng.uniform(0.08, 0.20)
+    perfil["steals"] = rng.uniform(0.02, 0.05)
+    perfil["blocks"] = rng.uniform(0.03, 0.08) if pos == "C" else rng.uniform(0.005, 0.03)
+    return perfil
+
+
+def _calendario_regular(rng, times, jogos_por_time):
+    # a cada dia cerca de metade dos times joga, o que gera back-to-backs e folgas
+    restantes = {}
+    for team_id in times:
+        restantes[team_id] = jogos_por_time
+    dias = []
+    while True:
+        disponiveis = [team_id for team_id in times if restantes[team_id] > 0]
+        if len(disponiveis) < 2:
+            break
+        rng.shuffle(disponiveis)
+        jogos_dia = []
+        for indice in range(0, len(disponiveis) - 1, 2):
+            if rng.random() < 0.5:
+                continue
+            jogos_dia.append((disponiveis[indice], disponiveis[indice + 1]))
+            restantes[disponiveis[indice]] = restantes[disponiveis[indice]] - 1
+            restantes[disponiveis[indice + 1]] = restantes[disponiveis[indice + 1]] - 1
+        dias.append(jogos_dia)
+    return dias
+
+
+def _calendario_playoffs(rng, times, forca, total_classificados):
+    # series melhor de 7 com mando 2-2-1-1-1, um jogo a cada dois dias
+    classificados = sorted(times, key=lambda team_id: forca[team_id], reverse=True)[:total_classificados]
+    dias = []
+    while len(classificados) > 1:
+        series = []
+        for indice in range(len(classificados) // 2):
+            series.append({"casa": classificados[indice], "fora": classificados[-1 - indice], "vitorias": {classificados[indice]: 0, classificados[-1 - indice]: 0}})
+        numero_jogo = 0
+        while any(max(serie["vitorias"].values()) < VITORIAS_SERIE for serie in series):
+            jogos_dia = []
+            for serie in series:
+                if max(serie["vitorias"].values()) >= VITORIAS_SERIE:
+                    continue
+                if numero_jogo in (0, 1, 4, 6):
+                    jogos_dia.append((serie["casa"], serie["fora"]))
+                else:
+                    jogos_dia.append((serie["fora"], serie["casa"]))
+                chance_casa = forca[serie["casa"]] / (forca[serie["casa"]] + forca[serie["fora"]])
+                vencedor = serie["casa"] if rng.random() < chance_casa else serie["fora"]
+                serie["vitorias"][vencedor] = serie["vitorias"][vencedor] + 1
+            dias.append(jogos_dia)
+            dias.append([])
+            numero_jogo = numero_jogo + 1
+        vencedores = []
+        for serie in series:
+            vencedores.append(max(serie["vitorias"], key=serie["vitorias"].get))
+        classificados = vencedores
+    return dias
+
+
+def _linhas_box_score(rng, game_id, season, team_id, elenco):
+    linhas = []
+    for player_id, pos, perfil in elenco:
+        if rng.random() < perfil["prob_ausencia"]:
+            continue
+        segundos = int(max(min(rng.normal(perfil["minutos"], 4.0), 48.0), 1.0) * 60)
+        minutos = segundos / 60.0
+        linha = {}
+        linha["player_id"] = player_id
+        linha["game_id"] = game_id
+        linha["team_id"] = team_id
+        linha["season"] = season
+        linha["pos"] = pos
+        linha["minutes"] = f"{segundos // 60}:{segundos % 60:02d}"
+        linha["seconds_played"] = segundos
+        for stat_name in ("points", "assists", "tot_reb", "steals", "blocks"):
+            linha[stat_name] = int(rng.poisson(perfil[stat_name] * minutos))
+        linhas.append(linha)
+    return linhas
+
+
+def _inserir_em_lotes(db, tabela, linhas):
+    for inicio in range(0, len(linhas), TAMANHO_LOTE_INSERT):
+        db.execute(tabela.insert(), linhas[inicio:inicio + TAMANHO_LOTE_INSERT])
+
+
+def gerar_temporada_sintetica(db, season, total_times=TOTAL_TIMES, jogadores_por_time=JOGADORES_POR_TIME, jogos_por_time=JOGOS_POR_TIME, times_playoffs=TIMES_PLAYOFFS, jogos_hoje=JOGOS_HOJE, semente=42):
+    from app.db.models import Game, Player, PlayerGameStats, PlayerTeamSeason, Season, Team
+    from app.services.defesa_service import reconstruir_defesa_temporada
+    from app.services.manager_service import FUSO_SP
+
+    rng = np.random.default_rng(semente)
+    _inserir_em_lotes(db, Season.__table__, [{"season": season}])
+
+    times = []
+    forca = {}
+    elencos = {}
+    linhas_times = []
+    linhas_jogadores = []
+    linhas_elencos = []
+    for indice_time in range(total_times):
+        team_id = _id_time(season, indice_time)
+        times.append(team_id)
+        forca[team_id] = rng.uniform(0.5, 1.5)
+        linhas_times.append({"id": team_id, "name": f"Time Sintetico {indice_time + 1}", "code": f"S{indice_time + 1:02d}", "all_star": False, "nba_franchise": True})
+        elencos[team_id] = []
+        for posicao_rotacao in range(jogadores_por_time):
+            player_id = _id_jogador(season, indice_time * jogadores_por_time + posicao_rotacao)
+            pos = POSICOES[posicao_rotacao % len(POSICOES)]
+            linhas_jogadores.append({"id": player_id, "firstname": "Jogador", "lastname": str(player_id)})
+            linhas_elencos.append({"player_id": player_id, "team_id": team_id, "season": season, "league_code": "standard", "active": True, "pos": pos})
+            elencos[team_id].append((player_id, pos, _perfil_jogador(rng, posicao_rotacao, pos)))
+    _inserir_em_lotes(db, Team.__table__, linhas_times)
+    _inserir_em_lotes(db, Player.__table__, linhas_jogadores)
+    _inserir_em_lotes(db, PlayerTeamSeason.__table__, linhas_elencos)
+
+    dias_regular = _calendario_regular(rng, times, jogos_por_time)
+    dias_playoffs = _calendario_playoffs(rng, times, forca, times_playoffs)
+
+    # a temporada termina ontem; a rodada de hoje fica agendada as 20h de Sao Paulo
+    hoje_sp = datetime.now(FUSO_SP).replace(hour=20, minute=0, second=0, microsecond=0)
+    total_dias = len(dias_regular) + len(dias_playoffs)
+    linhas_jogos = []
+    linhas_stats = []
+    numero_jogo = 0
+    calendario = []
+    for dia in dias_regular:
+        calendario.append((STAGE_TEMPORADA_REGULAR, dia))
+    for dia in dias_playoffs:
+        calendario.append((STAGE_PLAYOFFS, dia))
+    for indice_dia in range(total_dias):
+        stage, jogos_dia = calendario[indice_dia]
+        data_dia = hoje_sp - timedelta(days=total_dias - indice_dia)
+        for ordem in range(len(jogos_dia)):
+            home_team_id, away_team_id = jogos_dia[ordem]
+            numero_jogo = numero_jogo + 1
+            game_id = season * 100000 + numero_jogo
+            data_jogo = (data_dia + timedelta(minutes=30 * (ordem % 4))).astimezone(timezone.utc)
+            linhas_jogos.append({"id": game_id, "league": "standard", "season": season, "date_start": data_jogo, "stage": stage, "status_short": STATUS_FINALIZADO, "status_long": "Finished", "home_team_id": home_team_id, "away_team_id": away_team_id})
+            linhas_stats.extend(_linhas_box_score(rng, game_id, season, home_team_id, elencos[home_team_id]))
+            linhas_stats.extend(_linhas_box_score(rng, game_id, season, away_team_id, elencos[away_team_id]))
+
+    embaralhados = list(times)
+    rng.shuffle(embaralhados)
+    for ordem in range(min(jogos_hoje, total_times // 2)):
+        numero_jogo = numero_jogo + 1
+        data_jogo = (hoje_sp + timedelta(minutes=30 * (ordem % 4))).astimezone(timezone.utc)
+        linhas_jogos.append({"id": season * 100000 + numero_jogo, "league": "standard", "season": season, "date_start": data_jogo, "stage": STAGE_PLAYOFFS, "status_short": STATUS_AGENDADO, "status_long": "Scheduled", "home_team_id": embaralhados[2 * ordem], "away_team_id": embaralhados[2 * ordem + 1]})
+
+    _inserir_em_lotes(db, Game.__table__, linhas_jogos)
+    _inserir_em_lotes(db, PlayerGameStats.__table__, linhas_stats)
+    db.commit()
+    reconstruir_defesa_temporada(db, season)
+
+    volume = {}
+    volume["times"] = total_times
+    volume["jogadores"] = len(linhas_jogadores)
+    volume["jogos_regular"] = sum(len(dia) for dia in dias_regular)
+    volume["jogos_playoffs"] = sum(len(dia) for dia in dias_playoffs)
+    volume["jogos_hoje"] = len(linhas_jogos) - volume["jogos_regular"] - volume["jogos_playoffs"]
+    volume["linhas_stats"] = len(linhas_stats)
+    return volume
+
+
+def _medir(funcao):
+    inicio = time.perf_counter()
+    retorno = funcao()
+    return round(time.perf_counter() - inicio, 3), retorno
+
+
+def _commit_atual():
+    try:
+        saida = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__)), timeout=10)
+        return saida.stdout.strip() or None
+    except Exception:
+        return None
+
+
+def _abrir_banco(banco, arquivo_sqlite):
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import sessionmaker
+    from app.config import config
+    from app.db.base import Base
+
+    if banco == "postgres":
+        from app.db.session import engine
+    else:
+        engine = create_engine(f"sqlite:///{arquivo_sqlite}")
+        # SessionLocal aponta para o Postgres da aplicacao: no SQLite a rodada roda na sessao principal
+        config.RODADA_WORKERS = 1
+    Base.metadata.create_all(engine)
+    return sessionmaker(bind=engine, autocommit=False, autoflush=False)()
+
+
+def executar(banco="sqlite", season=TEMPORADA_SINTETICA, etapas=None, reaproveitar=False, arquivo_sqlite=None, pasta_modelos=None, total_times=TOTAL_TIMES, jogadores_por_time=JOGADORES_POR_TIME, jogos_por_time=JOGOS_POR_TIME, semente=42):
+    from app.config import config
+    from app.db.models import Game
+    from app.services import manager_service, modelo_service
+
+    if etapas is None:
+        etapas = list(ETAPAS)
+    pasta_trabalho = tempfile.mkdtemp(prefix="benchmark_pipeline_")
+    if arquivo_sqlite is None:
+        arquivo_sqlite = os.path.join(pasta_trabalho, "benchmark.db")
+    if pasta_modelos is None:
+        pasta_modelos = os.path.join(pasta_trabalho, "modelos")
+    config.PASTA_MODELOS = pasta_modelos
+    config.PASTA_SNAPSHOTS = os.path.join(pasta_modelos, "snapshots")
+
+    db = _abrir_banco(banco, arquivo_sqlite)
+    resultado = {}
+    resultado["commit"] = _commit_atual()
+    resultado["gerado_em"] = datetime.now(timezone.utc).isoformat()
+    resultado["banco"] = banco
+    resultado["parametros"] = {"temporada": season, "times": total_times, "jogadores_por_time": jogadores_por_time, "jogos_por_time": jogos_por_time, "semente": semente, "modo_treino": config.MODO_TREINO_MODELOS, "formato_modelos": config.FORMATO_MODELOS}
+    resultado["ambiente"] = {"python": platform.python_version(), "plataforma": platform.platform(), "cpus": os.cpu_count()}
+    resultado["etapas"] = {}
+
+    try:
+        ja_existe = db.query(Game.id).filter(Game.season == season).first() is not None
+        if ja_existe and not reaproveitar:
+            raise RuntimeError(f"Temporada {season} ja tem jogos no banco; use --reaproveitar ou outra --temporada")
+        if not ja_existe:
+            segundos, volume = _medir(lambda: gerar_temporada_sintetica(db, season, total_times=total_times, jogadores_por_time=jogadores_por_time, jogos_por_time=jogos_por_time, semente=semente))
+            resultado["volume"] = volume
+            resultado["etapas"]["geracao"] = {"segundos": segundos}
+
+        if "features" in etapas:
+            segundos_snapshot, dados = _medir(lambda: modelo_service._pre_carregar_dados_temporada(db, season))
+            ids_jogadores = list(dados)
+            segundos_features, unidades = _medir(lambda: modelo_service._montar_unidades_treino(dados, ids_jogadores))
+            resultado["etapas"]["features"] = {"segundos": round(segundos_snapshot + segundos_features, 3), "segundos_snapshot": segundos_snapshot, "segundos_extracao": segundos_features, "unidades": len(unidades), "amostras": sum(len(unidade[3]) for unidade in unidades)}
+
+        if "treino" in etapas:
+            segundos, retreino = _medir(lambda: modelo_service.retreinar_todos_modelos(db, season, forcar_completo=True))
+            resultado["etapas"]["treino"] = {"segundos": segundos, "modelos": retreino["total_salvos"], "erros": retreino["total_erros"], "workers": retreino["workers"]}
+
+        if "rodada" in etapas:
+            manager_service.deletar_todas_predicoes(db, season)
+            segundos, total = _medir(lambda: manager_service.salvar_predicoes_dia_atual(db, season))
+            resultado["etapas"]["rodada"] = {"segundos": segundos, "predicoes": total}
+
+        if "replay" in etapas:
+            manager_service.deletar_todas_predicoes(db, season)
+            segundos, total = _medir(lambda: manager_service.gerar_predicoes_retroativas(db, season))
+            resultado["etapas"]["replay"] = {"segundos": segundos, "predicoes": total}
+    finally:
+        db.close()
+    return resultado
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de features, treino, rodada do dia e replay sobre uma temporada sintetica")
+    parser.add_argument("--banco", choices=["sqlite", "postgres"], default="sqlite", help="postgres usa as variaveis POSTGRES_* da aplicacao (use um banco de testes)")
+    parser.add_argument("--temporada", type=int, default=TEMPORADA_SINTETICA)
+    parser.add_argument("--etapas", default=",".join(ETAPAS))
+    parser.add_argument("--times", type=int, default=TOTAL_TIMES)
+    parser.add_argument("--jogadores-por-time", type=int, default=JOGADORES_POR_TIME)
+    parser.add_argument("--jogos-por-time", type=int, default=JOGOS_POR_TIME)
+    parser.add_argument("--semente", type=int, default=42)
+    parser.add_argument("--arquivo-sqlite", default=None)
+    parser.add_argument("--pasta-modelos", default=None)
+    parser.add_argument("--reaproveitar", action="store_true", help="mede sobre a temporada sintetica ja gravada no banco")
+    parser.add_argument("--saida", default=None, help="arquivo JSON com o resultado")
+    args = parser.parse_args()
+
+    etapas = [etapa.strip() for etapa in args.etapas.split(",") if etapa.strip()]
+    for etapa in etapas:
+        if etapa not in ETAPAS:
+            parser.error(f"etapa desconhecida: {etapa}")
+
+    resultado = executar(banco=args.banco, season=args.temporada, etapas=etapas, reaproveitar=args.reaproveitar, arquivo_sqlite=args.arquivo_sqlite, pasta_modelos=args.pasta_modelos, total_times=args.times, jogadores_por_time=args.jogadores_por_time, jogos_por_time=args.jogos_por_time, semente=args.semente)
+    texto = json.dumps(resultado, indent=2, ensure_ascii=False)
+    if args.saida:
+        with open(args.saida, "w", encoding="utf-8") as arquivo:
+            arquivo.write(texto)
+    print(texto)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,42 @@
+import pytest
+
+from app.config import config
+from app.services import cache_predicoes
+
+@pytest.fixture
+def cache_limpo(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "PASTA_MODELOS", str(tmp_path))
+    monkeypatch.setattr(config, "PREDICOES_CACHE_TTL_SEGUNDOS", 900)
+    cache_predicoes.invalidar_cache_predicoes()
+    for chave in cache_predicoes._contadores:
+        cache_predicoes._contadores[chave] = 0
+    cache_predicoes._versoes_dados["mtime"] = None
+    cache_predicoes._versoes_dados["versoes"] = {}
+    yield cache_predicoes
+    cache_predicoes.invalidar_cache_predicoes()
+
+class TestCachePredicoes:
+    def test_acerto_na_segunda_consulta(self, cache_limpo):
+        chave = cache_limpo.montar_chave(1, 10, 2025, 1, "points")
+        assert cache_limpo.obter(chave) is None
+        cache_limpo.guardar(chave, {"previsao": 20.5})
+        assert cache_limpo.obter(cache_limpo.montar_chave(1, 10, 2025, 1, "points")) == {"previsao": 20.5}
+        estatisticas = cache_limpo.estatisticas_cache_predicoes()
+        assert estatisticas["acertos"] == 1
+        assert estatisticas["falhas"] == 1
+        assert estatisticas["taxa_acerto"] == 50.0
+
+    def test_nova_versao_dos_dados_muda_a_chave(self, cache_limpo):
+        chave = cache_limpo.montar_chave(1, 10, 2025, 1, "points")
+        cache_limpo.guardar(chave, {"previsao": 20.5})
+        cache_limpo.registrar_nova_versao_dados(2025)
+        nova_chave = cache_limpo.montar_chave(1, 10, 2025, 1, "points")
+        assert nova_chave != chave
+        assert cache_limpo.obter(nova_chave) is None
+
+    def test_ttl_expirado(self, cache_limpo, monkeypatch):
+        chave = cache_limpo.montar_chave(1, 10, 2025, 0, "assists")
+        cache_limpo.guardar(chave, {"previsao": 5.0})
+        monkeypatch.setattr(config, "PREDICOES_CACHE_TTL_SEGUNDOS", -1)
+        assert cache_limpo.obter(chave) is None
+        assert cache_limpo.estatisticas_cache_predicoes()["expirados"] == 1
@@ -0,0 +1,54 @@
+import pytest
+from datetime import datetime, timedelta, timezone
+from unittest.mock import MagicMock, patch
+
+from app.services.defesa_service import construir_tabela_defesa, consultar_media_sofrida, reconstruir_defesa_temporada
+
+def criar_linhas_time(team_id, pontos, stages=None):
+    inicio = datetime(2025, 10, 21, 23, 30, tzinfo=timezone.utc)
+    linhas = []
+    for i in range(len(pontos)):
+        linha = {"team_id": team_id, "date_start": inicio + timedelta(days=2 * i), "stage": 2 if stages is None else stages[i]}
+        linha["points_allowed"] = pontos[i]
+        linha["assists_allowed"] = 20
+        linha["tot_reb_allowed"] = 40
+        linha["steals_allowed"] = 7
+        linha["blocks_allowed"] = 5
+        linhas.append(linha)
+    return linhas
+
+def construir(linhas):
+    with patch("app.services.defesa_service._carregar_linhas_tabela", return_value=linhas):
+        return construir_tabela_defesa(db=None, season=2025)
+
+class TestConsultarMediaSofrida:
+    def test_media_da_temporada(self):
+        tabela = construir(criar_linhas_time(1, [100, 110, 120]))
+        assert consultar_media_sofrida(tabela, 1, "points") == 110.0
+
+    def test_corte_estrito_pela_data(self):
+        linhas = criar_linhas_time(1, [100, 110, 120])
+        tabela = construir(linhas)
+        assert consultar_media_sofrida(tabela, 1, "points", data_corte=linhas[2]["date_start"]) == 105.0
+
+    def test_corte_antes_do_primeiro_jogo(self):
+        linhas = criar_linhas_time(1, [100, 110])
+        tabela = construir(linhas)
+        assert consultar_media_sofrida(tabela, 1, "points", data_corte=linhas[0]["date_start"]) == 0.0
+
+    def test_time_sem_jogos(self):
+        tabela = construir(criar_linhas_time(1, [100]))
+        assert consultar_media_sofrida(tabela, 99, "points") == 0.0
+
+    def test_pre_temporada_excluida_por_padrao(self):
+        tabela = construir(criar_linhas_time(1, [80, 100, 120], stages=[1, 2, 2]))
+        assert consultar_media_sofrida(tabela, 1, "points") == 110.0
+        assert consultar_media_sofrida(tabela, 1, "points", excluir_pre_temporada=False) == 100.0
+
+class TestReconstruirDefesa:
+    def test_publica_nova_versao_dos_dados(self):
+        db = MagicMock()
+        with patch("app.services.defesa_service._calcular_linhas_defesa", return_value=criar_linhas_time(1, [100])), patch("app.services.defesa_service.registrar_nova_versao_dados") as registrar:
+            assert reconstruir_defesa_temporada(db, 2025) == 1
+        db.commit.assert_called_once()
+        registrar.assert_called_once_with(2025)
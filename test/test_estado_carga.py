@@ -0,0 +1,24 @@
+from types import SimpleNamespace
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+
+from app.db.models import Base, EtlGameLoadState
+from app.etl import estado_carga
+
+def criar_db():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine, tables=[EtlGameLoadState.__table__])
+    return sessionmaker(bind=engine)()
+
+class TestRegistrarEstados:
+    def test_regravar_atualiza_updated_at(self):
+        db = criar_db()
+        jogo = SimpleNamespace(id=1, status_short=3)
+        assert estado_carga.registrar_estados(db, [estado_carga.montar_estado("stats_jogadores", jogo, "a", 10)]) == {"inseridos": 1, "atualizados": 0}
+        db.execute(text("UPDATE etl_game_load_state SET updated_at = '2000-01-01 00:00:00'"))
+
+        assert estado_carga.registrar_estados(db, [estado_carga.montar_estado("stats_jogadores", jogo, "b", 12)]) == {"inseridos": 0, "atualizados": 1}
+        estado = db.query(EtlGameLoadState).one()
+        assert estado.payload_hash == "b"
+        assert estado.rows_written == 12
+        assert estado.updated_at.year > 2000
@@ -0,0 +1,153 @@
+import pytest
+import numpy as np
+from datetime import datetime, timedelta, timezone
+
+from app.services.feature_store import calcular_features_jogador, consultar_features_jogador, _montar_jogador
+from app.services.prediction_service import calcular_ema_ponderada
+
+def referencia_ingenua(valores, minutos, k):
+    valores_3 = valores[max(0, k - 3):k]
+    valores_10 = valores[max(0, k - 10):k]
+    minutos_10 = minutos[max(0, k - 10):k]
+    if len(valores_3) >= 2:
+        inclinacao = float(np.polyfit(np.arange(len(valores_3)), np.array(valores_3), 1)[0])
+        variancia = float(np.std(valores_3))
+    else:
+        inclinacao = 0.0
+        variancia = 0.0
+    return {
+        "ema_3": calcular_ema_ponderada(valores_3),
+        "ema_10": calcular_ema_ponderada(valores_10),
+        "media_10": float(np.mean(valores_10)) if valores_10 else 0.0,
+        "media_minutos": float(np.mean(minutos_10)) if minutos_10 else 0.0,
+        "media_temporada": float(np.mean(valores[:k])) if k > 0 else 0.0,
+        "inclinacao": inclinacao,
+        "variancia": variancia,
+    }
+
+def criar_linhas(valores):
+    inicio = datetime(2025, 10, 21, 23, 30, tzinfo=timezone.utc)
+    linhas = []
+    for i in range(len(valores)):
+        data = inicio + timedelta(days=2 * i)
+        linha = {"data": data, "timestamp": data.timestamp(), "adversario": 10 + (i % 3), "minutes": 30.0 + i}
+        for stat_name in ["points", "assists", "tot_reb", "steals", "blocks"]:
+            linha[stat_name] = float(valores[i])
+        linhas.append(linha)
+    return linhas
+
+class TestCalcularFeaturesJogador:
+    def test_igual_referencia_em_todas_posicoes(self):
+        rng = np.random.default_rng(7)
+        valores = rng.integers(0, 40, size=25).astype(float).tolist()
+        minutos = rng.uniform(10, 40, size=25).tolist()
+        features = calcular_features_jogador(valores, minutos)
+        for k in range(len(valores) + 1):
+            esperado = referencia_ingenua(valores, minutos, k)
+            for nome in esperado:
+                assert features[nome][k] == pytest.approx(esperado[nome], abs=1e-6), (nome, k)
+
+    def test_lista_vazia(self):
+        features = calcular_features_jogador([], [])
+        assert len(features["ema_3"]) == 1
+        assert features["media_temporada"][0] == 0.0
+
+class TestConsultarFeaturesJogador:
+    def setup_method(self):
+        self.linhas = criar_linhas([10, 20, 30, 40, 50])
+        self.store = {"jogadores": {1: _montar_jogador(self.linhas)}}
+
+    def test_sem_corte_usa_temporada_inteira(self):
+        resultado = consultar_features_jogador(self.store, 1, "points")
+        assert resultado["total_jogos"] == 5
+        assert resultado["media_temporada"] == 30.0
+        assert resultado["data_ultimo_jogo"] == self.linhas[-1]["data"]
+
+    def test_corte_exclui_jogo_na_data(self):
+        resultado = consultar_features_jogador(self.store, 1, "points", data_corte=self.linhas[2]["data"])
+        assert resultado["total_jogos"] == 2
+        assert resultado["media_temporada"] == 15.0
+
+    def test_corte_antes_do_primeiro_jogo(self):
+        resultado = consultar_features_jogador(self.store, 1, "points", data_corte=self.linhas[0]["data"])
+        assert resultado is None
+
+    def test_jogador_inexistente(self):
+        assert consultar_features_jogador(self.store, 99, "points") is None
+
+    def test_media_vs_adversario(self):
+        resultado = consultar_features_jogador(self.store, 1, "points", opponent_team_id=10)
+        assert resultado["media_vs_adversario"] == 25.0
+
+    def test_media_vs_adversario_sem_confronto(self):
+        resultado = consultar_features_jogador(self.store, 1, "points", opponent_team_id=77)
+        assert resultado["media_vs_adversario"] is None
+
+class TestExtrairFeaturesEmMemoria:
+    def test_linhas_de_treino_iguais_referencia(self):
+        from app.services.modelo_service import _extrair_features_em_memoria
+        rng = np.random.default_rng(11)
+        valores = rng.integers(0, 30, size=20).astype(float).tolist()
+        minutos = rng.uniform(10, 40, size=20).tolist()
+        jogos = {"points": np.array(valores), "minutes": np.array(minutos)}
+        lista_features, lista_alvos = _extrair_features_em_memoria(jogos, "points")
+        assert lista_alvos == valores[5:]
+        for linha in range(len(lista_features)):
+            esperado = referencia_ingenua(valores, minutos, linha + 5)
+            ema = esperado["ema_3"] * 0.40 + esperado["ema_10"] * 0.35 + esperado["media_temporada"] * 0.25
+            vetor = lista_features[linha]
+            assert vetor[0] == pytest.approx(ema, abs=1e-3)
+            assert vetor[4] == pytest.approx(esperado["media_minutos"], abs=1e-9)
+            assert vetor[5] == pytest.approx(esperado["inclinacao"], abs=1e-9)
+            assert vetor[7] == pytest.approx(esperado["variancia"], abs=1e-9)
+            assert vetor[9] == pytest.approx(esperado["media_temporada"], abs=1e-9)
+            assert vetor[10] == pytest.approx(esperado["media_10"], abs=1e-9)
+
+    def test_poucos_jogos(self):
+        from app.services.modelo_service import _extrair_features_em_memoria
+        jogos = {"points": np.full(8, 10.0), "minutes": np.full(8, 30.0)}
+        assert _extrair_features_em_memoria(jogos, "points") == (None, None)
+
+class TestSnapshotTemporada:
+    def test_fatias_contiguas_por_jogador(self):
+        from app.services import snapshot_temporada
+        colunas = {"player_id": np.array([3, 3, 3, 7, 9, 9]), "timestamps": np.arange(6, dtype=float), "seconds_played": np.array([1800, 600, 0, 2400, 900, 1200])}
+        for stat_name in snapshot_temporada.STATS_SNAPSHOT:
+            colunas[stat_name] = np.arange(6, dtype=float)
+        snapshot = {"meta": {}, "colunas": colunas}
+        dados = snapshot_temporada.dados_por_jogador(snapshot)
+        assert sorted(dados) == [3, 7, 9]
+        assert dados[3]["points"].tolist() == [0.0, 1.0, 2.0]
+        assert dados[3]["minutes"].tolist() == [30.0, 10.0, 0.0]
+        assert dados[9]["points"].base is not None
+
+@pytest.fixture
+def versoes_limpas(tmp_path, monkeypatch):
+    from app.config import config
+    from app.services import cache_predicoes, feature_store, defesa_service
+    monkeypatch.setattr(config, "PASTA_MODELOS", str(tmp_path))
+    cache_predicoes._versoes_dados["mtime"] = None
+    cache_predicoes._versoes_dados["versoes"] = {}
+    feature_store.invalidar_feature_store()
+    defesa_service.invalidar_tabela_defesa()
+    yield cache_predicoes
+    feature_store.invalidar_feature_store()
+    defesa_service.invalidar_tabela_defesa()
+
+class TestVersaoDados:
+    def test_store_e_tabela_reconstruidos_com_nova_versao(self, versoes_limpas, monkeypatch):
+        from app.services import feature_store, defesa_service
+        construcoes = []
+        monkeypatch.setattr(feature_store, "construir_feature_store", lambda db, season: construcoes.append("store") or {"construido_em": 0.0})
+        monkeypatch.setattr(defesa_service, "construir_tabela_defesa", lambda db, season: construcoes.append("defesa") or {"construido_em": 0.0})
+        versoes_limpas.registrar_nova_versao_dados(2025)
+        store = feature_store.obter_feature_store(None, 2025)
+        tabela = defesa_service.obter_tabela_defesa(None, 2025)
+        assert feature_store.obter_feature_store(None, 2025) is store
+        assert defesa_service.obter_tabela_defesa(None, 2025) is tabela
+        assert construcoes == ["store", "defesa"]
+
+        versoes_limpas.registrar_nova_versao_dados(2025)
+        assert feature_store.obter_feature_store(None, 2025) is not store
+        assert defesa_service.obter_tabela_defesa(None, 2025) is not tabela
+        assert construcoes == ["store", "defesa", "store", "defesa"]
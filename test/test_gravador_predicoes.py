@@ -0,0 +1,55 @@
+from datetime import datetime, timezone
+from unittest.mock import MagicMock
+
+from app.services.gravador_predicoes import _inserir_via_copy, COLUNAS_PREDICAO
+
+def criar_linha(player_id):
+    linha = {}
+    for coluna in COLUNAS_PREDICAO:
+        linha[coluna] = 1.5
+    linha["player_id"] = player_id
+    linha["game_id"] = 10
+    linha["is_home"] = True
+    linha["created_at"] = datetime(2025, 11, 1, tzinfo=timezone.utc)
+    return linha
+
+def criar_db_copy(rowcount):
+    cursor = MagicMock()
+    cursor.rowcount = rowcount
+    copiado = {}
+    def copy_expert(sql, buffer):
+        copiado["sql"] = sql
+        copiado["csv"] = buffer.read()
+    cursor.copy_expert.side_effect = copy_expert
+    db = MagicMock()
+    db.connection.return_value.connection.cursor.return_value = cursor
+    return db, cursor, copiado
+
+def comandos_executados(cursor):
+    return [chamada.args[0] for chamada in cursor.execute.call_args_list]
+
+class TestInserirViaCopy:
+    def test_do_nothing(self):
+        db, cursor, copiado = criar_db_copy(2)
+        assert _inserir_via_copy(db, [criar_linha(1), criar_linha(2)]) == 2
+
+        comandos = comandos_executados(cursor)
+        assert comandos[0].startswith("CREATE TEMP TABLE tmp_predicoes_copy (LIKE predictions")
+        colunas = ", ".join(COLUNAS_PREDICAO)
+        assert copiado["sql"] == f"COPY tmp_predicoes_copy ({colunas}) FROM STDIN WITH (FORMAT csv)"
+        linhas_csv = copiado["csv"].splitlines()
+        assert len(linhas_csv) == 2
+        assert linhas_csv[0].startswith("1,10,")
+        assert linhas_csv[0].endswith("2025-11-01T00:00:00+00:00")
+        assert comandos[1] == f"INSERT INTO predictions ({colunas}) SELECT {colunas} FROM tmp_predicoes_copy ON CONFLICT (player_id, game_id) DO NOTHING"
+        assert comandos[2] == "DROP TABLE tmp_predicoes_copy"
+        cursor.close.assert_called_once()
+
+    def test_do_update(self):
+        db, cursor, _ = criar_db_copy(1)
+        assert _inserir_via_copy(db, [criar_linha(1)], atualizar=True) == 1
+
+        insercao = comandos_executados(cursor)[1]
+        assert "ON CONFLICT (player_id, game_id) DO UPDATE SET predicted_points = EXCLUDED.predicted_points, " in insercao
+        assert insercao.endswith("created_at = EXCLUDED.created_at")
+        assert "DO NOTHING" not in insercao
@@ -0,0 +1,173 @@
+import pytest
+
+from app.config import config
+from app.services import nba_api_client
+
+@pytest.fixture
+def balde_limpo(monkeypatch):
+    monkeypatch.setattr(config, "API_SPORTS_REQUISICOES_POR_MINUTO", 60)
+    monkeypatch.setattr(config, "API_SPORTS_RAJADA", 2)
+    monkeypatch.setattr(nba_api_client.time, "monotonic", lambda: 100.0)
+    nba_api_client._balde["tokens"] = None
+    nba_api_client._balde["atualizado_em"] = 0.0
+    yield nba_api_client._balde
+    nba_api_client._balde["tokens"] = None
+
+class TestLimitadorRequisicoes:
+    def test_rajada_livre_depois_espera(self, balde_limpo):
+        assert nba_api_client._reservar_token() == 0.0
+        assert nba_api_client._reservar_token() == 0.0
+        assert nba_api_client._reservar_token() == pytest.approx(1.0)
+        assert nba_api_client._reservar_token() == pytest.approx(2.0)
+
+    def test_tokens_repostos_com_o_tempo(self, balde_limpo, monkeypatch):
+        nba_api_client._reservar_token()
+        nba_api_client._reservar_token()
+        monkeypatch.setattr(nba_api_client.time, "monotonic", lambda: 101.0)
+        assert nba_api_client._reservar_token() == 0.0
+
+class TestAvaliarResposta:
+    def test_resposta_valida(self):
+        assert nba_api_client._avaliar_resposta("games", 200, lambda: {"errors": [], "response": [1]}, 1) == (None, [1])
+
+    def test_rate_limit_pede_nova_tentativa(self):
+        espera, dados = nba_api_client._avaliar_resposta("games", 429, lambda: {}, 1)
+        assert espera is not None
+        assert dados is None
+        assert nba_api_client._avaliar_resposta("games", 429, lambda: {}, nba_api_client.TENTATIVAS_MAXIMAS) == (None, None)
+
+    def test_erro_http_nao_repete(self):
+        assert nba_api_client._avaliar_resposta("games", 500, lambda: {}, 1) == (None, None)
+
+@pytest.fixture
+def cache_limpo(tmp_path, monkeypatch):
+    from app.services import cache_api
+    monkeypatch.setattr(config, "PASTA_CACHE_API", str(tmp_path))
+    monkeypatch.setattr(config, "API_CACHE_ATIVO", True)
+    monkeypatch.setattr(config, "API_CACHE_TTL_SEGUNDOS", 300)
+    cache_api._finalizados["carregado"] = False
+    cache_api._finalizados["ids"] = set()
+    yield cache_api
+    cache_api._finalizados["carregado"] = False
+    cache_api._finalizados["ids"] = set()
+
+class TestCacheApi:
+    def test_jogo_finalizado_nao_expira(self, cache_limpo, monkeypatch):
+        jogos = [{"id": 10, "status": {"short": 3}}]
+        assert cache_limpo.gravar("games", {"season": 2025, "date": "2025-01-01"}, jogos) is True
+        assert cache_limpo.gravar("players/statistics", {"game": 10}, [{"points": 20}]) is True
+        assert cache_limpo.gravar("players/statistics", {"game": 11}, [{"points": 5}]) is False
+        monkeypatch.setattr(config, "API_CACHE_TTL_SEGUNDOS", -1)
+        assert cache_limpo.ler("players/statistics", {"game": 10}) == [{"points": 20}]
+        assert cache_limpo.ler("games", {"date": "2025-01-01", "season": 2025}) == jogos
+        assert cache_limpo.ler("players/statistics", {"game": 11}) is None
+
+    def test_requisicao_em_cache_nao_chama_a_api(self, cache_limpo, monkeypatch):
+        cache_limpo.gravar("games/statistics", {"id": 7}, [{"team": {"id": 1}}])
+        def sessao_proibida():
+            raise AssertionError("chamada HTTP inesperada")
+        monkeypatch.setattr(nba_api_client, "_sessao", sessao_proibida)
+        assert nba_api_client.get_game_statistics(7) == [{"team": {"id": 1}}]
+
+@pytest.fixture
+def zona_bruta_limpa(tmp_path, monkeypatch):
+    from app.services import zona_bruta
+    monkeypatch.setattr(config, "PASTA_ZONA_BRUTA", str(tmp_path))
+    monkeypatch.setattr(config, "ZONA_BRUTA_ATIVA", True)
+    monkeypatch.setattr(config, "ETL_MODO_REPLAY", False)
+    zona_bruta._indice_replay.clear()
+    yield zona_bruta
+    zona_bruta._indice_replay.clear()
+
+class TestZonaBruta:
+    def test_replay_devolve_resposta_mais_recente_sem_rede(self, zona_bruta_limpa, monkeypatch):
+        zona_bruta_limpa.registrar_resposta("players/statistics", {"game": 10}, [{"points": 18}])
+        zona_bruta_limpa.registrar_resposta("players/statistics", {"game": 10}, [{"points": 20}])
+        zona_bruta_limpa.registrar_resposta("games/statistics", {"id": 10}, [{"team": {"id": 1}}])
+
+        zona_bruta_limpa.ativar_modo_replay()
+        def sessao_proibida():
+            raise AssertionError("chamada HTTP inesperada")
+        monkeypatch.setattr(nba_api_client, "_sessao", sessao_proibida)
+        assert nba_api_client.get_player_statistics(10) == [{"points": 20}]
+        assert nba_api_client.get_game_statistics_many([10, 11]) == {10: [{"team": {"id": 1}}], 11: None}
+
+    def test_replay_nao_regrava_na_zona_bruta(self, zona_bruta_limpa):
+        zona_bruta_limpa.ativar_modo_replay()
+        zona_bruta_limpa.registrar_resposta("games", {"season": 2025}, [])
+        assert zona_bruta_limpa._arquivos_endpoint("games") == []
+
+@pytest.fixture
+def api_simulada(cache_limpo, monkeypatch):
+    import httpx
+    monkeypatch.setattr(config, "API_SPORTS_REQUISICOES_POR_MINUTO", 6000)
+    monkeypatch.setattr(config, "API_SPORTS_RAJADA", 100)
+    monkeypatch.setattr(config, "API_SPORTS_CONCORRENCIA", 3)
+    monkeypatch.setattr(config, "API_SPORTS_BASE_URL", "https://api.teste")
+    monkeypatch.setattr(config, "ZONA_BRUTA_ATIVA", False)
+    monkeypatch.setattr(config, "ETL_MODO_REPLAY", False)
+    monkeypatch.setattr(nba_api_client, "ESPERA_RATE_LIMIT_BASE_SEGUNDOS", 0)
+    nba_api_client._balde["tokens"] = None
+    cliente_original = httpx.AsyncClient
+    def instalar(tratador):
+        monkeypatch.setattr(httpx, "AsyncClient", lambda **kwargs: cliente_original(transport=httpx.MockTransport(tratador), **kwargs))
+    yield instalar
+    nba_api_client._balde["tokens"] = None
+
+def resposta_jogo(game_id):
+    return {"errors": [], "response": [{"game": game_id}]}
+
+class TestBuscaAssincrona:
+    def test_concorrencia_limitada_e_ordem_preservada(self, api_simulada):
+        import asyncio
+        import httpx
+        estado = {"em_voo": 0, "maximo": 0, "chamadas": 0}
+        async def tratador(requisicao):
+            estado["em_voo"] = estado["em_voo"] + 1
+            estado["chamadas"] = estado["chamadas"] + 1
+            estado["maximo"] = max(estado["maximo"], estado["em_voo"])
+            # respostas fora de ordem: os ultimos jogos terminam primeiro
+            game_id = int(requisicao.url.params["game"])
+            await asyncio.sleep(0.002 * (10 - game_id))
+            estado["em_voo"] = estado["em_voo"] - 1
+            return httpx.Response(200, json=resposta_jogo(game_id))
+        api_simulada(tratador)
+
+        game_ids = [1, 2, 3, 4, 5, 6, 7, 8]
+        respostas = nba_api_client._buscar_varios("players/statistics", [{"game": game_id} for game_id in game_ids])
+        assert respostas == [[{"game": game_id}] for game_id in game_ids]
+        assert estado["chamadas"] == 8
+        assert 1 < estado["maximo"] <= 3
+
+    def test_rate_limit_429_repete_a_requisicao(self, api_simulada):
+        import httpx
+        chamadas = []
+        def tratador(requisicao):
+            game_id = int(requisicao.url.params["id"])
+            chamadas.append(game_id)
+            if game_id == 5 and chamadas.count(5) == 1:
+                return httpx.Response(429, json={})
+            return httpx.Response(200, json=resposta_jogo(game_id))
+        api_simulada(tratador)
+
+        assert nba_api_client.get_game_statistics_many([4, 5]) == {4: [{"game": 4}], 5: [{"game": 5}]}
+        assert chamadas.count(5) == 2
+        assert chamadas.count(4) == 1
+
+    def test_acertos_de_cache_e_buscas_na_ordem_pedida(self, api_simulada, cache_limpo):
+        import httpx
+        cache_limpo.gravar("players/statistics", {"game": 2}, [{"game": 2, "origem": "cache"}])
+        cache_limpo.gravar("players/statistics", {"game": 4}, [{"game": 4, "origem": "cache"}])
+        chamadas = []
+        def tratador(requisicao):
+            game_id = int(requisicao.url.params["game"])
+            chamadas.append(game_id)
+            return httpx.Response(200, json=resposta_jogo(game_id))
+        api_simulada(tratador)
+
+        respostas = nba_api_client._buscar_varios("players/statistics", [{"game": 1}, {"game": 2}, {"game": 3}, {"game": 4}])
+        assert respostas == [[{"game": 1}], [{"game": 2, "origem": "cache"}], [{"game": 3}], [{"game": 4, "origem": "cache"}]]
+        assert sorted(chamadas) == [1, 3]
+        # o que veio da rede entra no cache: a segunda busca nao chama a API
+        nba_api_client._buscar_varios("players/statistics", [{"game": 1}, {"game": 3}])
+        assert sorted(chamadas) == [1, 3]
@@ -0,0 +1,85 @@
+import numpy as np
+import pytest
+
+from app.config import config
+from app.services import modelo_service, pacote_modelos
+
+@pytest.fixture
+def pasta_modelos(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "PASTA_MODELOS", str(tmp_path))
+    monkeypatch.setattr(config, "FORMATO_MODELOS", "pacote")
+    modelo_service.limpar_registro_modelos()
+    yield tmp_path
+    pacote_modelos.fechar_pacote()
+    modelo_service.limpar_registro_modelos()
+
+class TestPacoteModelos:
+    def test_escreve_e_le_entradas(self, tmp_path):
+        caminho = str(tmp_path / "pacote.ubjp")
+        pacote_modelos.escrever_pacote(caminho, {"1": b"abc", "22": b"", "3": b"xyz123"})
+        assert pacote_modelos.ler_entrada(caminho, 1) == b"abc"
+        assert pacote_modelos.ler_entrada(caminho, "3") == b"xyz123"
+        assert pacote_modelos.ler_entrada(caminho, 22) == b""
+        assert pacote_modelos.ler_entrada(caminho, 99) is None
+        assert sorted(pacote_modelos.listar_chaves(caminho)) == ["1", "22", "3"]
+        pacote_modelos.fechar_pacote()
+
+    def test_pacote_inexistente(self, tmp_path):
+        assert pacote_modelos.ler_entrada(str(tmp_path / "nada.ubjp"), 1) is None
+
+    def test_arquivo_invalido(self, tmp_path):
+        caminho = tmp_path / "ruim.ubjp"
+        caminho.write_bytes(b"nao e pacote de modelos")
+        with pytest.raises(ValueError):
+            pacote_modelos.obter_pacote(str(caminho))
+
+    def test_mapa_antigo_continua_legivel_apos_regravar(self, tmp_path):
+        caminho = str(tmp_path / "pacote.ubjp")
+        pacote_modelos.escrever_pacote(caminho, {"1": b"abc"})
+        antigo = pacote_modelos.obter_pacote(caminho)
+        pacote_modelos.escrever_pacote(caminho, {"1": b"novo"})
+        assert pacote_modelos.ler_entrada(caminho, 1) == b"novo"
+        assert antigo["mapa"][antigo["inicio_dados"]:antigo["inicio_dados"] + 3] == b"abc"
+
+class TestModelosNoPacote:
+    def test_salvar_e_carregar_booster(self, pasta_modelos):
+        rng = np.random.default_rng(3)
+        matriz = rng.normal(size=(30, 11))
+        alvos = matriz[:, 0] * 2.0 + 1.0
+        modelo = modelo_service._treinar_modelo_novo(matriz, alvos, n_jobs=1)
+        modelo_service.salvar_modelo(modelo, 7, "points", season=2025)
+        modelo_service.salvar_modelo(modelo, 8, "points", season=2025)
+        modelo_service.limpar_registro_modelos()
+
+        carregado = modelo_service.carregar_modelo(7, "points", season=2025)
+        assert carregado is not None
+        np.testing.assert_allclose(carregado.predict(matriz), modelo.predict(matriz), rtol=1e-6)
+        assert modelo_service._modelo_existe(8, "points", 2025)
+        assert not modelo_service._modelo_existe(9, "points", 2025)
+        assert modelo_service.carregar_modelo(9, "points", season=2025) is None
+        assert len(list(pasta_modelos.glob("*.pkl"))) == 0
+
+    def test_gravacoes_concorrentes_nao_perdem_modelos(self, pasta_modelos):
+        from concurrent.futures import ThreadPoolExecutor
+        def gravar(player_id):
+            return modelo_service.atualizar_pacote("points", 2025, {player_id: f"modelo-{player_id}".encode()})
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            list(executor.map(gravar, range(16)))
+        caminho = modelo_service._caminho_pacote("points", 2025)
+        assert sorted(int(chave) for chave in pacote_modelos.listar_chaves(caminho)) == list(range(16))
+        assert len(list(pasta_modelos.glob("*.tmp"))) == 0
+
+    def test_modelo_avulso_entra_no_pacote_no_retreino(self, pasta_modelos):
+        rng = np.random.default_rng(5)
+        matriz = rng.normal(size=(30, 11))
+        modelo = modelo_service._treinar_modelo_novo(matriz, matriz[:, 1], n_jobs=1)
+        modelo_service.salvar_modelo(modelo, 7, "points", season=2025)
+        caminho = modelo_service._caminho_pacote("points", 2025)
+        assert not (pasta_modelos / "pacote_points_2025.ubjp").exists()
+        assert modelo_service._modelo_existe(7, "points", 2025)
+
+        modelo_service.atualizar_pacote("points", 2025, {8: modelo_service._serializar_booster(modelo)})
+        assert sorted(pacote_modelos.listar_chaves(caminho)) == ["7", "8"]
+        assert list((pasta_modelos / "avulsos_points_2025").glob("*.ubj")) == []
+        carregado = modelo_service.carregar_modelo(7, "points", season=2025)
+        np.testing.assert_allclose(carregado.predict(matriz), modelo.predict(matriz), rtol=1e-6)
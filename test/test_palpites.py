@@ -1,8 +1,10 @@
 import pytest
 from unittest.mock import MagicMock, patch
 
-from app.services.manager_service import _converter_minutos, _filtrar_jogadores_ativos
+from app.services.manager_service import _montar_elegiveis
+from app.services.modelo_service import _converter_minutos
 from app.services.analytics_service import calcular_totais_e_medias
+from app.services.gravador_predicoes import montar_linhas
 
 class TestConverterMinutos:
     def test_formato_mm_ss(self):
@@ -45,40 +47,50 @@ class TestConverterMinutos:
         resultado = _converter_minutos("48:00")
         assert resultado == 48.0
 
-class TestFiltrarJogadoresAtivos:
-    def test_jogadores_que_jogaram(self):
-        db = MagicMock()
-
-        jogo1 = MagicMock()
-        jogo1.id = 101
-        db.query.return_value.filter.return_value.order_by.return_value.limit.return_value.all.return_value = [jogo1]
-
-        stat_pid1 = MagicMock()
-        stat_pid1.minutes = "28:00"
-
-        def side_effect_query(model):
-            mock = MagicMock()
-            mock.filter.return_value.all.return_value = [stat_pid1]
-            return mock
-
-        db.query.side_effect = side_effect_query
+def criar_registro_titular(team_id, player_id, jogou_recente):
+    registro = MagicMock()
+    registro.team_id = team_id
+    registro.player_id = player_id
+    registro.jogou_recente = jogou_recente
+    return registro
 
-        resultado = _filtrar_jogadores_ativos(db, player_ids=[1], team_id=10, season=2025)
-        assert 1 in resultado
-
-    def test_sem_jogos_retorna_lista_original(self):
-        db = MagicMock()
-
-        def side_effect_query(model):
-            mock = MagicMock()
-            mock.filter.return_value.order_by.return_value.limit.return_value.all.return_value = []
-            mock.filter.return_value.all.return_value = []
-            return mock
-
-        db.query.side_effect = side_effect_query
-
-        resultado = _filtrar_jogadores_ativos(db, player_ids=[1, 2, 3], team_id=10, season=2025)
-        assert resultado == [1, 2, 3]
+class TestMontarElegiveis:
+    def test_jogadores_que_jogaram(self):
+        registros = [criar_registro_titular(10, 1, 1), criar_registro_titular(10, 2, 0)]
+        resultado = _montar_elegiveis(registros)
+        assert resultado[10] == [1]
+
+    def test_nenhum_jogou_retorna_titulares(self):
+        registros = [criar_registro_titular(10, 1, 0), criar_registro_titular(10, 2, 0), criar_registro_titular(10, 3, 0)]
+        resultado = _montar_elegiveis(registros)
+        assert resultado[10] == [1, 2, 3]
+
+    def test_times_separados(self):
+        registros = [criar_registro_titular(10, 1, 1), criar_registro_titular(20, 5, 0)]
+        resultado = _montar_elegiveis(registros)
+        assert resultado == {10: [1], 20: [5]}
+
+class TestMontarLinhasPredicao:
+    def criar_solicitacao(self, player_id, game_id=100):
+        return {"player_id": player_id, "game_id": game_id, "team_id": 10, "opponent_team_id": 20, "is_home": 1}
+
+    def test_conta_erros_e_monta_linhas(self):
+        solicitacoes = [self.criar_solicitacao(1), self.criar_solicitacao(2)]
+        resultados = [{"points": 21.5, "assists": 4.0}, None]
+        linhas, erros = montar_linhas(solicitacoes, resultados, 2025)
+        assert erros == 1
+        assert len(linhas) == 1
+        assert linhas[0]["predicted_points"] == 21.5
+        assert linhas[0]["predicted_blocks"] == 0.0
+        assert linhas[0]["season"] == 2025
+
+    def test_chave_repetida_entra_uma_vez(self):
+        solicitacoes = [self.criar_solicitacao(1), self.criar_solicitacao(1)]
+        resultados = [{"points": 10.0}, {"points": 12.0}]
+        linhas, erros = montar_linhas(solicitacoes, resultados, 2025)
+        assert erros == 0
+        assert len(linhas) == 1
+        assert linhas[0]["predicted_points"] == 10.0
 
 class TestCalcularTotaisEMedias:
     def criar_stat_jogo(self, points=20, assists=5, tot_reb=8, steals=1, blocks=0, turnovers=2, minutes=32, fgm=8, fga=15, tpm=2, tpa=5, ftm=2, fta=2, off_reb=2, def_reb=6, p_fouls=3, plus_minus=5, game_id=1, date_start=None):
@@ -0,0 +1,124 @@
+import os
+import pickle
+import numpy as np
+import pytest
+
+from app.config import config
+from app.services import modelo_service
+
+@pytest.fixture
+def pasta_modelos(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "PASTA_MODELOS", str(tmp_path))
+    monkeypatch.setattr(config, "REGISTRO_MODELOS_MAX", 2)
+    modelo_service.limpar_registro_modelos()
+    for chave in modelo_service._contadores_registro:
+        modelo_service._contadores_registro[chave] = 0
+    yield tmp_path
+    modelo_service.limpar_registro_modelos()
+
+def gravar_modelo(pasta, player_id, stat_name, conteudo):
+    with open(os.path.join(pasta, f"modelo_{player_id}_{stat_name}.pkl"), "wb") as arquivo:
+        pickle.dump(conteudo, arquivo)
+
+class TestRegistroModelos:
+    def test_modelo_inexistente(self, pasta_modelos):
+        assert modelo_service.carregar_modelo(1, "points") is None
+
+    def test_segunda_leitura_vem_do_registro(self, pasta_modelos):
+        gravar_modelo(pasta_modelos, 1, "points", {"v": 1})
+        assert modelo_service.carregar_modelo(1, "points") == {"v": 1}
+        assert modelo_service.carregar_modelo(1, "points") == {"v": 1}
+        estatisticas = modelo_service.estatisticas_registro_modelos()
+        assert estatisticas["falhas"] == 1
+        assert estatisticas["acertos"] == 1
+
+    def test_mtime_alterado_recarrega(self, pasta_modelos):
+        gravar_modelo(pasta_modelos, 1, "points", {"v": 1})
+        modelo_service.carregar_modelo(1, "points")
+        gravar_modelo(pasta_modelos, 1, "points", {"v": 2})
+        caminho = os.path.join(pasta_modelos, "modelo_1_points.pkl")
+        os.utime(caminho, (os.path.getatime(caminho), os.path.getmtime(caminho) + 10))
+        assert modelo_service.carregar_modelo(1, "points") == {"v": 2}
+
+    def test_lru_despeja_mais_antigo(self, pasta_modelos):
+        for pid in (1, 2, 3):
+            gravar_modelo(pasta_modelos, pid, "points", {"v": pid})
+            modelo_service.carregar_modelo(pid, "points")
+        estatisticas = modelo_service.estatisticas_registro_modelos()
+        assert estatisticas["tamanho"] == 2
+        assert estatisticas["despejos"] == 1
+        assert (1, "points", None) not in modelo_service._registro_modelos
+
+    def test_pickle_ocupa_uma_entrada_para_qualquer_temporada(self, pasta_modelos):
+        gravar_modelo(pasta_modelos, 1, "points", {"v": 1})
+        modelo_service.carregar_modelo(1, "points", season=2024)
+        modelo_service.carregar_modelo(1, "points", season=2025)
+        modelo_service.carregar_modelo(1, "points")
+        assert list(modelo_service._registro_modelos) == [(1, "points", None)]
+        estatisticas = modelo_service.estatisticas_registro_modelos()
+        assert estatisticas["falhas"] == 1
+        assert estatisticas["acertos"] == 2
+
+    def test_aquecer_carrega_modelos_da_pasta(self, pasta_modelos):
+        gravar_modelo(pasta_modelos, 7, "tot_reb", {"v": 7})
+        assert modelo_service.aquecer_registro_modelos() == 1
+        assert modelo_service.carregar_modelo(7, "tot_reb", season=2025) == {"v": 7}
+        assert modelo_service.estatisticas_registro_modelos()["acertos"] == 1
+
+class TestContextoAgrupado:
+    def test_faixas_de_minutos(self):
+        assert modelo_service.faixa_minutos(10.0) == 0
+        assert modelo_service.faixa_minutos(15.0) == 1
+        assert modelo_service.faixa_minutos(28.0) == 2
+        assert modelo_service.faixa_minutos(36.0) == 3
+
+    def test_posicao_desconhecida_vira_zero(self):
+        assert modelo_service.montar_contexto_agrupado(None, 30.0, 12) == [0, 2, 12]
+        assert modelo_service.montar_contexto_agrupado("C", 20.0, 40) == [5, 1, 40]
+
+class TestManifestoTreino:
+    def criar_unidade(self, player_id, valores):
+        jogos = {"timestamps": np.full(len(valores), np.nan), "points": np.array(valores, dtype=float)}
+        return jogos, (player_id, "points", [[float(v)] for v in valores], [float(v) for v in valores], None)
+
+    def test_classifica_pulados_retreinados_e_novos(self, pasta_modelos):
+        jogos_1, unidade_1 = self.criar_unidade(1, [10, 12, 14])
+        jogos_2, unidade_2 = self.criar_unidade(2, [5, 6, 7])
+        jogos_3, unidade_3 = self.criar_unidade(3, [1, 2, 3])
+        dados = {1: jogos_1, 2: jogos_2, 3: jogos_3}
+        for player_id in (1, 2):
+            modelo_service._gravar_modelo_disco({"id": player_id}, modelo_service._caminho_modelo(player_id, "points"))
+
+        manifesto = {}
+        manifesto["1_points"] = modelo_service._entrada_manifesto(jogos_1, unidade_1[2], unidade_1[3])
+        manifesto["2_points"] = modelo_service._entrada_manifesto(jogos_2, [[5.0]], [5.0])
+        modelo_service.salvar_manifesto_treino(2025, manifesto)
+
+        carregado = modelo_service.carregar_manifesto_treino(2025)
+        pendentes, entradas, classificacao = modelo_service._classificar_unidades([unidade_1, unidade_2, unidade_3], dados, carregado)
+        assert classificacao == {"pulados": 1, "retreinados": 1, "novos": 1}
+        assert [unidade[0] for unidade in pendentes] == [2, 3]
+        assert [chave for chave, _ in entradas] == ["2_points", "3_points"]
+
+    def test_forcar_completo_nao_pula(self, pasta_modelos):
+        jogos, unidade = self.criar_unidade(1, [10, 12, 14])
+        modelo_service._gravar_modelo_disco({"id": 1}, modelo_service._caminho_modelo(1, "points"))
+        manifesto = {"1_points": modelo_service._entrada_manifesto(jogos, unidade[2], unidade[3])}
+        pendentes, _, classificacao = modelo_service._classificar_unidades([unidade], {1: jogos}, manifesto, forcar_completo=True)
+        assert len(pendentes) == 1
+        assert classificacao["retreinados"] == 1
+
+    def test_planeja_incremental_quando_dados_antigos_sao_prefixo(self, pasta_modelos, monkeypatch):
+        from datetime import datetime, timezone
+        monkeypatch.setattr(config, "MODO_ATUALIZACAO_MODELOS", "incremental")
+        jogos, antiga = self.criar_unidade(1, [10, 12, 14])
+        _, nova = self.criar_unidade(1, [10, 12, 14, 16])
+        _, alterada = self.criar_unidade(1, [11, 12, 14, 16])
+        entrada = modelo_service._entrada_manifesto(jogos, antiga[2], antiga[3])
+        entrada["atualizacoes_incrementais"] = 0
+        entrada["refit_completo_em"] = datetime.now(timezone.utc).isoformat()
+        planos = modelo_service._planejar_atualizacoes([nova, alterada], {"1_points": entrada}, season=2025)
+        assert planos == [{"inicio_novas": 3, "season": 2025}, None]
+
+        entrada["atualizacoes_incrementais"] = config.INCREMENTAL_MAX_ATUALIZACOES
+        assert modelo_service._planejar_atualizacoes([nova], {"1_points": entrada}, season=2025) == [None]
@@ -0,0 +1,53 @@
+from unittest.mock import MagicMock, patch
+
+from app.services.replay_service import _avancar_minutos, _titulares_do_estado, _pontuar, _gravar_acumulado
+
+def criar_estado():
+    return {"posicao": 0, "minutos_por_time": {}, "elencos": {}}
+
+class TestEstadoReplay:
+    def setup_method(self):
+        # (timestamp, team_id, player_id, segundos)
+        self.linhas = [
+            (100.0, 1, 10, 1800),
+            (100.0, 1, 11, 300),
+            (200.0, 1, 10, 1200),
+            (200.0, 1, 11, 2400),
+            (300.0, 2, 20, 2160),
+        ]
+
+    def test_acumula_apenas_antes_do_corte(self):
+        estado = criar_estado()
+        _avancar_minutos(estado, self.linhas, 200.0)
+        assert estado["posicao"] == 2
+        assert estado["minutos_por_time"][1][10] == [1800, 1]
+
+    def test_titulares_pela_media_de_minutos(self):
+        estado = criar_estado()
+        _avancar_minutos(estado, self.linhas, 200.0)
+        assert _titulares_do_estado(None, estado, 1, 2025) == [10]
+        _avancar_minutos(estado, self.linhas, 250.0)
+        assert _titulares_do_estado(None, estado, 1, 2025) == [10, 11]
+
+    def test_sem_historico_usa_elenco_uma_vez(self):
+        estado = criar_estado()
+        with patch("app.services.replay_service._buscar_jogadores_do_time", return_value=[20, 21]) as elenco:
+            assert _titulares_do_estado(None, estado, 2, 2025) == [20, 21]
+            assert _titulares_do_estado(None, estado, 2, 2025) == [20, 21]
+        assert elenco.call_count == 1
+
+class TestGravacaoAcumulada:
+    def test_lotes_de_jogos_gravados_de_uma_vez(self):
+        acumulado = {"solicitacoes": [], "resultados": []}
+        with patch("app.services.replay_service.prever_lote", side_effect=lambda db, solicitacoes, season: [{"points": 1.0}] * len(solicitacoes)):
+            _pontuar(None, [{"game_id": 1}, {"game_id": 1}], 2025, acumulado)
+            _pontuar(None, [{"game_id": 2}], 2025, acumulado)
+        db = MagicMock()
+        with patch("app.services.replay_service._gravar_predicoes", return_value={"inseridas": 3, "erros": 0}) as gravar:
+            assert _gravar_acumulado(db, acumulado, 2025) == (3, 0)
+            assert _gravar_acumulado(db, acumulado, 2025) == (0, 0)
+        assert gravar.call_count == 1
+        assert len(gravar.call_args.kwargs["solicitacoes"]) == 3
+        assert len(gravar.call_args.kwargs["resultados"]) == 3
+        assert acumulado == {"solicitacoes": [], "resultados": []}
+        db.commit.assert_called_once()
@@ -1,7 +1,9 @@
 import pytest
 
-from app.etl.func_normalize import _normalizar_string, _normalizar_inteiro, _normalizar_decimal, _normalizar_boolean, _processar_datetime
+from app.etl.func_normalize import _normalizar_string, _normalizar_inteiro, _normalizar_decimal, _normalizar_boolean, _processar_datetime, _normalizar_segundos
 from app.services.analytics_service import converter_para_int, converter_para_float
+from app.etl.upsert_stats import normalizar_stats_jogadores, normalizar_stats_times, _sem_chaves_repetidas
+from app.etl.estado_carga import precisa_carregar, resposta_inalterada, hash_resposta
 
 class TestNormalizarString:
     def test_string_normal(self):
@@ -115,6 +117,28 @@ class TestNormalizarBoolean:
         resultado = _normalizar_boolean(0)
         assert resultado is False
 
+class TestNormalizarSegundos:
+    def test_formato_minutos_segundos(self):
+        resultado = _normalizar_segundos("32:15")
+        assert resultado == 1935
+
+    def test_minutos_decimais(self):
+        resultado = _normalizar_segundos("25.5")
+        assert resultado == 1530
+
+    def test_inteiro(self):
+        resultado = _normalizar_segundos(32)
+        assert resultado == 1920
+
+    def test_zerado(self):
+        resultado = _normalizar_segundos("0:00")
+        assert resultado == 0
+
+    def test_none_e_invalido(self):
+        assert _normalizar_segundos(None) is None
+        assert _normalizar_segundos("") is None
+        assert _normalizar_segundos("DNP") is None
+
 class TestProcessarDatetime:
     def test_formato_iso_z(self):
         resultado = _processar_datetime("2025-01-15T20:30:00Z")
@@ -173,4 +197,52 @@ class TestConverterParaFloat:
 
     def test_string_vazia_retorna_zero(self):
         resultado = converter_para_float("")
-        assert resultado == 0.0
\ No newline at end of file
+        assert resultado == 0.0
+
+class TestNormalizarStatsEmLote:
+    def test_jogador_fora_do_banco_e_descartado(self):
+        itens = [
+            {"player": {"id": 10}, "team": {"id": 1}, "points": "20", "min": "30:00"},
+            {"player": {"id": 99}, "team": {"id": 1}, "points": "3"},
+            {"player": None, "team": {"id": 1}},
+        ]
+        linhas = normalizar_stats_jogadores(100, 2025, itens, {10})
+        assert len(linhas) == 1
+        assert linhas[0]["player_id"] == 10
+        assert linhas[0]["points"] == 20
+        assert linhas[0]["seconds_played"] == 1800
+        assert linhas[0]["season"] == 2025
+
+    def test_time_usa_primeiro_bloco_de_statistics(self):
+        itens = [{"team": {"id": 1}, "statistics": [{"points": "101", "min": "240:00"}]}, {"team": {"id": 2}, "statistics": "invalido"}]
+        linhas = normalizar_stats_times(100, itens, {1, 2})
+        assert len(linhas) == 1
+        assert linhas[0]["points"] == 101
+        assert linhas[0]["minutes"] == "240:00"
+
+    def test_chave_repetida_fica_a_ultima(self):
+        linhas = [{"player_id": 1, "game_id": 5, "points": 10}, {"player_id": 1, "game_id": 5, "points": 12}]
+        assert _sem_chaves_repetidas(linhas, ["player_id", "game_id"]) == [{"player_id": 1, "game_id": 5, "points": 12}]
+
+class TestMarcaDaguaCarga:
+    def criar(self, status_jogo, status_carga=None, linhas=5, payload=None):
+        from types import SimpleNamespace
+        jogo = SimpleNamespace(id=1, status_short=status_jogo)
+        if status_carga is None:
+            return jogo, None
+        return jogo, SimpleNamespace(source_status=status_carga, rows_written=linhas, payload_hash=hash_resposta(payload or []))
+
+    def test_jogo_novo_ou_em_andamento_e_carregado(self):
+        assert precisa_carregar(*self.criar(3)) is True
+        assert precisa_carregar(*self.criar(3, status_carga=2)) is True
+
+    def test_jogo_encerrado_e_carregado_e_pulado(self):
+        assert precisa_carregar(*self.criar(3, status_carga=3)) is False
+        assert precisa_carregar(*self.criar(3, status_carga=3, linhas=0)) is True
+
+    def test_payload_igual_so_pula_com_mesmo_status(self):
+        payload = [{"team": {"id": 1}, "points": 10}]
+        jogo, estado = self.criar(2, status_carga=2, payload=payload)
+        assert resposta_inalterada(estado, jogo, hash_resposta([{"points": 10, "team": {"id": 1}}])) is True
+        jogo.status_short = 3
+        assert resposta_inalterada(estado, jogo, hash_resposta(payload)) is False
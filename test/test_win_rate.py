@@ -1,6 +1,9 @@
 import pytest
+import numpy as np
 from unittest.mock import MagicMock
 
+from app.services.backtest_service import calcular_metricas
+from app.services.formatar_palpites import verificar_acerto_linha
 from app.services.win_rate_service import _jogador_teve_minutos, _calcular_win_rate_stat
 
 def criar_stat(minutes):
@@ -124,4 +127,17 @@ class TestCalcularWinRateStat:
         stat.points = 20
         stat.minutes = "30:00"
         resultado = _calcular_win_rate_stat([(palpite, stat)], "predicted_points", "points", margem=3.0)
-        assert resultado["total_avaliadas"] == 0
\ No newline at end of file
+        assert resultado["total_avaliadas"] == 0
+
+
+class TestMetricasBacktest:
+    def test_acertos_iguais_a_verificar_acerto_linha(self):
+        previstos = [0.0, 0.4, 0.5, 0.6, 12.49, 12.5, 12.51, 7.0, 3.99]
+        reais = [0, 1, 0, 1, 12, 13, 12, 7, 3]
+        esperados = sum(1 for p, r in zip(previstos, reais) if verificar_acerto_linha(p, r))
+        metricas = calcular_metricas(previstos, reais)
+        assert metricas["total_acertos"] == esperados
+        assert metricas["mae_medio"] == round(float(np.mean(np.abs(np.array(previstos) - np.array(reais)))), 2)
+
+    def test_sem_amostras(self):
+        assert calcular_metricas([], [])["mae_medio"] is None